@@ -1,23 +1,26 @@
-import subprocess
+from scaffold_cache import ScaffoldCache
+from codons import frame_start, frame_end
 
 class BlastAnnot():
 	
-	def __init__(self, blast_dict, query_spec):
+	def __init__(self, blast_dict, query_spec, scaffold_cache=None):
 		self.blast_dict = blast_dict
 		self.seq_ids = blast_dict.keys()
 		self.q_spec = query_spec
+		# scaffolds can be shared with the annotations of other query species
+		self.scaffold_cache = scaffold_cache if scaffold_cache is not None else ScaffoldCache()
 	
 	
 	# get species name
 	def get_spec_name(self, seq_id):
-		return self.blast_dict[seq_id][0][0]
+		return self.blast_dict[seq_id][0].spec
 	
 	
 	# get alignment start position of subject seq
 	def get_sstart(self, seq_id):
 		starts = []
 		for info in self.blast_dict[seq_id]:
-			starts.append(int(info[1]))
+			starts.append(info.sstart)
 		return starts
 	
 	
@@ -25,7 +28,7 @@ class BlastAnnot():
 	def get_send(self, seq_id):
 		ends = []
 		for info in self.blast_dict[seq_id]:
-			ends.append(int(info[2]))
+			ends.append(info.send)
 		return ends
 	
 	
@@ -33,7 +36,7 @@ class BlastAnnot():
 	def get_evalue(self, seq_id):
 		evals = []
 		for info in self.blast_dict[seq_id]:
-			evals.append(info[3])
+			evals.append(info.evalue)
 		return evals
 	
 	
@@ -41,7 +44,7 @@ class BlastAnnot():
 	def get_qstart(self, seq_id):
 		starts = []
 		for info in self.blast_dict[seq_id]:
-			starts.append(int(info[4]))
+			starts.append(info.qstart)
 		return starts
 	
 	
@@ -49,7 +52,7 @@ class BlastAnnot():
 	def get_qend(self, seq_id):
 		ends = []
 		for info in self.blast_dict[seq_id]:
-			ends.append(int(info[5]))
+			ends.append(info.qend)
 		return ends
 	
 	
@@ -57,7 +60,7 @@ class BlastAnnot():
 	def get_length(self, seq_id):
 		lens = []
 		for info in self.blast_dict[seq_id]:
-			lens.append(int(info[6]))
+			lens.append(info.length)
 		return lens
 	
 	
@@ -65,7 +68,7 @@ class BlastAnnot():
 	def get_qseq(self, seq_id):
 		qseq = []
 		for info in self.blast_dict[seq_id]:
-			qseq.append(info[7])
+			qseq.append(info.qseq)
 		return qseq
 	
 	
@@ -73,7 +76,7 @@ class BlastAnnot():
 	def get_sseq(self, seq_id):
 		sseq = []
 		for info in self.blast_dict[seq_id]:
-			sseq.append(info[8])
+			sseq.append(info.sseq)
 		return sseq
 	
 	
@@ -81,14 +84,15 @@ class BlastAnnot():
 	def get_sframe(self, seq_id):
 		frames = []
 		for info in self.blast_dict[seq_id]:
-			frames.append(int(info[9]))
+			frames.append(info.sframe)
 		return frames
 	
 	
 	# get subject strand
 	def get_sstrand(self, seq_id, db, mode):
-		db_info = subprocess.run("blastdbcmd -db {0} -entry {1} -strand {2}".format(db, seq_id, mode).split(), capture_output=True, text=True).stdout.split("\n")
-		return ''.join(db_info[1:-1])
+		if mode == "minus":
+			return self.scaffold_cache.get(db, seq_id, "complement")[::-1]
+		return self.scaffold_cache.get(db, seq_id, "plus")
 	
 	
 	# get num of gaps in query sequence
@@ -114,124 +118,54 @@ class BlastAnnot():
 		return no_gap_dict, gap_dict
 
 	# find 5' and 3' stop codons, find first start codon starting from 5' stop codon
+	# codons are looked up in the codon index of the scaffold, positions are 0-based codon starts on the plus strand
 	def find_codons(self, seq_id, db):
-		start_codon = "ATG"
-		stop_codons = ["TAG", "TAA", "TGA"]
 		frame = self.get_sframe(seq_id)[0]
 		start_posit = self.get_sstart(seq_id)[0]
 		end_posit = self.get_send(seq_id)[0]
-		curr_fiv_posit = start_posit 
-		curr_thr_posit = end_posit
-		curr_start_posit = None
-		mode = ''
-		whole_strand = ''
+		codon_index = self.scaffold_cache.get_codons(db, seq_id)
+		length = codon_index.length
 		stop_five = None
 		stop_three = None
 		start = None
-		length = None
-		codon = ''
+		posit = None
 		
 		if frame > 0:
-			mode = "plus"
-			whole_strand = self.get_sstrand(seq_id, db, mode)
-			length = len(whole_strand)
+			# find stop codon in 3' direction, or the end of the scaffold
+			posit = codon_index.next("stop", end_posit)
+			if posit is None:
+				posit = frame_end(end_posit, length)
+			stop_three = posit + 1
 			
-			# find stop codon in 3' direction
-			while True:
-				if curr_thr_posit + 3 > length:
-					stop_three = curr_thr_posit + 1
-					break
-					
-				codon = whole_strand[curr_thr_posit:curr_thr_posit+3]
-				
-				if codon.upper() in stop_codons:
-					stop_three = curr_thr_posit + 1
-					break
-					
-				curr_thr_posit += 3			
-			
-			# find stop codon in 5' direction
-			while True:
-				if curr_fiv_posit - 4 < 0:
-					stop_five = curr_fiv_posit
-					break
-					
-				curr_fiv_posit -= 1
-				codon = whole_strand[curr_fiv_posit-3:curr_fiv_posit]
-				curr_fiv_posit += 1
-				curr_fiv_posit -= 3
+			# find stop codon in 5' direction, or the start of the scaffold
+			posit = codon_index.prev("stop", start_posit - 4)
+			if posit is None:
+				posit = frame_start(start_posit - 4) + 3
+			stop_five = posit + 1
 			
-				if codon.upper() in stop_codons:
-					stop_five = curr_fiv_posit
-					break
-					
 			# find start codon 
-			if stop_five is not None:
-				curr_start_posit = stop_five - 1
-				while True:
-					if curr_start_posit >= stop_three:
-						break
-
-					codon = whole_strand[curr_start_posit:curr_start_posit+3]
-
-					if codon.upper() == start_codon:
-						start = curr_start_posit + 1
-						break
-
-					curr_start_posit += 3
+			posit = codon_index.next("start", stop_five - 1)
+			if posit is not None and posit < stop_three:
+				start = posit + 1
 				
 		else:
-			mode = "minus"	
-			# need to flip sequence since blast gives positions in 3'-5' but sequence in 5'-3'
-			whole_strand = self.get_sstrand(seq_id, db, mode)[::-1]
-			length = len(whole_strand)
+			# blast gives positions in 3'-5', codons of the minus strand are reverse complements on the plus strand
+			# find stop codon in 3' direction, or the start of the scaffold
+			posit = codon_index.prev("rev_stop", end_posit - 4)
+			if posit is None:
+				posit = frame_start(end_posit - 4)
+			stop_three = posit + 1
 			
-			# find stop codon in 3' direction
-			while True:
-				if curr_thr_posit - 4 < 0:
-					stop_three = curr_thr_posit - 3
-					break
-				
-				# flip sequence back to 5'-3'
-				curr_thr_posit -= 1
-				codon = whole_strand[curr_thr_posit - 3:curr_thr_posit][::-1]
-				curr_thr_posit += 1
-				
-				if codon.upper() in stop_codons:
-					stop_three = curr_thr_posit - 3
-					break
-
-				curr_thr_posit -= 3		
+			# find stop codon in 5' direction, or the end of the scaffold
+			posit = codon_index.next("rev_stop", start_posit)
+			if posit is None:
+				posit = frame_end(start_posit, length) - 3
+			stop_five = posit + 1
 			
-			# find stop codon in 5' direction
-			while True:
-				if curr_fiv_posit + 3 > length:
-					stop_five = curr_fiv_posit - 2
-					break
-					
-				# flip sequence back to 5'-3'
-				codon = whole_strand[curr_fiv_posit:curr_fiv_posit + 3][::-1]
-			
-				if codon.upper() in stop_codons:
-					stop_five = curr_fiv_posit + 1
-					break
-					
-				curr_fiv_posit += 3
-				
-			# find start codon 
-			if stop_five is not None:
-				curr_start_posit = stop_five - 1
-				while True:
-					if curr_start_posit <= stop_three:
-						break
-
-					codon = whole_strand[curr_start_posit-3:curr_start_posit][::-1]
-
-					if codon.upper() == start_codon:
-						start = curr_start_posit - 2
-						break
-
-					curr_start_posit -= 3
+			# find start codon, codons before the start of the scaffold are not in the index
+			posit = codon_index.prev("rev_start", stop_five - 4)
+			if posit is not None and posit > stop_three - 3:
+				start = posit + 1
 		
 		return stop_five, start, stop_three
 	
@@ -247,20 +181,18 @@ class BlastAnnot():
 		
 			if start is not None:
 				spec_name = self.get_spec_name(seq_id)
-				db_info = None
+				seq = ''
 				frame = self.get_sframe(seq_id)[0]
 
 				if frame > 0:
 					stop_three = stop_three - 1
 
-					db_info = subprocess.run("blastdbcmd -db {0} -entry {1} -strand plus -range {2}-{3}".format(db, seq_id, start, stop_three).split(), capture_output=True, text=True).stdout.split("\n")
+					seq = self.scaffold_cache.get_range(db, seq_id, "plus", start, stop_three)
 				else:
 					stop_three = stop_three + 3
 					start = start + 2
 
-					db_info = subprocess.run("blastdbcmd -db {0} -entry {1} -strand minus -range {2}-{3}".format(db, seq_id, stop_three, start).split(), capture_output=True, text=True).stdout.split("\n")		
-
-				seq = ''.join(db_info[1:-1])
+					seq = self.scaffold_cache.get_range(db, seq_id, "minus", stop_three, start)
 
 				annotated_seqs[seq_id] = [spec_name, start, stop_three, frame, seq]
 				
@@ -310,7 +242,7 @@ class BlastAnnot():
 				file.write(self.q_spec + "\t" +
 						   seq_id + "\t" + 
 						   spec_name + "\t" + 
-						   ', '.join(evalue) + "\t" + 
+						   ', '.join([str(item) for item in evalue]) + "\t" + 
 						   ', '.join([str(item) for item in sstart]) + "\t" + 
 						   ', '.join([str(item) for item in send]) + "\t" + 
 						   ', '.join([str(item) for item in qstart]) + "\t" + 
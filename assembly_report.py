@@ -0,0 +1,32 @@
+import json
+from collections import namedtuple
+from spec_names import spec_from_organism
+
+
+# one genome assembly of the assembly data report
+AssemblyRecord = namedtuple("AssemblyRecord", ["accession", "asm_name", "organism_name", "spec_name"])
+
+
+# check if assembly is from a hybrid species
+def is_hybrid(organism_name):
+	return " x " in organism_name
+
+
+# read assembly_data_report.jsonl line by line, yield a record for every non-hybrid assembly
+def read_assembly_report(report_file):
+	with open(report_file, "r") as file:
+		for line in file:
+			if not line.strip():
+				continue
+
+			report = json.loads(line)
+			organism_name = report["organism"]["organismName"]
+
+			# exclude hybrid species
+			if is_hybrid(organism_name):
+				continue
+
+			yield AssemblyRecord(report["accession"],
+								 report["assemblyInfo"]["assemblyName"],
+								 organism_name,
+								 spec_from_organism(organism_name))
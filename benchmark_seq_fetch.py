@@ -0,0 +1,54 @@
+import sys
+import time
+import random
+from seq_fetch import BlastDbSource, FaidxSource
+
+# compare reading sequences with blastdbcmd and with the fasta index, e.g. 'python benchmark_seq_fetch.py nucl 200'
+# db must have been made by get_dbs, so that its fasta file (e.g. nucl.fna) is next to it
+
+db = sys.argv[1]
+n_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+faidx_source = FaidxSource()
+index = faidx_source.get_index(db)
+if index is None:
+	print("\nERROR: Fasta file of database not found: " + db + "\n")
+	sys.exit()
+
+# random whole sequences and ranges on both strands
+random.seed(0)
+names = list(index.entries.keys())
+requests = []
+for i in range(n_requests):
+	name = random.choice(names)
+	length = index.entries[name][0]
+	if i % 2 == 0 or length < 2:
+		requests.append((name, None, None, None))
+	else:
+		start = random.randint(1, length - 1)
+		end = random.randint(start, min(length, start + 5000))
+		requests.append((name, random.choice(["plus", "minus"]), start, end))
+
+blastdb_source = BlastDbSource()
+
+timings = []
+
+start_time = time.perf_counter()
+single = {request: blastdb_source.fetch_seqs(db, [request])[request] for request in requests}
+timings.append(("blastdbcmd -entry", time.perf_counter() - start_time))
+
+start_time = time.perf_counter()
+batch = blastdb_source.fetch_seqs(db, requests)
+timings.append(("blastdbcmd -entry_batch", time.perf_counter() - start_time))
+
+start_time = time.perf_counter()
+faidx = faidx_source.fetch_seqs(db, requests)
+timings.append(("fasta index", time.perf_counter() - start_time))
+
+for name, seconds in timings:
+	print("{0:<25}{1:>10.4f} s{2:>12.1f} us/seq".format(name, seconds, seconds / len(requests) * 1e6))
+
+mismatches = [request for request in requests if not (single[request][1] == batch[request][1] == faidx[request][1])]
+print(str(len(mismatches)) + " of " + str(len(requests)) + " sequences differ between sources.")
+for request in mismatches[:10]:
+	print(request)
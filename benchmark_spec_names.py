@@ -0,0 +1,119 @@
+import re
+import sys
+import time
+import random
+from spec_names import spec_from_organism, spec_from_prot_defline, spec_from_nucl_defline
+
+# compare the shared memoised species-name normaliser with the per-parser code it replaced, e.g. 'python benchmark_spec_names.py 1000000 5000'
+# deflines are made up from species names that cover the sp./aff., strain collection, MAG, nested-bracket and quote cases
+
+n_names = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+n_distinct = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+special_case1 = ["sp.", "aff."]
+special_case2 = ["NRRL", "CBS", "JCM", "NYNU", "CRUB", "Ashbya", "UWO(PS)", "MTCC", "UWOPS", "isolate"]
+special_case3 = ["MAG"]
+
+
+# species name from organism name, as in assembly_report.get_spec_name before spec_names.py
+def old_organism(organism_name):
+	spec_name = organism_name.replace("[", "").replace("]", "").replace("'", "").split()
+
+	if any(name.lower() == special_word.lower() for special_word in special_case3 for name in spec_name):
+		spec_name = ' '.join(spec_name[2:6])
+	elif any (spec_name[1].lower() == special_word.lower() for special_word in special_case1):
+		if len(spec_name) > 2 and any (spec_name[2].lower() == special_word.lower() for special_word in special_case2):
+			spec_name = ' '.join(spec_name[:4])
+		else:
+			spec_name = ' '.join(spec_name[:3])
+	else:
+		spec_name = ' '.join(spec_name[:2])
+
+	return spec_name
+
+
+# species name from protein defline, as in blast_aa_ds before spec_names.py
+def old_prot_defline(defline):
+	if '[[' in defline:
+		full_name_list = re.search(r'\[\[(.+?)\]\s(.+?)\]', defline)
+		full_name_list = full_name_list.group(1)+ " "+full_name_list.group(2)
+		full_name_list = full_name_list.split()
+	else:
+		full_name_list = re.search(r'\[(.*?)\]', defline).group(1).split()
+
+	if any(name.lower() == special_word.lower() for special_word in special_case3 for name in full_name_list):
+		spec_name = ' '.join(full_name_list[2:6])
+	elif any (full_name_list[1].lower() == special_word.lower() for special_word in special_case1):
+		if len(full_name_list) > 2 and any (full_name_list[2].lower() == special_word.lower() for special_word in special_case2):
+			spec_name = ' '.join(full_name_list[:4])
+		else:
+			spec_name = ' '.join(full_name_list[:3])
+	else:
+		spec_name = ' '.join(full_name_list[:2])
+
+	if "'" in spec_name:
+		spec_name = spec_name.replace("'", "")
+
+	return spec_name
+
+
+# species name from nucleotide defline, as in blast_nucl_ds before spec_names.py
+def old_nucl_defline(defline):
+	full_name = defline[1:]
+
+	if "[" in full_name:
+		full_name = full_name.replace('[', '').replace(']', '')
+	if "'" in full_name:
+		full_name = full_name.replace("'", '')
+
+	full_name_list = full_name.split()
+
+	if any(name.lower() == special_word.lower() for special_word in special_case3 for name in full_name_list):
+		spec_name = ' '.join(full_name_list[3:7])
+	elif any(full_name_list[2].lower() == special_word.lower() for special_word in special_case1):
+		if any(full_name_list[3].lower() == special_word.lower() for special_word in special_case2):
+			spec_name = ' '.join(full_name_list[1:5])
+		else:
+			spec_name = ' '.join(full_name_list[1:4])
+	else:
+		spec_name = ' '.join(full_name_list[1:3])
+
+	return spec_name
+
+
+# random organism names of every kind the parsers handle
+random.seed(0)
+organisms = []
+for i in range(n_distinct):
+	genus = "Genus{0}".format(i % 400)
+	kind = i % 5
+	if kind == 0:
+		organisms.append("{0} species{1} strain X{2}".format(genus, i, i))
+	elif kind == 1:
+		organisms.append("{0} {1} {2} {3}".format(genus, random.choice(special_case1), random.choice(special_case2), i))
+	elif kind == 2:
+		organisms.append("{0} {1} Y{2} chromosome".format(genus, random.choice(special_case1), i))
+	elif kind == 3:
+		organisms.append("MAG: {0} species{1} isolate Z{2} scaffold".format(genus, i, i))
+	else:
+		organisms.append("[{0}] 'species{1}' strain W{2}".format(genus, i, i))
+
+# deflines of the same assemblies, each distinct name is read many times as in the blast output of a round
+prot_deflines = [">XP_{0}.1 hypothetical protein [{1}]".format(i, organism) for i, organism in enumerate(organisms)]
+nucl_deflines = [">NW_{0}.1 {1} scaffold_{0}, whole genome shotgun sequence".format(i, organism) for i, organism in enumerate(organisms)]
+
+tests = [("organism name", [random.choice(organisms) for i in range(n_names)], old_organism, spec_from_organism),
+		 ("protein defline", [random.choice(prot_deflines) for i in range(n_names)], old_prot_defline, spec_from_prot_defline),
+		 ("nucleotide defline", [random.choice(nucl_deflines) for i in range(n_names)], old_nucl_defline, spec_from_nucl_defline)]
+
+for name, lines, old, new in tests:
+	start_time = time.perf_counter()
+	old_names = [old(line) for line in lines]
+	old_seconds = time.perf_counter() - start_time
+
+	start_time = time.perf_counter()
+	new_names = [new(line) for line in lines]
+	new_seconds = time.perf_counter() - start_time
+
+	mismatches = sum(1 for old_name, new_name in zip(old_names, new_names) if old_name != new_name)
+	print("{0:<20}old {1:>8.3f} s   new {2:>8.3f} s   {3} of {4} names differ".format(name, old_seconds, new_seconds, mismatches, len(lines)))
@@ -1,24 +1,42 @@
 import subprocess
 import os
 import sys
-import re
 import csv
+import ast
+import json
+import hashlib
+import threading
 from Bio import SeqIO
 from Bio.Seq import Seq
-from Bio.SeqRecord import SeqRecord
+from download import download_search_set, clean_downloads, TaxonDataset
+from assembly_report import read_assembly_report
+from spec_names import spec_from_nucl_defline
+from blast_hits import ProtHit, NuclHit, prot_outfmt, nucl_outfmt, parse_hits, parse_prot_line, parse_nucl_line, stream_lines, is_hit_list, hits_to_lists, dict_from_lists
+from scheduler import split_threads, split_list, run_parallel
+from seq_fetch import fetch_seq, fetch_seqs
 
 
 # get query id based on the provded database
-def get_qseq_id(seq, db, typ):
+# tag is added to the names of the files of a search, so searches of several queries can run at the same time
+def get_qseq_id(seq, db, typ, threads=1, cache=None, tag=""):
 	qseq_id = None
+	blast_file_name = "qseq_id" + tag + ".blasted"
 	
-	if typ == "prot":
-		subprocess.run("blastp -query {0} -db {1} -out {2} -outfmt {3}".format(seq, db, "qseq_id.blasted", "6").split())
-		
-	elif typ == "nucl":
-		subprocess.run("blastn -query {0} -db {1} -out {2} -outfmt {3}".format(seq, db, "qseq_id.blasted", "6").split())
+	# re-use result of the same search from an earlier round or run
+	key = search_key(cache, ["qseq_id", typ, "6"], db, [seq])
+	if key is None or not cache.get_file(key, blast_file_name):
+		if typ == "prot":
+			result = subprocess.run("blastp -query {0} -db {1} -out {2} -outfmt {3} -num_threads {4}".format(seq, db, blast_file_name, "6", threads).split())
+			
+		elif typ == "nucl":
+			result = subprocess.run("blastn -query {0} -db {1} -out {2} -outfmt {3} -num_threads {4}".format(seq, db, blast_file_name, "6", threads).split())
+
+		# results of a failed search are never cached
+		check_search(result)
+		if key is not None:
+			cache.put_file(key, blast_file_name)
 	
-	with open("qseq_id.blasted", "r") as blastp_rslt:
+	with open(blast_file_name, "r") as blastp_rslt:
 		try:
 			qseq_id = blastp_rslt.readline().split("\t")[1]
 		except IndexError:
@@ -29,17 +47,15 @@ def get_qseq_id(seq, db, typ):
 
 
 # returns filea with all protein seqs & nucleotide seqs in fasta format, return None if no data exists
-def get_fasta_files(taxID_list):
+def get_fasta_files(taxID_list, workers=4, zip_dir=None, cache=None):
 	
 	# initialize files' name
 	nucl_fasta_file = None
 	prot_fasta_file = None
 
-	# store nucleotide files' path
-	nucl_file_paths = []
-
-	# store protein files path
-	prot_files = []
+	# number of genome and protein files combined
+	nucl_count = 0
+	prot_count = 0
 	
 	# store all species names
 	all_specs = []
@@ -51,147 +67,321 @@ def get_fasta_files(taxID_list):
 	prot_file_paths = {}
 	
 
-	# download genome and proteome and save fasta files
-	# for every tax ID 
-	for taxID in taxID_list:
+	# download genome and proteome of every tax ID in parallel, taxIDs finished in an interrupted run are skipped
+	# assemblies already in the genome cache are linked instead of downloaded
+	sources, failed = download_search_set(taxID_list, workers, zip_dir, cache)
+
+	if len(failed) > 0:
+		print("\nERROR: Failed to download search set data for taxID(s): " + ', '.join(failed) + ". Run the script again to resume the download.\n")
+		sys.exit()
 
-		# download reference genome/set of reference genomes and protein, combine them into taxID.zip file
-		subprocess.run("datasets download genome taxon {0} --reference --include genome,protein --filename {0}.zip".format(taxID).split())
+	# genome and protein files are streamed out of the zip files straight into the combined fasta files
+	nucl_out = open("nucl.fna", "wb")
+	prot_out = open("prot.faa", "wb")
 
-		# unzip
-		subprocess.run("unzip {0}.zip -d {0}".format(taxID).split())
+	# save fasta files for every tax ID 
+	for taxID in taxID_list:
 
-		# delete zip files
-		subprocess.run("rm {0}.zip".format(taxID).split())
+		# open zip file, extract assembly data report
+		dataset = TaxonDataset(taxID, sources[taxID], zip_dir, cache)
 
 		# get path to access assembly data report
 		path = os.getcwd()+"/{0}/ncbi_dataset/data".format(taxID)
+		report_file = path+"/assembly_data_report.jsonl"
 
-		# reformat assembly data report using dataformat, append each genome's assembly accession number and assembly info to list as tuple, since its fasta file is named based on them
-		acs_asm_list_temp = subprocess.run("dataformat tsv genome --inputfile {0}/assembly_data_report.jsonl --fields accession,assminfo-name,organism-name".format(path).split(), \
-										capture_output=True, \
-										text=True) \
-										.stdout \
-										.split("\n")
-		
-		# remove unecessary info (headers and '') from list
-		try:
-			acs_asm_list_temp.pop(0)
-			acs_asm_list_temp.pop(-1)
-		except IndexError:
+		if not os.path.exists(report_file):
 			print("\nERROR: Invalid search set. No search set data downloaded.\n")
 			sys.exit()
 
-		# parse into list => [assemble accession num, assembly name, species name] 
+		# read each genome's assembly accession number, assembly name and species name from the assembly data report, since its fasta file is named based on them
+		# hybrid species are excluded
 		acs_asm_list = []
-			  
-		for acs_asm in acs_asm_list_temp:
-			acs_asm_tuple = acs_asm.split("\t")
-			
-			# exclude hybrid species
-			spec_name = acs_asm_tuple[2]
-			
-			if " x " not in spec_name:
-				acs_asm_list.append(acs_asm_tuple)
-				
-				# get all valid species names
-				special_case1 = ["sp.", "aff."] 
-				special_case2 = ["NRRL", "CBS", "JCM", "NYNU", "CRUB", "Ashbya", "UWO(PS)", "MTCC", "UWOPS", "isolate"]
-				special_case3 = ["MAG"]
-				
-				spec_name = spec_name.replace("[", "").replace("]", "").replace("'", "").split()
-				
-				if any(name.lower() == special_word.lower() for special_word in special_case3 for name in spec_name):
-					spec_name = ' '.join(spec_name[2:6])
-					
-				elif any (spec_name[1].lower() == special_word.lower() for special_word in special_case1):
-					if len(spec_name) > 2 and any (spec_name[2].lower() == special_word.lower() for special_word in special_case2):
-						spec_name = ' '.join(spec_name[:4])
-					else:
-						spec_name = ' '.join(spec_name[:3])
-				else:
-					spec_name = ' '.join(spec_name[:2])
-
-				if spec_name not in all_specs:
-					all_specs.append(spec_name)
+
+		for record in read_assembly_report(report_file):
+			acs_asm_list.append(record)
+
+			# get all valid species names
+			if record.spec_name not in all_specs:
+				all_specs.append(record.spec_name)
 		
-		# make a list of all nucleotide file paths an a list of all protein file paths
-		for acs_asm_tuple in acs_asm_list:
-			nucl_file = path+"/"+acs_asm_tuple[0]+"/"+acs_asm_tuple[0]+"_"+acs_asm_tuple[1]+"_genomic.fna"
-			prot_file = path+"/"+acs_asm_tuple[0]+"/"+"protein.faa"
+		# comebine all genome files into one single database and all protein files into another
+		for record in acs_asm_list:
+			nucl_file = record.accession+"_"+record.asm_name+"_genomic.fna"
+			prot_file = path+"/"+record.accession+"/"+"protein.faa"
 			# check if file exists
-			if os.path.exists(nucl_file):
-				nucl_file_paths.append(nucl_file)
-			if os.path.exists(prot_file):
-				prot_files.append(prot_file)
+			if dataset.has(record.accession, nucl_file):
+				dataset.append_to(record.accession, record.asm_name, nucl_file, nucl_out)
+				nucl_count += 1
+			if dataset.has(record.accession, "protein.faa"):
+				# protein file is also kept on its own, it is the query dataset when its species is picked as the next query
+				dataset.extract_and_append(record.accession, record.asm_name, "protein.faa", prot_out)
+				prot_count += 1
 				for name in all_specs:
-					if name in acs_asm_tuple[2].replace("[", "").replace("]", "").replace("'", ""):
+					if name in record.organism_name.replace("[", "").replace("]", "").replace("'", ""):
 						prot_specs.append(name)
 						prot_file_paths[name] = prot_file
-				
-	if len(nucl_file_paths) > 0:
-		
-		# comebine all taxID nucleotide databases into one single database
-		nucl_dbs = ' '.join(nucl_file_paths)                      
-		subprocess.run("cat {0} >> nucl.fna".format(nucl_dbs), shell=True)
 
+			# files of the assembly are all stored, it can be added to the genome cache
+			dataset.cache_assembly(record.accession, record.asm_name)
+
+		dataset.close()
+
+	nucl_out.close()
+	prot_out.close()
+
+	# downloads are no longer needed once fasta files are complete
+	clean_downloads(taxID_list, zip_dir)
+
+	if nucl_count > 0:
 		# assign file name
 		nucl_fasta_file = "nucl.fna"
+	else:
+		os.remove("nucl.fna")
 
 	# make sure there are prot data
-	if len(prot_files) > 0:
-
-		# comebine all taxID protein databases into one single database
-		prot_dbs = ' '.join(prot_files)                      
-		subprocess.run("cat {0} >> prot.faa".format(prot_dbs), shell=True)
-
+	if prot_count > 0:
 		# assign file name
 		prot_fasta_file = "prot.faa"
+	else:
+		os.remove("prot.faa")
 		
 	# return file names for nucl and prot fasta files
 	return nucl_fasta_file, prot_fasta_file, all_specs, prot_specs, prot_file_paths
 
 
-# use fasta file to make blast database
+# file next to a blast database with the fingerprint of the fasta file and parameters it was made from
+def fingerprint_path(db):
+	return db + ".fingerprint"
+
+
+# sha256 of a file
+def file_sha256(file_name):
+	sha = hashlib.sha256()
+	with open(file_name, "rb") as file:
+		for chunk in iter(lambda: file.read(1 << 20), b""):
+			sha.update(chunk)
+	return sha.hexdigest()
+
+
+# read fingerprint of a blast database, None if there is none
+def get_db_fingerprint(db):
+	if not os.path.exists(fingerprint_path(db)):
+		return None
+
+	with open(fingerprint_path(db), "r") as file:
+		try:
+			return json.load(file)
+		except ValueError:
+			return None
+
+
+# write fingerprint of a blast database, replace old fingerprint in one step so it never gets truncated
+def write_db_fingerprint(db, fingerprint):
+	tmp_file = fingerprint_path(db) + ".tmp"
+	with open(tmp_file, "w") as file:
+		json.dump(fingerprint, file)
+	os.replace(tmp_file, fingerprint_path(db))
+
+
+# key of a search in the result cache, None if there is no cache or the database has no fingerprint
+# parts are the program and parameters, files are hashed by content (query, seqid lists)
+def search_key(cache, parts, db, files=[]):
+	if cache is None:
+		return None
+
+	fingerprint = get_db_fingerprint(db)
+	if fingerprint is None:
+		return None
+
+	return cache.key(parts + [fingerprint["sha256"], fingerprint["params"]], files)
+
+
+# check if the files of a blast database exist, single volume (.pin/.nin) or multi volume (.pal/.nal)
+def db_exists(db, seq_type):
+	exts = [".pin", ".pal"] if seq_type == "prot" else [".nin", ".nal"]
+	return any(os.path.exists(db + ext) for ext in exts)
+
+
+# use fasta file to make blast database, skip makeblastdb if the database was already made from the same fasta file and parameters
 def get_dbs(fasta_file, seq_type):
 	file_name = fasta_file[:-4]
+	params = "-dbtype {0} -parse_seqids".format(seq_type)
+	stat = os.stat(fasta_file)
+
+	prev = get_db_fingerprint(file_name)
+	if prev is not None and prev["params"] == params and prev["size"] == stat.st_size and db_exists(file_name, seq_type):
+		# unchanged size and modification time, no need to hash the file
+		if prev["mtime"] == stat.st_mtime_ns:
+			print("BLAST database " + file_name + " is up to date.")
+			return file_name
+
+		# fasta file was touched or rewritten, only rebuild if its content changed
+		sha = file_sha256(fasta_file)
+		if prev["sha256"] == sha:
+			prev["mtime"] = stat.st_mtime_ns
+			write_db_fingerprint(file_name, prev)
+			print("BLAST database " + file_name + " is up to date.")
+			return file_name
+
 	# make BLAST database
-	subprocess.run("makeblastdb -in {0} -out {1} -dbtype {2} -parse_seqids".format(fasta_file, file_name, seq_type).split())
+	result = subprocess.run("makeblastdb -in {0} -out {1} {2}".format(fasta_file, file_name, params).split())
+
+	if result.returncode == 0:
+		write_db_fingerprint(file_name, {"sha256": file_sha256(fasta_file), "size": stat.st_size, "mtime": stat.st_mtime_ns, "params": params})
+	elif os.path.exists(fingerprint_path(file_name)):
+		os.remove(fingerprint_path(file_name))
 	
 	return file_name
 
 
+# split fasta file into n shards of about the same number of letters and make a blast database of each shard
+# shards are re-used as long as the fasta file is unchanged, return {"dbs": shard databases, "letters": letters of the whole fasta file}
+def get_shards(fasta_file, seq_type, n):
+	db = fasta_file[:-4]
+	ext = fasta_file[-4:]
+	shards_file = db + ".shards"
+	stat = os.stat(fasta_file)
+
+	if os.path.exists(shards_file):
+		with open(shards_file, "r") as file:
+			try:
+				shards = json.load(file)
+				if shards["size"] == stat.st_size and shards["mtime"] == stat.st_mtime_ns and len(shards["dbs"]) == n and all(db_exists(shard_db, seq_type) for shard_db in shards["dbs"]):
+					return shards
+			except (ValueError, KeyError):
+				pass
+
+	shard_files = [db + "_shard_" + str(k) + ext for k in range(n)]
+	shard_outs = [open(shard_file, "wb") for shard_file in shard_files]
+	shard_letters = [0] * n
+
+	# every sequence goes to the shard with the fewest letters so far
+	def write_record(record, letters):
+		k = shard_letters.index(min(shard_letters))
+		shard_outs[k].writelines(record)
+		shard_letters[k] += letters
+
+	with open(fasta_file, "rb") as file:
+		record = []
+		letters = 0
+		for line in file:
+			if line.startswith(b">"):
+				if len(record) > 0:
+					write_record(record, letters)
+				record = [line]
+				letters = 0
+			else:
+				record.append(line)
+				letters += len(line.rstrip(b"\r\n"))
+		if len(record) > 0:
+			write_record(record, letters)
+
+	for shard_out in shard_outs:
+		shard_out.close()
+
+	# shards without any sequence are left out
+	shard_dbs = [get_dbs(shard_file, seq_type) for k, shard_file in enumerate(shard_files) if shard_letters[k] > 0]
+
+	shards = {"dbs": shard_dbs, "letters": sum(shard_letters), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+	tmp_file = shards_file + ".tmp"
+	with open(tmp_file, "w") as file:
+		json.dump(shards, file)
+	os.replace(tmp_file, shards_file)
+
+	return shards
+
+
+# number of shards a search runs on
+def shard_count(shards):
+	return 1 if shards is None else len(shards["dbs"])
+
+
+# run a search against a database, or against all of its shards at once
+# shards are searched with the letters of the whole database (-dbsize) so e-values are the same as for a single database
+# results of the shards are merged into blast_file_name, subjects ordered by their best e-value
+def run_search(command, db, blast_file_name, evalue_col, threads=1, shards=None):
+	if shards is None or len(shards["dbs"]) <= 1:
+		check_search(subprocess.run(command + "-db {0} -out {1} -num_threads {2}".format(db, blast_file_name, threads).split()))
+		return
+
+	workers, per_worker = split_threads(threads, len(shards["dbs"]))
+	shard_file_names = [blast_file_name[:-len(".blasted")] + "_" + str(k) + ".blasted" for k in range(len(shards["dbs"]))]
+	commands = []
+
+	for shard_db, shard_file_name in zip(shards["dbs"], shard_file_names):
+		commands.append(command + "-db {0} -out {1} -num_threads {2} -dbsize {3}".format(shard_db, shard_file_name, per_worker, shards["letters"]).split())
+
+	# every shard has to finish, a failed shard would be merged as if it had no hits
+	run_parallel(commands, workers)
+	merge_results(shard_file_names, blast_file_name, evalue_col)
+
+
+# stop if a search failed, its results are incomplete and must not be used or cached
+def check_search(result):
+	if result.returncode != 0:
+		print("\nERROR: " + result.args[0] + " failed with exit code " + str(result.returncode) + ".\n")
+		sys.exit()
+
+
+# merge tabular results of several searches, lines of a subject stay together, subjects are ordered by their best e-value
+# only the top max_target_seqs subjects of each query are kept, as blast would for a single database
+def merge_results(file_names, blast_file_name, evalue_col, max_target_seqs=500):
+	# query => subject => lines, queries and subjects in the order they are first found
+	queries = {}
+
+	for file_name in file_names:
+		if not os.path.exists(file_name):
+			continue
+		with open(file_name, "r") as blast_rslt:
+			for line in blast_rslt:
+				col = line.rstrip("\n").split("\t")
+				if len(col) <= evalue_col:
+					continue
+				queries.setdefault(col[0], {}).setdefault(col[1], []).append(line)
+
+	def best_evalue(lines):
+		return min(float(line.rstrip("\n").split("\t")[evalue_col]) for line in lines)
+
+	with open(blast_file_name, "w") as merged:
+		for subjects in queries.values():
+			for lines in sorted(subjects.values(), key=best_evalue)[:max_target_seqs]:
+				merged.writelines(lines)
+
+
+# request for the seq of a blast hit, nucl hits are fetched from the first to the last position of all their hsps
+def get_seq_request(blast_dict, key, typ):
+	if typ == "prot":
+		return (key, None, None, None)
+
+	posits = []
+	frames = []
+
+	for info in blast_dict[key]:
+		posits.append(info.sstart)
+		posits.append(info.send)
+		frames.append(info.sframe)
+
+	strand = "minus" if all(frame < 0 for frame in frames) else "plus"
+
+	return (key, strand, min(posits), max(posits))
+
+
+# get seq to perform reciprocal blast
+def get_seq(blast_dict, key, typ, db):
+	return fetch_seq(db, *get_seq_request(blast_dict, key, typ))[1]
+
+
+# get seqs of many blast hits with one blastdbcmd call, key => seq
+def get_seqs(blast_dict, keys, typ, db):
+	requests = [get_seq_request(blast_dict, key, typ) for key in keys]
+	records = fetch_seqs(db, requests)
+	return {key: records[request][1] for key, request in zip(keys, requests)}
+
+
 # write result of tblastn and tblastx into a file for blastx
 def write_seq(blast_dict, key, typ, db):
 	file_name = "recip_seq.txt"
-	seq = ''
-	# get seq to perform reciprocal blast
-	if typ == "prot":
-		db_info = subprocess.run("blastdbcmd -db {0} -entry {1}".format(db, key).split(), capture_output=True, text=True).stdout.split("\n")
-		seq = ''.join(db_info[1:-1])
-		
-	elif typ == "nucl":
-		starts = []
-		ends = []
-		frames = []
-		posits = []
-		db_info = None
-		
-		for info in blast_dict[key]:
-			posits.append(int(info[1]))
-			posits.append(int(info[2]))
-			frames.append(int(info[9]))
-			
-		start = min(posits)
-		end = max(posits)
-		
-		if all(int(frame) < 0 for frame in frames):
-			db_info = subprocess.run("blastdbcmd -db {0} -entry {1} -strand minus -range {2}-{3}".format(db, key, start, end).split(), capture_output=True, text=True).stdout.split("\n")
-			
-		else:
-			db_info = subprocess.run("blastdbcmd -db {0} -entry {1} -strand plus -range {2}-{3}".format(db, key, start, end).split(), capture_output=True, text=True).stdout.split("\n")
-			
-		seq = ''.join(db_info[1:-1])
+	seq = get_seq(blast_dict, key, typ, db)
 
 	# put key_val into fasta format (seq, id, description)
 	blast_seq = SeqIO.SeqRecord(Seq(seq), id=key, description=blast_dict[key][0][0])
@@ -204,6 +394,42 @@ def write_seq(blast_dict, key, typ, db):
 	return file_name
 
 
+# write seqs of all blast hits into multi-fasta files, one per shard, seqs are named by their index in keys since blast may reformat ids
+def write_seqs(blast_dict, keys, typ, db, shards=1, seqs=None, tag=""):
+	file_names = []
+	index = 0
+
+	if seqs is None:
+		seqs = get_seqs(blast_dict, keys, typ, db)
+
+	for shard, shard_keys in enumerate(split_list(keys, shards)):
+		file_name = "recip_seqs" + tag + ".txt" if shards == 1 else "recip_seqs" + tag + "_" + str(shard) + ".txt"
+		file_names.append(file_name)
+
+		with open(file_name, "w") as fasta_file:
+			for key in shard_keys:
+				seq = seqs[key]
+				blast_seq = SeqIO.SeqRecord(Seq(seq), id="recip_" + str(index), description=blast_dict[key][0][0])
+				SeqIO.write(blast_seq, fasta_file, "fasta")
+				index += 1
+
+	return file_names
+
+
+# get top subject of every query in a tabular blast result, query => subject id
+def get_top_hits(blast_file_name):
+	top_hits = {}
+
+	with open(blast_file_name, "r") as blast_rslt:
+		for line in blast_rslt:
+			rslt = line.strip('\n').split("\t")
+			# results are sorted by query then by score, first line of a query is its top hit
+			if len(rslt) > 1 and rslt[0] not in top_hits:
+				top_hits[rslt[0]] = rslt[1]
+
+	return top_hits
+
+
 # remove any seq that were not validated in blastp_rev
 def update_blast_dict(blast_hit_dict, valid_seq_list):
 	
@@ -215,187 +441,158 @@ def update_blast_dict(blast_hit_dict, valid_seq_list):
 		del blast_hit_dict[seq_id]
 
 
+# lines of the tabular output of a forward search
+# taken from the result cache, read from the merged results of the shards, or streamed from the stdout of blast as it runs
+# blast_file_name is only kept if keep_file is True, lines are stored in the result cache once they have all been read
+def search_lines(command, db, blast_file_name, evalue_col, threads=1, shards=None, cache=None, key=None, keep_file=True):
+	if key is not None:
+		data = cache.get(key)
+		if data is not None:
+			if keep_file:
+				with open(blast_file_name, "wb") as file:
+					file.write(data)
+			yield from data.decode().splitlines(True)
+			return
+
+	lines = []
+
+	if shard_count(shards) > 1:
+		# shard results have to be merged before they are read
+		run_search(command, db, blast_file_name, evalue_col, threads, shards)
+		with open(blast_file_name, "r") as blast_rslt:
+			lines = blast_rslt.readlines()
+		if not keep_file:
+			os.remove(blast_file_name)
+		yield from lines
+	else:
+		out_file = blast_file_name if keep_file else None
+		for line in stream_lines(command + "-db {0} -num_threads {1}".format(db, threads).split(), out_file):
+			if key is not None:
+				lines.append(line)
+			yield line
+
+	if key is not None:
+		cache.put(key, ''.join(lines).encode())
+
+
 # perform blast against amino acids dataset
-def blast_aa_ds(query, typ, db, evalue):
+def blast_aa_ds(query, typ, db, evalue, threads=1, shards=None, cache=None, keep_file=True, tag=""):
     
-	# dict of hits, key=>prot_id value=>[species_name, start, end, evalue, subsequence]
-	blast_hits = {}
-
 	# if query is prot seq => perform blastp, if query is nucl => perform blastx
 	if typ == "prot":
 		blast_typ = "blastp"
 	elif typ == "nucl":
 		blast_typ = "blastx"
 
-	blast_file_name = blast_typ + "_results.blasted"
+	blast_file_name = blast_typ + "_results" + tag + ".blasted"
 
-	if blast_typ == "blastp":
-		# run blastp 
-		subprocess.run("blastp -query {0} -db {1} -out {2} -outfmt {3} -evalue {4}".format(query, db, blast_file_name, "6", evalue).split())
-	elif blast_typ == "blastx":
-		# run blastx 
-		subprocess.run("blastx -query {0} -db {1} -out {2} -outfmt {3} -evalue {4}".format(query, db, blast_file_name, "6", evalue).split())
+	# re-use result of the same search from an earlier round or run, shards only change the order of subjects with equal e-values
+	key = search_key(cache, [blast_typ, evalue, prot_outfmt, shard_count(shards)], db, [query])
+	command = "{0} -query {1} -evalue {2}".format(blast_typ, query, evalue).split() + ["-outfmt", prot_outfmt]
 
-	# fill out information into the dictionary
-	# open blast result file
-	# make sure file is not empty
-	if os.stat(blast_file_name).st_size != 0:
-		with open(blast_file_name, "r") as blast_rslt:
-			for rslt_line in blast_rslt:
-				col = rslt_line.strip().split("\t")
-				# get protein id
-				seq_id = col[1]
-				# get start of alignment in protein subject
-				sstart = col[8]
-				# get end of alignment in protein subject
-				send = col[9]
-				# get e-value
-				evalue = col[10]
-
-				# run blastdbcmd to access database to get subsequence and species name
-				db_info = subprocess.run("blastdbcmd -db {0} -entry {1}".format(db, seq_id, sstart, send).split(), capture_output=True, text=True).stdout.split("\n")
-
-				# get species name
-				spec_name = None
-				full_name_list = None
-
-				if '[[' in db_info[0]:
-					full_name_list = re.search(r'\[\[(.+?)\]\s(.+?)\]', db_info[0])
-					full_name_list = full_name_list.group(1)+ " "+full_name_list.group(2)
-					full_name_list = full_name_list.split()
-				else:
-					full_name_list = re.search(r'\[(.*?)\]', db_info[0]).group(1).split()
-
-				special_case1 = ["sp.", "aff."] 
-				special_case2 = ["NRRL", "CBS", "JCM", "NYNU", "CRUB", "Ashbya", "UWO(PS)", "MTCC", "UWOPS", "isolate"]
-				special_case3 = ["MAG"]
-
-				if any(name.lower() == special_word.lower() for special_word in special_case3 for name in full_name_list):
-					spec_name = ' '.join(full_name_list[2:6])
-				elif any (full_name_list[1].lower() == special_word.lower() for special_word in special_case1):
-					if len(full_name_list) > 2 and any (full_name_list[2].lower() == special_word.lower() for special_word in special_case2):
-						spec_name = ' '.join(full_name_list[:4])
-					else:
-						spec_name = ' '.join(full_name_list[:3])
-				else:
-					spec_name = ' '.join(full_name_list[:2])
-					
-				# remove ' 
-				if "'" in spec_name:
-					spec_name = spec_name.replace("'", "")
-
-				# fill out info for dictionary 
-				if seq_id not in blast_hits.keys():
-					blast_hits[seq_id] = [[spec_name, sstart, send, evalue]]
-				else:
-					blast_hits[seq_id].append([spec_name, sstart, send, evalue])
+	# dict of hits, key=>prot_id value=>list of ProtHit(spec, sstart, send, evalue), one per hsp
+	blast_hits = parse_hits(search_lines(command, db, blast_file_name, 10, threads, shards, cache, key, keep_file), parse_prot_line, ProtHit)
 												
 	# return dict results and file name 
-	return blast_hits, blast_file_name
+	return blast_hits, blast_file_name if keep_file else None
 
 
 # perform blast against nucleotides dataset
-def blast_nucl_ds(query, typ, db, evalue):
+def blast_nucl_ds(query, typ, db, evalue, threads=1, exclude_file=None, shards=None, cache=None, keep_file=True, tag=""):
 
-	# dict of hits, key=>prot_id value=>[species_name, start, end, evalue, subsequence]
-	blast_hits = {}
-
-	# if query is prot seq => perform blastp, if query is nucl => perform blastx
+	# if query is prot seq => perform tblastn, if query is nucl => perform tblastx
 	if typ == "prot":
 		blast_typ = "tblastn"
 	elif typ == "nucl":
 		blast_typ = "tblastx"
 
-	blast_file_name = blast_typ + "_results.blasted"
+	blast_file_name = blast_typ + "_results" + tag + ".blasted"
 
-	if blast_typ == "tblastn":
-		# run tblastn 
-		subprocess.run("tblastn -query {0} -db {1} -out {2} -evalue {3}".format(query, db, blast_file_name, evalue).split() + ["-outfmt", "6 qseqid sseqid length qstart qend sstart send evalue qseq sseq sframe"])
-	elif blast_typ == "tblastx":
-		# run tblastx 
-		subprocess.run("tblastx -query {0} -db {1} -out {2} -evalue {3}".format(query, db, blast_file_name, evalue, ).split() + ["-outfmt", "6 qseqid sseqid length qstart qend sstart send evalue qseq sseq sframe"])
-	
-    # fill out information into the dictionary
-	# open blast result file
-	# make sure file is not empty
-	if os.stat(blast_file_name).st_size != 0:
-		with open(blast_file_name, "r") as blast_rslt:
-			for rslt_line in blast_rslt:
-				col = rslt_line.strip().split("\t")
-				# get nucleotide id
-				seq_id = col[1]
-				# length of alignment
-				length = col[2]
-				# get start of alignment in query
-				qstart = col[3]
-				# get end of alignment in query
-				qend = col[4]
-				# get start of alignment in nucl subject
-				sstart = col[5]
-				# get end of alignment in nucl subject
-				send = col[6]
-				# get e-value
-				evalue = col[7]
-				# get query aa seq alignment
-				qseq = col[8]
-				# get subject aa seq alignment
-				sseq = col[9]
-				# get subject frame
-				sframe = col[10]
-				
-				# initialize string to capture info
-				db_info = None
-
-				# if plus strand
-				if int(sstart) < int(send):
-					# run blastdbcmd to access database to get subsequence and species name
-					db_info = subprocess.run("blastdbcmd -db {0} -entry {1}".format(db, seq_id, sstart, send).split(), capture_output=True, text=True).stdout.split("\n")
-
-				# if mi nus strand
-				else:
-					# run blastdbcmd to access database to get subsequence and species name
-					db_info = subprocess.run("blastdbcmd -db {0} -entry {1}".format(db, seq_id, send, sstart).split(), capture_output=True, text=True).stdout.split("\n")
-
-				# get species name
-				spec_name = None
-				full_name_list = None
-				full_name = db_info[0][1:]
-
-				if "[" in full_name:
-					full_name = full_name.replace('[', '').replace(']', '')
-				if "'" in full_name:
-					full_name = full_name.replace("'", '')
-
-				special_case1 = ["sp.", "aff."] 
-				special_case2 = ["NRRL", "CBS", "JCM", "NYNU", "CRUB", "Ashbya", "UWO(PS)", "MTCC", "UWOPS", "isolate"]
-				special_case3 = ["MAG"]
-
-				full_name_list = full_name.split()
-
-				if any(name.lower() == special_word.lower() for special_word in special_case3 for name in full_name_list):
-					spec_name = ' '.join(full_name_list[3:7])
-				elif any(full_name_list[2].lower() == special_word.lower() for special_word in special_case1):
-					if any(full_name_list[3].lower() == special_word.lower() for special_word in special_case2):
-						spec_name = ' '.join(full_name_list[1:5])
-					else:
-						spec_name = ' '.join(full_name_list[1:4])
-				else:
-					spec_name = ' '.join(full_name_list[1:3])
-
-				# fill out info for dictionary 
-				if "|" in seq_id:
-					seq_id = seq_id.split("|")[1]
-					
-				if seq_id not in blast_hits.keys():
-					blast_hits[seq_id] = [[spec_name, sstart, send, evalue, qstart, qend, length, qseq, sseq, sframe]]
-				else:
-					blast_hits[seq_id].append([spec_name, sstart, send, evalue, qstart, qend, length, qseq, sseq, sframe])
+	# sequences of species already found in the aa dataset are left out of the search
+	exclude = [] if exclude_file is None else ["-negative_seqidlist", exclude_file]
+
+	# re-use result of the same search from an earlier round or run, excluded seqs are part of the key
+	key = search_key(cache, [blast_typ, evalue, nucl_outfmt, shard_count(shards)], db, [query] + exclude[1:])
+	command = "{0} -query {1} -evalue {2}".format(blast_typ, query, evalue).split() + exclude + ["-outfmt", nucl_outfmt]
+
+	# dict of hits, key=>scaffold id value=>list of NuclHit(spec, sstart, send, evalue, qstart, qend, length, qseq, sseq, sframe), one per hsp
+	blast_hits = parse_hits(search_lines(command, db, blast_file_name, 7, threads, shards, cache, key, keep_file), parse_nucl_line, NuclHit)
 						
 	# return results dict and file name
-	return blast_hits, blast_file_name
+	return blast_hits, blast_file_name if keep_file else None
 
 # reverse blast
-def recip_blast(blast_type, query_dict, db, id_of_interest, db2):	
+# hits in known were confirmed before (e.g. in an earlier round) and are valid without being searched again
+def recip_blast(blast_type, query_dict, db, id_of_interest, db2, batch=True, threads=1, cache=None, known=(), tag=""):	
+	blast_file_name = blast_type + "_rev_results" + tag + ".blasted"
+
+	# search every hit one by one
+	if not batch:
+		return recip_blast_each(blast_type, query_dict, db, id_of_interest, db2)
+
+	# list of valid hits id
+	blastp_hits = []
+
+	keys = [seq_id for seq_id in query_dict.keys() if seq_id not in known]
+	if len(keys) == 0:
+		return [seq_id for seq_id in query_dict.keys() if seq_id in known]
+
+	if blast_type == "blastp" or blast_type == "tblastn":
+		typ = "prot"
+	elif blast_type == "blastx" or blast_type == "tblastx":
+		typ = "nucl"
+
+	seqs = get_seqs(query_dict, keys, typ, db2)
+
+	# top subject of every hit, hits searched in an earlier round or run are taken from the result cache
+	top_hits = {}
+	seq_keys = {}
+	for seq_id in keys:
+		seq_keys[seq_id] = search_key(cache, ["recip", blast_type, "6", "-max_target_seqs 1", seqs[seq_id]], db)
+		if seq_keys[seq_id] is not None:
+			cached = cache.get(seq_keys[seq_id])
+			if cached is not None:
+				top_hits[seq_id] = cached.decode()
+
+	to_search = [seq_id for seq_id in keys if seq_id not in top_hits]
+
+	if len(to_search) > 0:
+		# split thread budget between blast processes, each process gets one shard of the hits
+		workers, per_worker = split_threads(threads, len(to_search))
+
+		# all hits go into one multi-fasta query per shard, one reciprocal blast per shard for the whole round
+		queries = write_seqs(query_dict, to_search, typ, db2, workers, seqs, tag)
+
+		# only the top subject of each query is needed
+		out_files = [blast_file_name if workers == 1 else blast_type + "_rev_results" + tag + "_" + str(shard) + ".blasted" for shard in range(workers)]
+		commands = ["{0} -query {1} -db {2} -out {3} -outfmt {4} -max_target_seqs 1 -num_threads {5}".format(blast_type, query, db, out_file, "6", per_worker).split() for query, out_file in zip(queries, out_files)]
+		run_parallel(commands, workers)
+
+		# query names are unique across shards
+		shard_top_hits = {}
+		for out_file in out_files:
+			shard_top_hits.update(get_top_hits(out_file))
+
+		# seqs are named by their index in to_search, hits without any subject are cached as ''
+		new_results = []
+		for index, seq_id in enumerate(to_search):
+			top_hits[seq_id] = shard_top_hits.get("recip_" + str(index), '')
+			if seq_keys[seq_id] is not None:
+				new_results.append((seq_keys[seq_id], top_hits[seq_id].encode()))
+
+		if len(new_results) > 0:
+			cache.put_many(new_results)
+
+	# check if the first result is id_of_interest
+	for seq_id in query_dict.keys():
+		if seq_id in known or top_hits[seq_id] == id_of_interest:
+			blastp_hits.append(seq_id)
+
+	return blastp_hits
+
+
+# reverse blast, one search per hit
+def recip_blast_each(blast_type, query_dict, db, id_of_interest, db2):	
 	blast_file_name = blast_type + "_rev_results.blasted"
 
 	# list of valid hits id
@@ -436,40 +633,115 @@ def recip_blast(blast_type, query_dict, db, id_of_interest, db2):
 	return blastp_hits
 
 
-# remove seqs from fasta
-def rm_seqs_fasta(blast_dict, fasta_file):
-	out_file = "nucl_2.fna"
-	
-	blastp_spec = []
-	# get species from blastp
-	for result in blast_dict.keys():
-		spec_name = blast_dict[result][0][0].lower()
-		if spec_name not in blastp_spec:
-			blastp_spec.append(spec_name)
-			
-	# check if species name is present in the description, write sequences w/o species name
-	with open(out_file, "w") as file:
-		for seq in SeqIO.parse(fasta_file, "fasta"):
-			seq_des = seq.description.lower()
-			if "[" in seq_des:
-				seq_des = seq_des.replace('[', '').replace(']', '')
-			if "'" in seq_des:
-				seq_des = seq_des.replace("'", '')
-			if not any(spec_name in seq_des for spec_name in blastp_spec):
-				SeqIO.write(seq, file, "fasta")
-				
-	if os.stat(out_file).st_size == 0:
-		out_file = None
+# path of the species => seq ids index of a nucl fasta file
+def spec_index_path(fasta_file):
+	return fasta_file + ".specs"
+
+
+# get index of species (lowercase) => ids of their sequences in a nucl fasta file, only deflines are read
+# index is saved next to the fasta file and re-used as long as the fasta file does not change
+def get_spec_index(fasta_file):
+	index_file = spec_index_path(fasta_file)
+	stat = os.stat(fasta_file)
+
+	if os.path.exists(index_file):
+		with open(index_file, "r") as file:
+			try:
+				saved = json.load(file)
+				if saved["size"] == stat.st_size and saved["mtime"] == stat.st_mtime_ns:
+					return saved["index"]
+			except (ValueError, KeyError):
+				pass
+
+	spec_index = {}
+	with open(fasta_file, "rb") as file:
+		for line in file:
+			if line.startswith(b">"):
+				defline = line.decode().rstrip("\n")
+				seq_id = defline[1:].split(None, 1)[0]
+				spec_name = spec_from_nucl_defline(defline).lower()
+				spec_index.setdefault(spec_name, []).append(seq_id)
+
+	# searches running at the same time may build the index at the same time, each writes its own tmp file
+	tmp_file = index_file + "." + str(threading.get_ident()) + ".tmp"
+	with open(tmp_file, "w") as file:
+		json.dump({"size": stat.st_size, "mtime": stat.st_mtime_ns, "index": spec_index}, file)
+	os.replace(tmp_file, index_file)
+
+	return spec_index
+
+
+# write ids of the nucl sequences of species in blast_dict into a list for -negative_seqidlist
+# return False if no sequence is left to search, and the list file (None if nothing is excluded)
+def exclude_specs(blast_dict, fasta_file, tag=""):
+	exclude_file = "nucl_exclude" + tag + ".txt"
+	spec_index = get_spec_index(fasta_file)
+
+	blastp_spec = set(blast_dict[result][0][0].lower() for result in blast_dict.keys())
+
+	# species names of the nucl dataset that contain a species of the blast results
+	excluded_specs = [spec_name for spec_name in spec_index.keys() if any(spec in spec_name for spec in blastp_spec)]
+
+	if len(excluded_specs) == len(spec_index):
+		return False, None
+
+	if len(excluded_specs) == 0:
+		return True, None
+
+	with open(exclude_file, "w") as file:
+		for spec_name in excluded_specs:
+			for seq_id in spec_index[spec_name]:
+				file.write(seq_id + "\n")
+
+	return True, exclude_file
 
-	# return file name
-	return out_file
 
+# version of the format written by write_dict
+dict_version = 1
 
-# write blast results and and their info to txt file
+
+# write blast results and and their info to a json lines file
+# one json value per line, the first line is a header with the schema version and whether the values are lists of hits
 def write_dict(blast_type, blast_dict, i):
-	with open(blast_type + "_" + i + "_dict.txt", "w") as file:
-		for key, value in blast_dict.items():
-			file.write(f"{key}: {value}\n")
+	rows = []
+	hits = False
+	for key, value in blast_dict.items():
+		hits = hits or is_hit_list(value)
+		rows.append((key, hits_to_lists(value)))
+
+	with open(dict_file_name(blast_type, i), "w") as file:
+		file.write(json.dumps({"schema": "dict", "version": dict_version, "name": blast_type, "hits": hits}) + "\n")
+		for key, value in rows:
+			file.write(json.dumps([key, value]) + "\n")
+
+
+# name of a file written by write_dict, older versions wrote '.txt' files
+def dict_file_name(blast_type, i, ext=".jsonl"):
+	return blast_type + "_" + i + "_dict" + ext
+
+
+# read a dict written by write_dict, lists of hits are read back into hits
+# files written by older versions ('.txt') are read if there is no '.jsonl' file
+def read_dict(blast_type, i):
+	file_name = dict_file_name(blast_type, i)
+	if not os.path.exists(file_name):
+		return txt_to_dict(dict_file_name(blast_type, i, ".txt"))
+
+	result_dict = {}
+	with open(file_name, "r") as file:
+		header = json.loads(file.readline())
+		if header.get("schema") != "dict" or header.get("version", 0) > dict_version:
+			print("\nERROR: " + file_name + " was written in an unknown format.\n")
+			sys.exit()
+
+		for line in file:
+			if line.strip():
+				key, value = json.loads(line)
+				result_dict[key] = value
+
+	if header["hits"]:
+		return dict_from_lists(result_dict)
+	return result_dict
 			
 			
 # write summary for blastp and/or tblastn
@@ -551,21 +823,23 @@ def read_list(filename):
 
 
 # read txt and return a dict
+# read a dict written by older versions of write_dict, one 'key: value' per line
+# values are python literals (e.g. lists of hits) or plain strings (e.g. file paths)
 def txt_to_dict(filename):
 	result_dict = {}
 
 	with open(filename, 'r') as file:
 		for line in file:
-			line = line.strip()
-			if line:
-				parts = line.split(': ')
-			
-				key = parts[0]
-				
-				s = "'" + parts[1] + "'"
-				values = eval(s)
+			line = line.rstrip('\n')
+			if line.strip():
+				key, value = line.split(': ', 1)
+
+				try:
+					value = ast.literal_eval(value)
+				except (ValueError, SyntaxError):
+					pass
 
-				result_dict[key] = values
+				result_dict[key] = value
 
 	return result_dict
 	
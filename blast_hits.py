@@ -0,0 +1,130 @@
+import sys
+import subprocess
+from typing import NamedTuple
+from spec_names import spec_from_prot_defline, spec_from_nucl_title
+from hit_table import HitTable
+
+
+# columns of forward searches, subject title is added so the species name is read from the results instead of the database
+prot_outfmt = "6 std stitle"
+nucl_outfmt = "6 qseqid sseqid length qstart qend sstart send evalue qseq sseq sframe stitle"
+
+
+# one hsp of a blastp/blastx hit against the aa dataset
+class ProtHit(NamedTuple):
+	spec: str
+	sstart: int
+	send: int
+	evalue: float
+
+
+# one hsp of a tblastn/tblastx hit against the nucl dataset
+class NuclHit(NamedTuple):
+	spec: str
+	sstart: int
+	send: int
+	evalue: float
+	qstart: int
+	qend: int
+	length: int
+	qseq: str
+	sseq: str
+	sframe: int
+
+
+# parse a line of prot_outfmt into (seq id, hit)
+def parse_prot_line(line):
+	col = line.rstrip("\n").split("\t")
+	return col[1], ProtHit(spec_from_prot_defline(col[12]), int(col[8]), int(col[9]), float(col[10]))
+
+
+# parse a line of nucl_outfmt into (seq id, hit), database prefix is removed from the id, e.g. 'ref|NC_1.1|' => 'NC_1.1'
+def parse_nucl_line(line):
+	col = line.rstrip("\n").split("\t")
+	seq_id = col[1]
+	spec_name = spec_from_nucl_title(seq_id, col[11])
+
+	if "|" in seq_id:
+		seq_id = seq_id.split("|")[1]
+
+	return seq_id, NuclHit(spec_name, int(col[5]), int(col[6]), float(col[7]), int(col[3]), int(col[4]), int(col[2]), col[8], col[9], int(col[10]))
+
+
+# group hits of tabular blast output by subject into a column store, return a dict view of seq id => list of hits in the order blast reported them
+def parse_hits(lines, parse_line, hit_type):
+	table = HitTable(hit_type)
+	for line in lines:
+		if not line.strip():
+			continue
+		seq_id, hit = parse_line(line)
+		table.append(seq_id, hit)
+	return table.view()
+
+
+# run blast and yield its tabular output line by line as it is written, copy the lines into out_file if given
+def stream_lines(command, out_file=None):
+	process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+	out = open(out_file, "w") if out_file is not None else None
+
+	try:
+		for line in process.stdout:
+			if out is not None:
+				out.write(line)
+			yield line
+	finally:
+		process.stdout.close()
+		process.wait()
+		if out is not None:
+			out.close()
+
+	# results of a failed search are incomplete
+	if process.returncode != 0:
+		print("\nERROR: " + command[0] + " failed with exit code " + str(process.returncode) + ".\n")
+		sys.exit()
+
+
+# hit as a plain list, e.g. to write it to a text file
+def hit_to_list(hit):
+	return list(hit)
+
+
+# hit from a plain list, values written as strings by older versions are converted to numbers
+def hit_from_list(values):
+	if len(values) == len(NuclHit._fields):
+		hit_type = NuclHit
+	else:
+		hit_type = ProtHit
+
+	return hit_type(*[field_type(value) for field_type, value in zip(hit_type.__annotations__.values(), values)])
+
+
+# check if a value of a result dict is a list of hits
+def is_hit_list(value):
+	return isinstance(value, list) and len(value) > 0 and isinstance(value[0], (ProtHit, NuclHit))
+
+
+# value of a result dict as plain lists if it is a list of hits, other values are returned as they are
+def hits_to_lists(value):
+	if is_hit_list(value):
+		return [hit_to_list(hit) for hit in value]
+	return value
+
+
+# result dict as plain lists, seq id => list of hits as lists
+def dict_to_lists(blast_dict):
+	return {seq_id: hits_to_lists(hits) for seq_id, hits in blast_dict.items()}
+
+
+# result dict from plain lists, hits are stored in a HitTable like the results of a search
+def dict_from_lists(lists):
+	table = None
+	for seq_id, hits in lists.items():
+		for values in hits:
+			hit = hit_from_list(values)
+			if table is None:
+				table = HitTable(type(hit))
+			table.append(seq_id, hit)
+
+	if table is None:
+		return {}
+	return table.view()
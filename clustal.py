@@ -3,6 +3,7 @@ from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 import os
 import subprocess
+from seq_fetch import fetch_seqs
 
 class Clustal():
 	
@@ -24,10 +25,15 @@ class Clustal():
 			
 		# add prot seqs to fasta file
 		if self.blast_dict is not None:
-			for seq_id in self.blast_dict.keys():
-				db_info = subprocess.run("blastdbcmd -db {0} -entry {1}".format(self.prot_db, seq_id).split(), capture_output=True, text=True).stdout.split("\n")
-				des = '\t'.join(db_info[0].split()[1:])
-				aa_seq = Seq(''.join(db_info[1:-1]))
+			# fetch all prot seqs with one blastdbcmd call
+			requests = [(seq_id, None, None, None) for seq_id in self.blast_dict.keys()]
+			records = fetch_seqs(self.prot_db, requests)
+			
+			for request in requests:
+				seq_id = request[0]
+				defline, seq = records[request]
+				des = '\t'.join(defline.split()[1:])
+				aa_seq = Seq(seq)
 
 				fasta_seq = SeqIO.SeqRecord(aa_seq, id=seq_id, description=des)
 
@@ -72,7 +78,7 @@ class Clustal():
 				seq_id = new_line.split()[0].strip()
 				spec_name = ''
 				
-				if isinstance(anno_dicts[seq_id][0], list):
+				if not isinstance(anno_dicts[seq_id][0], str):
 					spec_name = anno_dicts[seq_id][0][0]
 				else:	
 					spec_name = anno_dicts[seq_id][0]
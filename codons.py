@@ -0,0 +1,66 @@
+import numpy as np
+
+
+# codons are read on the plus strand, codons of the minus strand are found as their reverse complements at the same positions
+codon_sets = {"stop": ["TAG", "TAA", "TGA"],
+			  "start": ["ATG"],
+			  "rev_stop": ["CTA", "TTA", "TCA"],
+			  "rev_start": ["CAT"]}
+
+# nucleotide => code, any other character => 4 so codons with it never match
+base_codes = np.full(256, 4, dtype=np.uint8)
+for code, base in enumerate("ACGT"):
+	base_codes[ord(base)] = code
+	base_codes[ord(base.lower())] = code
+
+
+# code of a codon, 3 base codes in base 5
+def codon_code(codon):
+	return int(base_codes[ord(codon[0])]) * 25 + int(base_codes[ord(codon[1])]) * 5 + int(base_codes[ord(codon[2])])
+
+
+# positions of start and stop codons of a scaffold, in each of the 3 frames, so the nearest codon in a frame is found by binary search instead of reading the scaffold codon by codon
+# positions are 0-based starts of codons on the plus strand
+class CodonIndex():
+
+	def __init__(self, strand):
+		self.length = len(strand)
+		# one byte per base, characters that are not ascii are replaced so positions stay the same
+		codes = base_codes[np.frombuffer(strand.encode("ascii", "replace"), dtype=np.uint8)]
+		codons = codes[:-2] * 25 + codes[1:-1] * 5 + codes[2:]
+
+		# codon set => sorted positions of each frame
+		self.posits = {}
+		for name, codon_set in codon_sets.items():
+			posits = np.flatnonzero(np.isin(codons, [codon_code(codon) for codon in codon_set]))
+			self.posits[name] = [posits[posits % 3 == frame] for frame in range(3)]
+
+		self.size = sum(posits.nbytes for frame_posits in self.posits.values() for posits in frame_posits)
+
+
+	# first codon of a set at or after posit, in the frame of posit, None if there is none
+	def next(self, name, posit):
+		posits = self.posits[name][posit % 3]
+		index = np.searchsorted(posits, posit, side="left")
+		return int(posits[index]) if index < len(posits) else None
+
+
+	# last codon of a set at or before posit, in the frame of posit, None if there is none
+	def prev(self, name, posit):
+		posits = self.posits[name][posit % 3]
+		index = np.searchsorted(posits, posit, side="right") - 1
+		return int(posits[index]) if index >= 0 else None
+
+
+# first position at or after posit, in the frame of posit, where a codon does not fit on the strand anymore
+def frame_end(posit, length):
+	if posit + 3 > length:
+		return posit
+	return posit + 3 * ((length - 3 - posit) // 3 + 1)
+
+
+# first position at or before posit, in the frame of posit, that is before the start of the strand
+def frame_start(posit):
+	if posit < 0:
+		return posit
+	return posit - 3 * (posit // 3 + 1)
@@ -0,0 +1,285 @@
+import subprocess
+import os
+import shutil
+import json
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+# file that records which taxIDs have been fully downloaded
+manifest_file = "download_manifest.txt"
+
+# assembly data report inside the datasets zip file
+report_member = "ncbi_dataset/data/assembly_data_report.jsonl"
+
+
+# read taxIDs completed in a previous (possibly interrupted) run, taxID => where its dataset is ("zip" or "cache")
+def read_manifest():
+	done = {}
+
+	if os.path.exists(manifest_file):
+		with open(manifest_file, "r") as file:
+			for line in file:
+				line = line.strip()
+				if line:
+					taxID, source = line.split("\t")
+					done[taxID] = source
+
+	return done
+
+
+# record a taxID as completed, flush right away so an interrupted run keeps it
+def mark_done(taxID, source):
+	with open(manifest_file, "a") as file:
+		file.write(taxID + "\t" + source + "\n")
+		file.flush()
+		os.fsync(file.fileno())
+
+
+# get assembly data report lines of one taxID without downloading the sequences
+def get_summary(taxID, zip_dir):
+	report_lines = []
+
+	if zip_dir is not None:
+		zip_file = os.path.join(zip_dir, "{0}.zip".format(taxID))
+		if not os.path.exists(zip_file):
+			return []
+		with zipfile.ZipFile(zip_file) as archive:
+			if report_member not in archive.namelist():
+				return []
+			report_lines = archive.read(report_member).decode().split("\n")
+	else:
+		result = subprocess.run("datasets summary genome taxon {0} --reference --as-json-lines".format(taxID).split(), capture_output=True, text=True)
+		if result.returncode != 0:
+			return []
+		report_lines = result.stdout.split("\n")
+
+	return [line for line in report_lines if line.strip()]
+
+
+# accession and assembly name of a line of the assembly data report
+def get_acs_asm(report_line):
+	report = json.loads(report_line)
+	return report["accession"], report["assemblyInfo"]["assemblyName"]
+
+
+# link the dataset of one taxID from the genome cache, return False if any assembly is not cached
+def get_cached_taxid(taxID, zip_dir, cache):
+	report_lines = get_summary(taxID, zip_dir)
+	if len(report_lines) == 0:
+		return False
+
+	acs_asm_list = [get_acs_asm(line) for line in report_lines]
+	if not all(cache.has(acs, asm) for acs, asm in acs_asm_list):
+		return False
+
+	path = os.path.join(taxID, "ncbi_dataset", "data")
+	for acs, asm in acs_asm_list:
+		if not cache.get(acs, asm, os.path.join(path, acs)):
+			shutil.rmtree(taxID)
+			return False
+
+	with open(os.path.join(path, "assembly_data_report.jsonl"), "w") as file:
+		file.write("\n".join(report_lines) + "\n")
+
+	return True
+
+
+# download the dataset of one taxID into taxID.zip, return where the dataset is ("zip" or "cache"), None if failed
+def download_taxid(taxID, zip_dir, cache):
+
+	# remove leftovers of an interrupted attempt
+	if os.path.isdir(taxID):
+		shutil.rmtree(taxID)
+
+	# every reference assembly of the taxID was downloaded in an earlier run
+	if cache is not None and get_cached_taxid(taxID, zip_dir, cache):
+		return "cache"
+
+	# use pre-fetched zip file in place of the datasets CLI
+	if zip_dir is not None:
+		if os.path.exists(os.path.join(zip_dir, "{0}.zip".format(taxID))):
+			return "zip"
+		return None
+
+	# download reference genome/set of reference genomes and protein, combine them into taxID.zip file
+	# download under a temporary name so an interrupted download is never mistaken for a complete one
+	zip_file = "{0}.zip".format(taxID)
+	part_file = zip_file + ".part"
+	result = subprocess.run("datasets download genome taxon {0} --reference --include genome,protein --filename {1}".format(taxID, part_file).split())
+	if result.returncode != 0 or not os.path.exists(part_file):
+		return None
+	os.replace(part_file, zip_file)
+
+	return "zip"
+
+
+# get path to the zip file of a taxID
+def get_zip_file(taxID, zip_dir):
+	if zip_dir is not None:
+		return os.path.join(zip_dir, "{0}.zip".format(taxID))
+	return "{0}.zip".format(taxID)
+
+
+# check if the dataset of a taxID recorded in the manifest is still available
+def has_dataset(taxID, source, zip_dir):
+	if source == "cache":
+		return os.path.isdir(taxID)
+	return os.path.exists(get_zip_file(taxID, zip_dir))
+
+
+# remove downloaded zip files and the manifest once all datasets are combined into fasta files
+# zip files from zip_dir are inputs of the user and are kept
+def clean_downloads(taxID_list, zip_dir=None):
+	if zip_dir is None:
+		for taxID in taxID_list:
+			zip_file = "{0}.zip".format(taxID)
+			if os.path.exists(zip_file):
+				os.remove(zip_file)
+
+	if os.path.exists(manifest_file):
+		os.remove(manifest_file)
+
+
+# read access to the dataset of one taxID, either straight from its zip file or from its folder (linked from the genome cache)
+class TaxonDataset():
+
+	def __init__(self, taxID, source, zip_dir, cache):
+		self.taxID = taxID
+		self.cache = cache
+		self.path = os.path.join(taxID, "ncbi_dataset", "data")
+		self.archive = None
+		self.members = set()
+		# (accession, assembly name) => files stored in the genome cache so far, None if a file is too large to be cached
+		self.pending = {}
+		# index keys of assemblies of this taxID already cached, never evicted while the taxID is processed
+		self.cached_keys = set()
+
+		if source == "zip":
+			self.archive = zipfile.ZipFile(get_zip_file(taxID, zip_dir))
+			self.members = set(self.archive.namelist())
+
+			# keep assembly data report next to the protein files
+			os.makedirs(self.path, exist_ok=True)
+			if report_member in self.members:
+				self.extract(report_member, os.path.join(self.path, "assembly_data_report.jsonl"))
+
+
+	# path of a file of an assembly inside the zip file
+	def member(self, acs, name):
+		return "ncbi_dataset/data/{0}/{1}".format(acs, name)
+
+
+	# check if an assembly has a given file
+	def has(self, acs, name):
+		if self.archive is not None:
+			return self.member(acs, name) in self.members
+		return os.path.exists(os.path.join(self.path, acs, name))
+
+
+	# write a zip member to a file
+	def extract(self, member, file_path):
+		with self.archive.open(member) as src, open(file_path, "wb") as dst:
+			shutil.copyfileobj(src, dst, 1 << 20)
+
+
+	# append a file of an assembly to an open combined fasta file without extracting it to disk first
+	def append_to(self, acs, asm, name, out_file):
+
+		# file linked from the genome cache
+		if self.archive is None:
+			with open(os.path.join(self.path, acs, name), "rb") as src:
+				shutil.copyfileobj(src, out_file, 1 << 20)
+			return
+
+		# zip member goes into the genome cache first, then is copied from there
+		if self.caching(acs, asm, self.archive.getinfo(self.member(acs, name)).file_size):
+			with self.archive.open(self.member(acs, name)) as src:
+				sha, size = self.cache.store_stream(src)
+			self.pending[(acs, asm)][name] = [sha, size]
+			with open(self.cache.object_path(sha), "rb") as src:
+				shutil.copyfileobj(src, out_file, 1 << 20)
+			return
+
+		# zip member streams straight into the combined fasta file
+		with self.archive.open(self.member(acs, name)) as src:
+			shutil.copyfileobj(src, out_file, 1 << 20)
+
+
+	# extract the protein file of an assembly (needed as a query dataset in later rounds) and append it to an open combined fasta file
+	def extract_and_append(self, acs, asm, name, out_file):
+		file_path = os.path.join(self.path, acs, name)
+
+		if self.archive is not None:
+			os.makedirs(os.path.dirname(file_path), exist_ok=True)
+			self.extract(self.member(acs, name), file_path)
+			if self.caching(acs, asm, os.path.getsize(file_path)):
+				self.pending[(acs, asm)][name] = list(self.cache.store_file(file_path))
+
+		with open(file_path, "rb") as src:
+			shutil.copyfileobj(src, out_file, 1 << 20)
+
+		return file_path
+
+
+	# check if a file of an assembly should go into the genome cache
+	# an assembly with a file too large for the cache is not cached at all, so it is never found in the cache without that file
+	def caching(self, acs, asm, size):
+		if self.cache is None:
+			return False
+
+		files = self.pending.setdefault((acs, asm), {})
+		if files is None:
+			return False
+
+		if not self.cache.fits(size):
+			self.cache.discard([sha for sha, stored_size in files.values()])
+			self.pending[(acs, asm)] = None
+			return False
+
+		return True
+
+
+	# add an assembly to the genome cache index once all its files are stored, so an interrupted run never leaves an entry with missing files
+	def cache_assembly(self, acs, asm):
+		files = self.pending.pop((acs, asm), None)
+		if not files:
+			return
+
+		self.cache.add_entry(acs, asm, files, self.cached_keys)
+		self.cached_keys.add(self.cache.key(acs, asm))
+
+
+	def close(self):
+		if self.archive is not None:
+			self.archive.close()
+
+
+# download datasets of all taxIDs with a pool of workers, skip taxIDs already in the manifest
+# return where the dataset of each taxID is and the taxIDs that failed
+def download_search_set(taxID_list, workers, zip_dir=None, cache=None):
+	done = read_manifest()
+	to_download = [taxID for taxID in taxID_list if taxID not in done or not has_dataset(taxID, done[taxID], zip_dir)]
+	failed = []
+
+	if len(to_download) < len(taxID_list):
+		print("Resuming download, {0} of {1} taxIDs already downloaded.".format(len(taxID_list) - len(to_download), len(taxID_list)))
+
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		futures = {executor.submit(download_taxid, taxID, zip_dir, cache): taxID for taxID in to_download}
+
+		for future in as_completed(futures):
+			taxID = futures[future]
+			try:
+				source = future.result()
+			except (OSError, ValueError, KeyError):
+				source = None
+
+			# only the main thread writes to the manifest
+			if source is not None:
+				mark_done(taxID, source)
+				done[taxID] = source
+			else:
+				failed.append(taxID)
+
+	return done, failed
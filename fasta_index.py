@@ -0,0 +1,130 @@
+import os
+import mmap
+
+
+# complement of nucleotides, including ambiguity codes
+complement = bytes.maketrans(b"ACGTUMRWSYKVHDBNacgtumrwsykvhdbn", b"TGCAAKYWSRMBDHVNtgcaakywsrmbdhvn")
+
+
+# path of the index of a fasta file, same format as samtools faidx: name, length, offset, bases per line, bytes per line
+def index_path(fasta_file):
+	return fasta_file + ".fai"
+
+
+# scan a fasta file and write its index, every record must have lines of the same width except its last line
+def build_index(fasta_file):
+	entries = []
+	name = None
+
+	with open(fasta_file, "rb") as file:
+		offset = 0
+		for line in file:
+			line_bytes = len(line)
+			line_bases = len(line.rstrip(b"\r\n"))
+
+			if line.startswith(b">"):
+				name = line[1:].split(None, 1)[0].decode() if line_bases > 1 else ''
+				entry = [name, 0, offset + line_bytes, 0, 0]
+				entries.append(entry)
+				last_short = False
+
+			elif name is not None and line_bases > 0:
+				if entry[3] == 0:
+					entry[3], entry[4] = line_bases, line_bytes
+				elif last_short or line_bases > entry[3] or (line_bases == entry[3] and line_bytes != entry[4]):
+					raise ValueError("Lines of " + name + " in " + fasta_file + " are not all the same width.")
+
+				last_short = line_bases < entry[3]
+				entry[1] += line_bases
+
+			elif name is not None and entry[3] > 0:
+				# blank line can only end a record
+				last_short = True
+
+			offset += line_bytes
+
+	tmp_file = index_path(fasta_file) + ".tmp"
+	with open(tmp_file, "w") as file:
+		for entry in entries:
+			file.write('\t'.join(str(item) for item in entry) + "\n")
+	os.replace(tmp_file, index_path(fasta_file))
+
+
+# memory-mapped fasta file with random access to its sequences by id
+class FastaIndex():
+
+	def __init__(self, fasta_file):
+		self.fasta_file = fasta_file
+		self.stat = os.stat(fasta_file)
+
+		# build index if there is none or if it is older than the fasta file
+		fai_file = index_path(fasta_file)
+		if not os.path.exists(fai_file) or os.path.getmtime(fai_file) < self.stat.st_mtime:
+			build_index(fasta_file)
+
+		# name => (length, offset, bases per line, bytes per line)
+		self.entries = {}
+		with open(fai_file, "r") as file:
+			for line in file:
+				name, length, offset, line_bases, line_bytes = line.rstrip("\n").split("\t")
+				self.entries[name] = (int(length), int(offset), int(line_bases), int(line_bytes))
+
+		self.file = open(fasta_file, "rb")
+		self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.stat.st_size > 0 else b''
+
+
+	# check if the fasta file changed since it was opened
+	def is_stale(self):
+		stat = os.stat(self.fasta_file)
+		return stat.st_mtime != self.stat.st_mtime or stat.st_size != self.stat.st_size
+
+
+	# find entry of an id, blast may report ids with their database prefix, e.g. 'ref|NC_1.1|'
+	def get_entry(self, seq_id):
+		if seq_id in self.entries:
+			return seq_id, self.entries[seq_id]
+
+		if "|" in seq_id:
+			parts = [part for part in seq_id.split("|") if part]
+			for part in reversed(parts):
+				if part in self.entries:
+					return part, self.entries[part]
+
+		return None, None
+
+
+	# byte offset of a 0-based position of a sequence
+	def position(self, entry, posit):
+		length, offset, line_bases, line_bytes = entry
+		return offset + (posit // line_bases) * line_bytes + posit % line_bases
+
+
+	# get (defline, seq) of an id, start and end are 1-based and inclusive as in blastdbcmd -range, minus strand is reverse complemented
+	def fetch(self, seq_id, strand=None, start=None, end=None):
+		name, entry = self.get_entry(seq_id)
+		if entry is None or entry[2] == 0:
+			return ('', '')
+
+		length, offset, line_bases, line_bytes = entry
+
+		begin = 0 if start is None else max(int(start) - 1, 0)
+		stop = length if end is None else min(int(end), length)
+		if begin >= stop:
+			return ('', '')
+
+		seq = self.data[self.position(entry, begin):self.position(entry, stop - 1) + 1]
+		seq = seq.replace(b"\n", b"").replace(b"\r", b"").upper()
+		if strand == "minus":
+			seq = seq.translate(complement)[::-1]
+
+		# defline is the line right before the sequence
+		header_start = self.data.rfind(b"\n", 0, offset - 1) + 1
+		defline = self.data[header_start:offset].rstrip(b"\r\n").decode()
+
+		return (defline, seq.decode())
+
+
+	def close(self):
+		if isinstance(self.data, mmap.mmap):
+			self.data.close()
+		self.file.close()
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+
+# content-addressed store of genome/proteome files shared across runs
+# files are stored once under objects/ named by their sha256, the index associates (assembly accession, assembly name) with those objects
+class GenomeCache():
+
+	def __init__(self, cache_dir, max_bytes):
+		self.cache_dir = cache_dir
+		self.objects_dir = os.path.join(cache_dir, "objects")
+		self.index_file = os.path.join(cache_dir, "index.json")
+		self.max_bytes = max_bytes
+		self.lock = threading.Lock()
+
+		os.makedirs(self.objects_dir, exist_ok=True)
+
+		# key => {"files": {file name: [sha256, size]}, "last_used": time}
+		self.index = {}
+		if os.path.exists(self.index_file):
+			with open(self.index_file, "r") as file:
+				try:
+					self.index = json.load(file)
+				except ValueError:
+					print("Genome cache index is corrupted, starting with an empty cache.")
+					self.index = {}
+
+
+	# key of an assembly in the index
+	def key(self, accession, asm_name):
+		return accession + "\t" + asm_name
+
+
+	# path of a stored file
+	def object_path(self, sha):
+		return os.path.join(self.objects_dir, sha[:2], sha)
+
+
+	# sha256 of a file
+	def file_hash(self, path):
+		sha = hashlib.sha256()
+		with open(path, "rb") as file:
+			for chunk in iter(lambda: file.read(1 << 20), b""):
+				sha.update(chunk)
+		return sha.hexdigest()
+
+
+	# write index to disk, replace old index in one step so it never gets truncated
+	def save_index(self):
+		tmp_file = self.index_file + ".tmp"
+		with open(tmp_file, "w") as file:
+			json.dump(self.index, file)
+		os.replace(tmp_file, self.index_file)
+
+
+	# hard link file, copy if linking is not possible (e.g. different file system)
+	def link(self, src, dst):
+		if os.path.exists(dst):
+			os.remove(dst)
+		try:
+			os.link(src, dst)
+		except OSError:
+			shutil.copyfile(src, dst)
+
+
+	# check if assembly is in the cache and its files are intact
+	def has(self, accession, asm_name):
+		with self.lock:
+			entry = self.index.get(self.key(accession, asm_name))
+			if entry is None:
+				return False
+
+			for sha, size in entry["files"].values():
+				path = self.object_path(sha)
+				if not os.path.exists(path) or os.path.getsize(path) != size:
+					return False
+
+		return True
+
+
+	# store a file on disk as an object, return its hash and size
+	def store_file(self, path):
+		sha = self.file_hash(path)
+		size = os.path.getsize(path)
+		obj = self.object_path(sha)
+
+		if not os.path.exists(obj):
+			os.makedirs(os.path.dirname(obj), exist_ok=True)
+			tmp_obj = obj + ".tmp"
+			self.link(path, tmp_obj)
+			os.replace(tmp_obj, obj)
+
+		return sha, size
+
+
+	# store an open binary stream (e.g. zip member) as an object, hash while copying, return its hash and size
+	def store_stream(self, stream):
+		sha = hashlib.sha256()
+		size = 0
+		tmp_obj = os.path.join(self.objects_dir, "{0}_{1}.tmp".format(os.getpid(), threading.get_ident()))
+
+		with open(tmp_obj, "wb") as file:
+			for chunk in iter(lambda: stream.read(1 << 20), b""):
+				sha.update(chunk)
+				file.write(chunk)
+				size += len(chunk)
+
+		sha = sha.hexdigest()
+		obj = self.object_path(sha)
+		os.makedirs(os.path.dirname(obj), exist_ok=True)
+		os.replace(tmp_obj, obj)
+
+		return sha, size
+
+
+	# check if a file of this size can be cached at all
+	def fits(self, size):
+		return size <= self.max_bytes
+
+
+	# remove stored objects that no assembly in the index refers to (e.g. files of an assembly that was not cached after all)
+	def discard(self, shas):
+		with self.lock:
+			in_use = set(sha for entry in self.index.values() for sha, size in entry["files"].values())
+			for sha in shas:
+				path = self.object_path(sha)
+				if sha not in in_use and os.path.exists(path):
+					os.remove(path)
+
+
+	# add an assembly to the index once all its files are stored, entry_files => {file name: [sha256, size]}
+	# assemblies in keep (keys of the taxID being processed) and the new one are never evicted
+	def add_entry(self, accession, asm_name, entry_files, keep=()):
+		key = self.key(accession, asm_name)
+		with self.lock:
+			self.index[key] = {"files": entry_files, "last_used": time.time()}
+			self.evict(set(keep) | {key})
+			self.save_index()
+
+
+	# add files of an assembly to the cache, files => {file name: path}, files too large for the cache are not added
+	def add(self, accession, asm_name, files, keep=()):
+		if not all(self.fits(os.path.getsize(path)) for path in files.values()):
+			return
+
+		entry_files = {}
+		for name, path in files.items():
+			entry_files[name] = list(self.store_file(path))
+
+		self.add_entry(accession, asm_name, entry_files, keep)
+
+
+	# link files of an assembly into dest_dir, return False if the cached files fail the integrity check
+	def get(self, accession, asm_name, dest_dir):
+		key = self.key(accession, asm_name)
+		with self.lock:
+			entry = self.index.get(key)
+		if entry is None:
+			return False
+
+		# make sure stored files still match their hash
+		for sha, size in entry["files"].values():
+			path = self.object_path(sha)
+			if not os.path.exists(path) or self.file_hash(path) != sha:
+				print("Cached files of " + accession + " failed integrity check, downloading again.")
+				with self.lock:
+					self.index.pop(key, None)
+					self.save_index()
+				return False
+
+		os.makedirs(dest_dir, exist_ok=True)
+		for name, (sha, size) in entry["files"].items():
+			self.link(self.object_path(sha), os.path.join(dest_dir, name))
+
+		with self.lock:
+			entry["last_used"] = time.time()
+			self.save_index()
+
+		return True
+
+
+	# remove least recently used assemblies until the cache fits in max_bytes, assemblies in keep are not removed
+	def evict(self, keep=()):
+		sizes = {}
+		for entry in self.index.values():
+			for sha, size in entry["files"].values():
+				sizes[sha] = size
+		total = sum(sizes.values())
+
+		lru_keys = sorted(self.index.keys(), key=lambda key: self.index[key]["last_used"])
+
+		for key in lru_keys:
+			if total <= self.max_bytes:
+				break
+			if key in keep:
+				continue
+
+			entry = self.index.pop(key)
+
+			# objects can be shared with other assemblies, only delete unreferenced ones
+			in_use = set(sha for other in self.index.values() for sha, size in other["files"].values())
+			for sha, size in entry["files"].values():
+				if sha not in in_use and sha in sizes:
+					path = self.object_path(sha)
+					if os.path.exists(path):
+						os.remove(path)
+					total -= sizes.pop(sha)
@@ -0,0 +1,191 @@
+from array import array
+from collections.abc import MutableMapping
+
+
+# array typecodes of the numeric fields of hits, other fields are strings
+numeric_columns = {"sstart": "q", "send": "q", "evalue": "d", "qstart": "q", "qend": "q", "length": "q", "sframe": "b"}
+
+
+# hsps of a search stored column by column
+# numbers are kept in typed arrays, species names and seq ids are stored once and referenced by index, alignments share one buffer
+# hits are read as ProtHit/NuclHit tuples, through HitDict views that look like the old dict of seq id => list of hits
+class HitTable():
+
+	def __init__(self, hit_type):
+		self.hit_type = hit_type
+		self.fields = hit_type._fields
+
+		# interned strings, index => string and string => index
+		self.spec_names = []
+		self.spec_index = {}
+		self.seq_ids = []
+		self.seq_id_index = {}
+
+		# columns of all rows
+		self.spec = array("I")
+		self.columns = {name: array(numeric_columns[name]) for name in self.fields if name in numeric_columns}
+
+		# alignment strings (qseq, sseq) as offsets and lengths into one buffer
+		self.text_fields = [name for name in self.fields if name != "spec" and name not in numeric_columns]
+		self.text = bytearray()
+		self.text_offsets = {name: array("Q") for name in self.text_fields}
+		self.text_lengths = {name: array("I") for name in self.text_fields}
+
+		# seq id index => rows of its hsps, in the order they were added
+		self.rows = {}
+
+
+	# index of an interned string
+	def intern(self, value, values, index):
+		if value not in index:
+			index[value] = len(values)
+			values.append(value)
+		return index[value]
+
+
+	# add one hsp without giving it to a subject, return its row
+	def add_row(self, hit):
+		row = len(self.spec)
+		self.spec.append(self.intern(hit.spec, self.spec_names, self.spec_index))
+
+		for name, column in self.columns.items():
+			column.append(getattr(hit, name))
+
+		for name in self.text_fields:
+			value = getattr(hit, name).encode()
+			self.text_offsets[name].append(len(self.text))
+			self.text_lengths[name].append(len(value))
+			self.text += value
+
+		return row
+
+
+	# add one hsp of a subject, return its row
+	def append(self, seq_id, hit):
+		row = self.add_row(hit)
+		id_index = self.intern(seq_id, self.seq_ids, self.seq_id_index)
+		self.rows.setdefault(id_index, array("I")).append(row)
+
+		return row
+
+
+	# hit of a row
+	def row(self, row):
+		values = []
+		for name in self.fields:
+			if name == "spec":
+				values.append(self.spec_names[self.spec[row]])
+			elif name in self.columns:
+				values.append(self.columns[name][row])
+			else:
+				offset = self.text_offsets[name][row]
+				values.append(self.text[offset:offset + self.text_lengths[name][row]].decode())
+		return self.hit_type(*values)
+
+
+	# hits of a subject, rows of the table unless other rows are given
+	def hits(self, id_index, rows=None):
+		if rows is None:
+			rows = self.rows[id_index]
+		return [self.row(row) for row in rows]
+
+
+	# species of a subject, species of its first hsp
+	def subject_spec(self, id_index, rows=None):
+		if rows is None:
+			rows = self.rows[id_index]
+		return self.spec_names[self.spec[rows[0]]]
+
+
+	# dict view of all subjects, or only the subjects of one species
+	def view(self, spec=None):
+		if spec is None:
+			return HitDict(self, self.rows.keys())
+		return HitDict(self, [id_index for id_index in self.rows.keys() if self.subject_spec(id_index) == spec])
+
+
+# seq id => list of hits, backed by a HitTable
+# deleting a subject only removes it from this view, the rows stay in the table
+# hits set through a view only change that view (and views made from it later), other views of the table keep the old hits
+class HitDict(MutableMapping):
+
+	def __init__(self, table, id_indexes, rows=None):
+		self.table = table
+		self.id_indexes = dict.fromkeys(id_indexes)
+		# id index => rows of subjects whose hits were set through this view, other subjects have the rows of the table
+		self.rows = {id_index: rows[id_index] for id_index in self.id_indexes if id_index in rows} if rows else {}
+
+
+	def __getitem__(self, seq_id):
+		id_index = self.table.seq_id_index.get(seq_id)
+		if id_index is None or id_index not in self.id_indexes:
+			raise KeyError(seq_id)
+		return self.table.hits(id_index, self.rows.get(id_index))
+
+
+	# replace hits of a subject, new rows are added to the table and only this view refers to them
+	# a subject the table has not seen yet gets its rows in the table, no other view has it
+	# a subject without hits has no species, setting no hits removes it from this view
+	def __setitem__(self, seq_id, hits):
+		hits = list(hits)
+		if len(hits) == 0:
+			self.id_indexes.pop(self.table.seq_id_index.get(seq_id), None)
+			return
+
+		id_index = self.table.intern(seq_id, self.table.seq_ids, self.table.seq_id_index)
+		rows = array("I", [self.table.add_row(hit) for hit in hits])
+		if id_index in self.table.rows:
+			self.rows[id_index] = rows
+		else:
+			self.table.rows[id_index] = rows
+		self.id_indexes[id_index] = None
+
+
+	def __delitem__(self, seq_id):
+		id_index = self.table.seq_id_index.get(seq_id)
+		if id_index is None or id_index not in self.id_indexes:
+			raise KeyError(seq_id)
+		del self.id_indexes[id_index]
+
+
+	def __contains__(self, seq_id):
+		id_index = self.table.seq_id_index.get(seq_id)
+		return id_index is not None and id_index in self.id_indexes
+
+
+	def __iter__(self):
+		for id_index in list(self.id_indexes):
+			yield self.table.seq_ids[id_index]
+
+
+	def __len__(self):
+		return len(self.id_indexes)
+
+
+	def __repr__(self):
+		return repr(dict(self.items()))
+
+
+	# species of a subject without building its hits
+	def spec(self, seq_id):
+		id_index = self.table.seq_id_index[seq_id]
+		return self.table.subject_spec(id_index, self.rows.get(id_index))
+
+
+	# view of the subjects of one species in this view
+	def by_spec(self, spec):
+		return HitDict(self.table, [id_index for id_index in self.id_indexes if self.table.subject_spec(id_index, self.rows.get(id_index)) == spec], self.rows)
+
+
+	# view of the subjects in this view that are not in seq_ids
+	def without(self, seq_ids):
+		return HitDict(self.table, [id_index for id_index in self.id_indexes if self.table.seq_ids[id_index] not in seq_ids], self.rows)
+
+
+# hits of the subjects of a result dict that are not in seq_ids, the result dict is not changed
+def new_hits(blast_dict, seq_ids):
+	if len(seq_ids) == 0:
+		return blast_dict
+	if isinstance(blast_dict, HitDict):
+		return blast_dict.without(seq_ids)
+	return {seq_id: hits for seq_id, hits in blast_dict.items() if seq_id not in seq_ids}
@@ -0,0 +1,92 @@
+from bisect import bisect_left, bisect_right
+
+
+# closed intervals of one scaffold, overlapping intervals are merged so the starts and ends stay sorted
+class IntervalSet():
+
+	def __init__(self):
+		self.starts = []
+		self.ends = []
+
+
+	# add an interval, start and end can be in either order (hits on the minus strand)
+	def add(self, start, end):
+		if start > end:
+			start, end = end, start
+
+		# intervals that overlap the new one are replaced by their union
+		first = bisect_left(self.ends, start)
+		last = bisect_right(self.starts, end)
+
+		if first < last:
+			start = min(start, self.starts[first])
+			end = max(end, self.ends[last-1])
+
+		self.starts[first:last] = [start]
+		self.ends[first:last] = [end]
+
+
+	# check if a position is inside any interval
+	def covers(self, posit):
+		index = bisect_right(self.starts, posit) - 1
+		return index >= 0 and self.ends[index] >= posit
+
+
+# ids of protein hits and positions of nucleotide hits of all previous rounds
+class HitIndex():
+
+	def __init__(self):
+		self.prot_ids = set()
+		# scaffold id => IntervalSet
+		self.scaffolds = {}
+
+
+	# add hits of a round
+	def add(self, prot_hits, nucl_hits):
+		self.prot_ids.update(prot_hits.keys())
+
+		for scaff, hits in nucl_hits.items():
+			if scaff not in self.scaffolds:
+				self.scaffolds[scaff] = IntervalSet()
+			for hit in hits:
+				self.scaffolds[scaff].add(hit.sstart, hit.send)
+
+
+	# check if all protein hits were found in previous rounds
+	def has_all_prot(self, prot_hits):
+		return all(seq_id in self.prot_ids for seq_id in prot_hits.keys())
+
+
+	# check if the start or end of any nucleotide hit is inside a hit of previous rounds on the same scaffold
+	def has_known_nucl(self, nucl_hits):
+		for scaff, hits in nucl_hits.items():
+			intervals = self.scaffolds.get(scaff)
+			if intervals is None:
+				continue
+			for hit in hits:
+				if intervals.covers(hit.sstart) or intervals.covers(hit.send):
+					return True
+		return False
+
+
+	# ids of protein hits that were found in previous rounds
+	def known_prot(self, prot_hits):
+		return set(seq_id for seq_id in prot_hits.keys() if seq_id in self.prot_ids)
+
+
+	# scaffolds of nucleotide hits whose hits all start or end inside a hit of previous rounds
+	def known_nucl(self, nucl_hits):
+		known = set()
+		for scaff, hits in nucl_hits.items():
+			intervals = self.scaffolds.get(scaff)
+			if intervals is None:
+				continue
+			if all(intervals.covers(hit.sstart) or intervals.covers(hit.send) for hit in hits):
+				known.add(scaff)
+		return known
+
+
+# check if a round found no new results, so the iterative search can stop
+# no new protein ids and nucleotide hits that overlap earlier ones, compared with the hits of all previous rounds in hit_index
+def is_converged(hit_index, prot_hits, nucl_hits):
+	return hit_index.has_all_prot(prot_hits) and hit_index.has_known_nucl(nucl_hits)
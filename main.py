@@ -1,12 +1,228 @@
 import sys
 import os
 import csv
+import random
 from blast import *
 from annotation import *
 from clustal import *
 from process_specs import *
 from user_input import *
 from organize_files import *
+from genome_cache import GenomeCache
+from result_cache import ResultCache
+from intervals import HitIndex, is_converged
+from hit_table import new_hits
+from seq_fetch import set_source
+from scheduler import split_threads, run_concurrent
+from run_state import RunState, round_state, restore_round
+from results_db import ResultsDB, blast_summary_columns, manual_anno_columns, auto_anno_columns
+from scaffold_cache import ScaffoldCache
+
+# run the forward and reciprocal searches of one query, query is (query seq file, query dataset file, query type, query species)
+# files of the query are named after its number n, so several queries can be searched at the same time
+# return the valid prot and nucl hits, and the ids of hits that were confirmed in previous rounds (incremental mode)
+# hits and reciprocal outcomes are added to results_db under run_id
+def run_query(query, n, prot_db, nucl_fasta_file, nucl_db, prot_shards, nucl_shards, evalues, threads, incremental, hit_index, result_cache, prot_specs, all_specs, results_db, run_id):
+	seq_query, ds_query, q_type, q_spec_name = query
+	tag = "_" + str(n)
+	nucl_exclude = None
+
+	if q_type == "prot":
+
+		blastp_hit_dict = {}
+		tblastn_hit_dict = {}
+		# hits confirmed in previous rounds, only searched again if not in incremental mode
+		blastp_known = set()
+		tblastn_known = set()
+
+		# make subject amino acid database for reciprical blasts 
+		print("\n\nCompiling query aa dataset into BLAST database...")
+		subj_db = get_dbs(ds_query, q_type)
+
+		# perform blastp using provided prot seq and provided aa db to confirm qseq_id in aa db
+		print("Done")
+		qseq_id = get_qseq_id(seq_query, subj_db, q_type, threads, result_cache, tag)
+
+
+		# check if there is a protein database
+		if prot_db is not None:
+
+			# perform blastp of the query sequence against protein database, get dict of seq id and its info
+			print("\n\nPerforming blastp...")
+			blastp_hit_dict, blastp_rslt_file = blast_aa_ds(seq_query, q_type, prot_db, evalues["blastp"], threads, prot_shards, result_cache, tag=tag)
+			print("Done")
+
+			# write blast results to txt file
+			write_dict("blastp1", blastp_hit_dict, str(n))
+			results_db.add_hits(run_id, n, "blastp", blastp_hit_dict)
+
+			# reverse blasto tp confirm results from 
+			if len(blastp_hit_dict) > 0:
+				print("\n\nPerforming reciprocal blastp...")
+				if incremental == "yes":
+					blastp_known = hit_index.known_prot(blastp_hit_dict)
+				blastp_rev_list = recip_blast("blastp", blastp_hit_dict, subj_db, qseq_id, prot_db, threads=threads, cache=result_cache, known=blastp_known, tag=tag)
+				print("Done")
+				results_db.add_recip(run_id, n, "blastp", blastp_hit_dict.keys(), blastp_rev_list, blastp_known)
+
+				# update blastp_hit_dict after validation
+				# if 0 seqs were valid, make dict empty
+				if len(blastp_rev_list) == 0:
+					blastp_hit_dict = {}
+				# if len of valid seqs != len of dict, then dict must be updated
+				elif len(blastp_rev_list) != len(blastp_hit_dict):
+					update_blast_dict(blastp_hit_dict, blastp_rev_list)
+
+				# write updated blast results to txt file
+				write_dict("blastp2", blastp_hit_dict, str(n))
+
+				# write summary tsv file, only hits that are new in this round in incremental mode
+				write_summary("blastp", new_hits(blastp_hit_dict, blastp_known), prot_specs, all_specs, str(n))
+
+				# check if there is a nucleotide fasta file
+				if nucl_fasta_file is not None:
+					# leave blastp hit species out of the nucleotide search, set nucl_fasta_file to None if no species is left
+					print("\n\nRemoving species from target nucl dataset...")
+					nucl_left, nucl_exclude = exclude_specs(blastp_hit_dict, nucl_fasta_file, tag)
+					if not nucl_left:
+						nucl_fasta_file = None
+					print("Done")
+
+
+		# check if there is a nucleotide fasta file
+		if nucl_fasta_file is not None:
+
+			# perfrom tblasn of query sequence against nucleotide database, get dict of seq id and its info
+			print("\n\nPerforming tblastn...")
+			tblastn_hit_dict, tblastn_rslt_file = blast_nucl_ds(seq_query, q_type, nucl_db, evalues["tblastn"], threads, nucl_exclude, nucl_shards, result_cache, tag=tag)
+			print("Done")
+
+			# write blast results to txt file
+			write_dict("tblastn", tblastn_hit_dict, str(n))
+			results_db.add_hits(run_id, n, "tblastn", tblastn_hit_dict)
+
+			# perform blastx on each tblastn result, keep valid results
+			if len(tblastn_hit_dict) > 0:
+				print("\n\nPerforming reciprocal blastx...")
+				if incremental == "yes":
+					tblastn_known = hit_index.known_nucl(tblastn_hit_dict)
+				blastx_rev_list = recip_blast("blastx", tblastn_hit_dict, subj_db, qseq_id, nucl_db, threads=threads, cache=result_cache, known=tblastn_known, tag=tag)
+				print("Done")
+				results_db.add_recip(run_id, n, "tblastn", tblastn_hit_dict.keys(), blastx_rev_list, tblastn_known)
+
+				# update tblastn_hit_dict after validation
+				# if 0 seqs were valid, make dict empty
+				if len(blastx_rev_list) == 0:
+					tblastn_hit_dict = {}
+				# if len of valid seqs != len of dict, then dict must be updated
+				elif len(blastx_rev_list) != len(tblastn_hit_dict):
+					update_blast_dict(tblastn_hit_dict, blastx_rev_list)
+
+				# write blast results to txt file
+				write_dict("blastx", tblastn_hit_dict, str(n))
+
+				# write summary tsv file, only hits that are new in this round in incremental mode
+				write_summary("tblastn", new_hits(tblastn_hit_dict, tblastn_known), blastp_hit_dict.values(), all_specs, str(n))
+				
+		return blastp_hit_dict, tblastn_hit_dict, blastp_known, tblastn_known
+
+	elif q_type == "nucl":
+
+		blastx_hit_dict = {}
+		tblastx_hit_dict = {}
+		# hits confirmed in previous rounds, only searched again if not in incremental mode
+		blastx_known = set()
+		tblastx_known = set()
+
+		# make subject nucl database for reciprical blasts
+		print("\n\nCompiling query nucl dataset into BLAST database...")
+		subj_db = get_dbs(ds_query, q_type)
+		print("Done")
+
+		# perform blastp using provided prot seq and provided aa db to confirm qseq_id in aa db
+		qseq_id = get_qseq_id(seq_query, subj_db, q_type, threads, result_cache, tag)
+
+		# check if there is a protein database
+		if prot_db is not None:
+
+			# perform blastx of the query sequence against protein database, get dict of seq id and its info
+			print("\n\nPerforming blastx...")
+			blastx_hit_dict, blastx_rslt_file = blast_aa_ds(seq_query, q_type, prot_db, evalues["blastx"], threads, prot_shards, result_cache, tag=tag)
+			print("Done")
+
+			# write blast results to txt file
+			write_dict("blastx", blastx_hit_dict, str(n))
+			results_db.add_hits(run_id, n, "blastx", blastx_hit_dict)
+
+			# reverse blasto tp confirm results from 
+			if len(blastx_hit_dict) > 0:
+				print("\n\nPerforming reciprocal tblastn...")
+				if incremental == "yes":
+					blastx_known = hit_index.known_prot(blastx_hit_dict)
+				tblastn_rev_list = recip_blast("tblastn", blastx_hit_dict, subj_db, qseq_id, prot_db, threads=threads, cache=result_cache, known=blastx_known, tag=tag)
+				print("Done")
+				results_db.add_recip(run_id, n, "blastx", blastx_hit_dict.keys(), tblastn_rev_list, blastx_known)
+
+				# update blastx_hit_dict after validation
+				# if 0 seqs were valid, make dict empty
+				if len(tblastn_rev_list) == 0:
+					blastx_hit_dict = {}
+				# if len of valid seqs != len of dict, then dict must be updated
+				elif len(tblastn_rev_list) != len(blastx_hit_dict):
+					update_blast_dict(blastx_hit_dict, tblastn_rev_list)
+
+				# write updated blast results to txt file
+				write_dict("tblastn", blastx_hit_dict, str(n))
+
+				# write summary tsv file, only hits that are new in this round in incremental mode
+				write_summary("blastx", new_hits(blastx_hit_dict, blastx_known), prot_specs, all_specs, str(n))
+
+				# check if there is a nucleotide fasta file
+				if nucl_fasta_file is not None:
+					# leave blastx hit species out of the nucleotide search, set nucl_fasta_file to None if no species is left
+					print("\n\nRemoving species from target nucl dataset...")
+					nucl_left, nucl_exclude = exclude_specs(blastx_hit_dict, nucl_fasta_file, tag)
+					if not nucl_left:
+						nucl_fasta_file = None
+					print("Done")
+
+		# check if there is a nucleotide fasta file
+		if nucl_fasta_file is not None:
+
+			# perfrom tblasx of query sequence against nucleotide database, get dict of seq id and its info
+			print("\n\nPerforming tblastx...")
+			tblastx_hit_dict, tblastx_rslt_file = blast_nucl_ds(seq_query, q_type, nucl_db, evalues["tblastx"], threads, nucl_exclude, nucl_shards, result_cache, tag=tag)
+			print("Done")
+
+			# write blast results to txt file
+			write_dict("tblastx1", tblastx_hit_dict, str(n))
+			results_db.add_hits(run_id, n, "tblastx", tblastx_hit_dict)
+
+			# perform blastx on each tblastn result, keep valid results
+			if len(tblastx_hit_dict) > 0:
+				print("\n\nPerforming reciprocal tblastx...")
+				if incremental == "yes":
+					tblastx_known = hit_index.known_nucl(tblastx_hit_dict)
+				tblastx_rev_list = recip_blast("tblastx", tblastx_hit_dict, subj_db, qseq_id, nucl_db, threads=threads, cache=result_cache, known=tblastx_known, tag=tag)
+				print("Done")
+				results_db.add_recip(run_id, n, "tblastx", tblastx_hit_dict.keys(), tblastx_rev_list, tblastx_known)
+
+				# update tblastn_hit_dict after validation
+				# if 0 seqs were valid, make dict empty
+				if len(tblastx_rev_list) == 0:
+					tblastx_hit_dict = {}
+				# if len of valid seqs != len of dict, then dict must be updated
+				elif len(tblastx_rev_list) != len(tblastx_hit_dict):
+					update_blast_dict(tblastx_hit_dict, tblastx_rev_list)
+
+				# write blast results to txt file
+				write_dict("tblastx2", tblastx_hit_dict, str(n))
+
+				# write summary tsv file, only hits that are new in this round in incremental mode
+				write_summary("tblastx", new_hits(tblastx_hit_dict, tblastx_known), blastx_hit_dict.values(), all_specs, str(n))
+
+		return blastx_hit_dict, tblastx_hit_dict, blastx_known, tblastx_known
+	
 
 def main(argv):
 	
@@ -27,6 +243,19 @@ def main(argv):
 	tblastn_evalue = input_processor.get_evalue()
 	tblastx_evalue = input_processor.get_evalue()
 	blastx_evalue = input_processor.get_evalue()
+	workers = input_processor.get_workers()
+	zip_dir = input_processor.get_zipdir()
+	cache_dir = input_processor.get_cache_dir()
+	cache_size = input_processor.get_cache_size()
+	result_cache_size = input_processor.get_cache_size("-result_cache_size", "5")
+	scaffold_cache_size = input_processor.get_cache_size("-scaffold_cache_size", "1")
+	threads = input_processor.get_threads()
+	seq_source = input_processor.get_seq_source()
+	shards = input_processor.get_shards()
+	incremental = input_processor.get_incremental()
+	fanout = input_processor.get_fanout()
+	seed = input_processor.get_seed()
+	resume = input_processor.get_resume()
 	
 	# check if provided parameter files exist
 	if os.path.exists(seq_query):
@@ -39,7 +268,29 @@ def main(argv):
 	else:
 		print("\nERROR: Query nucl/prot dataset file not found in directory.\n")
 		sys.exit()
-		
+	
+	# next query species are picked with a seeded generator so a run can be repeated
+	rng = random.Random(seed)
+	
+	# select where sequences of hits are read from
+	set_source(seq_source)
+	
+	# blast results are kept in the cache directory to be re-used by later rounds and runs
+	result_cache = None
+	if cache_dir is not None:
+		result_cache = ResultCache(os.path.join(cache_dir, "results"), result_cache_size)
+	
+	# state of the run is saved after each stage and each round, an interrupted run continues after its last finished step
+	run_state = RunState()
+	if resume == "yes":
+		if run_state.load():
+			print("\n\nResuming run after stage: " + run_state.last_stage())
+		else:
+			print("\n\nNo saved run state found, starting a new run.")
+	
+	# hits, reciprocal searches and annotations of all runs go into one database, kept in the cache directory if there is one
+	results_db = ResultsDB(os.path.join(cache_dir, "results.db") if cache_dir is not None else "results.db")
+	
 	# save a copy of the original input fil names
 	seq_query_copy = seq_query
 	ds_query_copy = ds_query
@@ -56,19 +307,36 @@ def main(argv):
 	
 	prot_db = None
 	nucl_db = None
+	prot_shards = None
+	nucl_shards = None
 	prot_dict = {}
 	nucl_dict = {}
+	# hits of all previous rounds, to check if a round found anything new
+	hit_index = HitIndex()
 	i = 1
 	q_specs_list = [q_spec_name]
 	
+	# search set files of a resumed run are already in place
+	if run_state.done("search_set"):
+		nucl_fasta_file = run_state.get("nucl_fasta_file")
+		prot_fasta_file = run_state.get("prot_fasta_file")
+		all_specs = run_state.get("all_specs")
+		prot_specs = run_state.get("prot_specs")
+		prot_file_paths = run_state.get("prot_file_paths")
+
 	# if this is the first run and fasta files need to be downloaded	
-	if download == "yes":
+	elif download == "yes":
 		# get user tax id input
 		taxID_list = taxIDS
 
+		# genomes and proteomes downloaded in previous runs are shared through the cache
+		genome_cache = None
+		if cache_dir is not None:
+			genome_cache = GenomeCache(os.path.join(cache_dir, "genomes"), cache_size)
+
 		# get protein and nucleotide fasta files, all specs txt file, specs w/ prot ds file, and dict associates specs with prot files
 		print("\n\nCompiling nucl and aa datasets of targets into fasta files...\n\n")
-		nucl_fasta_file, prot_fasta_file, all_specs, prot_specs, prot_file_paths = get_fasta_files(taxID_list)
+		nucl_fasta_file, prot_fasta_file, all_specs, prot_specs, prot_file_paths = get_fasta_files(taxID_list, workers, zip_dir, genome_cache)
 		print("Done")
 
 		# write all specs name to txt file
@@ -87,286 +355,80 @@ def main(argv):
 			prot_fasta_file = "prot.faa"
 			all_specs = read_list("all_specs.txt")
 			prot_specs = read_list("prot_data_specs.txt")
-			prot_file_paths = txt_to_dict("prot_files_all_dict.txt")
+			prot_file_paths = read_dict("prot_files", "all")
 		except FileNotFoundError:
 			print("\nERROR: Required search set dababase and/or files not found in directory. See README.md to troubleshoot\n")
 			sys.exit()
 
-	# the number of times to run queries
-	while True:
-		
-		print("\n\nRunning blast... Round: " + str(i) + ". Query species: " + q_spec_name)
-		
-		if q_type == "prot":
-
-			blastp_hit_dict = {}
-			tblastn_hit_dict = {}
-
-			# make subject amino acid database for reciprical blasts 
-			print("\n\nCompiling query aa dataset into BLAST database...")
-			subj_db = get_dbs(ds_query, q_type)
-
-			# perform blastp using provided prot seq and provided aa db to confirm qseq_id in aa db
-			print("Done")
-			qseq_id = get_qseq_id(seq_query, subj_db, q_type)
-
-
-			# check if there is a protein fasta file
-			if prot_fasta_file is not None:
-
-				# get protein blast database
-				print("\n\nCompiling target aa dataset into BLAST database...")
-				prot_db = get_dbs(prot_fasta_file, "prot")
-				print("Done")
-
-				# perform blastp of the query sequence against protein database, get dict of seq id and its info
-				print("\n\nPerforming blastp...")
-				blastp_hit_dict, blastp_rslt_file = blast_aa_ds(seq_query, prot_db, q_type, blastp_evalue)
-				print("Done")
-
-				# write blast results to txt file
-				write_dict("blastp1", blastp_hit_dict, str(i))
-
-				# reverse blasto tp confirm results from 
-				if len(blastp_hit_dict) > 0:
-					print("\n\nPerforming reciprocal blastp...")
-					blastp_rev_list = recip_blast("blastp", blastp_hit_dict, subj_db, qseq_id, prot_db)
-					print("Done")
-
-					# update blastp_hit_dict after validation
-					# if 0 seqs were valid, make dict empty
-					if len(blastp_rev_list) == 0:
-						blastp_hit_dict = {}
-					# if len of valid seqs != len of dict, then dict must be updated
-					elif len(blastp_rev_list) != len(blastp_hit_dict):
-						update_blast_dict(blastp_hit_dict, blastp_rev_list)
-
-					# write updated blast results to txt file
-					write_dict("blastp2", blastp_hit_dict, str(i))
-
-					# write summary tsv file
-					write_summary("blastp", blastp_hit_dict, prot_specs, all_specs, str(i))
-
-					# check if there is a nucleotide fasta file
-					if nucl_fasta_file is not None:
-						# remove blastp hit species from nucleotide fasta file, update nucl_fasta_file
-						print("\n\nRemoving species from target nucl dataset...")
-						nucl_fasta_file = rm_seqs_fasta(blastp_hit_dict, nucl_fasta_file)
-						print("Done")
-
-
-			# check if there is a nucleotide fasta file
-			if nucl_fasta_file is not None:
-
-				# get nucleotide blast database
-				print("\n\nCompiling target nucl dataset into BLAST database...")
-				nucl_db = get_dbs(nucl_fasta_file, "nucl")
-				print("Done")
-
-				# perfrom tblasn of query sequence against nucleotide database, get dict of seq id and its info
-				print("\n\nPerforming tblastn...")
-				tblastn_hit_dict, tblastn_rslt_file = blast_nucl_ds(seq_query, q_type, nucl_db, tblastn_evalue)
-				print("Done")
-
-				# write blast results to txt file
-				write_dict("tblastn", tblastn_hit_dict, str(i))
-
-				# perform blastx on each tblastn result, keep valid results
-				if len(tblastn_hit_dict) > 0:
-					print("\n\nPerforming reciprocal blastx...")
-					blastx_rev_list = recip_blast("blastx", tblastn_hit_dict, subj_db, qseq_id, nucl_db)
-					print("Done")
-
-					# update tblastn_hit_dict after validation
-					# if 0 seqs were valid, make dict empty
-					if len(blastx_rev_list) == 0:
-						tblastn_hit_dict = {}
-					# if len of valid seqs != len of dict, then dict must be updated
-					elif len(blastx_rev_list) != len(tblastn_hit_dict):
-						update_blast_dict(tblastn_hit_dict, blastx_rev_list)
-
-					# write blast results to txt file
-					write_dict("blastx", tblastn_hit_dict, str(i))
-
-					# write summary tsv file
-					write_summary("tblastn", tblastn_hit_dict, blastp_hit_dict.values(), all_specs, str(i))
-					
-			# see if there are any new results
-			prot_ids = []
-			for spec in prot_dict.keys():
-				for seq_id in prot_dict[spec].keys():
-					if seq_id not in prot_ids:
-						prot_ids.append(seq_id)
-					
-			nucl_seqs = {}
-			for spec in nucl_dict.keys():
-				for scaff in nucl_dict[spec].keys():
-					if scaff not in nucl_seqs.keys():
-						nucl_seqs[scaff] = []
-					for value in nucl_dict[spec][scaff]:
-						nucl_seqs[scaff].append(value)
-					
-			curr_prot_rslts = set(blastp_hit_dict.keys())
-			all_prot_rslts = set(prot_ids)
-			
-			no_new_nucl = False
-			for seq in tblastn_hit_dict.keys():
-				if seq in nucl_seqs.keys():
-					for hit in tblastn_hit_dict[seq]:
-						for hit2 in nucl_seqs[seq]:
-							if hit2[1] < hit2[2]:
-								start = hit2[1]
-								end = hit2[2]
-							else:
-								start = hit2[2]
-								end = hit2[1]
-							if start <= hit[1] <= end or start <= hit[2] <= end:
-								no_new_nucl = True
-			
-			# add results from this query round to result dicts
-			prot_dict[q_spec_name] = blastp_hit_dict
-			nucl_dict[q_spec_name] = tblastn_hit_dict
-								
-			# end blast if no new results found					
-			if curr_prot_rslts.issubset(all_prot_rslts) and no_new_nucl:
-				print("\n\nNo new results were found in this round, moving onto annotation.")
-				break
-				
-
-		elif q_type == "nucl":
-
-			blastx_hit_dict = {}
-			tblastx_hit_dict = {}
-
-			# make subject nucl database for reciprical blasts
-			print("\n\nCompiling query nucl dataset into BLAST database...")
-			subj_db = get_dbs(ds_query, q_type)
-			print("Done")
-
-			# perform blastp using provided prot seq and provided aa db to confirm qseq_id in aa db
-			qseq_id = get_qseq_id(seq_query, subj_db, q_type)
-
-			# check if there is a protein fasta file
-			if prot_fasta_file is not None:
-
-				# get protein blast database
-				print("\n\nCompiling target aa dataset into BLAST database...")
-				prot_db = get_dbs(prot_fasta_file, "prot")
-				print("Done")
-
-				# perform blastx of the query sequence against protein database, get dict of seq id and its info
-				print("\n\nPerforming blastx...")
-				blastx_hit_dict, blastx_rslt_file = blast_aa_ds(seq_query, q_type, prot_db, blastx_evalue)
-				print("Done")
+	# the run is only recorded once its inputs and search set are in place, so failed invocations leave no run behind
+	if run_state.done("search_set"):
+		run_id = run_state.get("run_id")
+	else:
+		run_id = results_db.add_run(seq_query, ds_query, q_spec_name, q_type)
+	results_db.add_species(run_id, all_specs)
+	run_state.save("search_set", {"run_id": run_id, "nucl_fasta_file": nucl_fasta_file, "prot_fasta_file": prot_fasta_file, "all_specs": all_specs, "prot_specs": prot_specs, "prot_file_paths": prot_file_paths})
+
+	# target databases are made once and searched by every query
+	if prot_fasta_file is not None:
+
+		# get protein blast database
+		print("\n\nCompiling target aa dataset into BLAST database...")
+		prot_db = get_dbs(prot_fasta_file, "prot")
+		# split target dataset into shards that are searched at the same time
+		if shards > 1:
+			prot_shards = get_shards(prot_fasta_file, "prot", shards)
+		print("Done")
 
-				# write blast results to txt file
-				write_dict("blastx", blastx_hit_dict,str(i))
+	if nucl_fasta_file is not None:
 
-				# reverse blasto tp confirm results from 
-				if len(blastx_hit_dict) > 0:
-					print("\n\nPerforming reciprocal tblastn...")
-					tblastn_rev_list = recip_blast("tblastn", blastx_hit_dict, subj_db, qseq_id, prot_db)
-					print("Done")
+		# get nucleotide blast database
+		print("\n\nCompiling target nucl dataset into BLAST database...")
+		nucl_db = get_dbs(nucl_fasta_file, "nucl")
+		# split target dataset into shards that are searched at the same time
+		if shards > 1:
+			nucl_shards = get_shards(nucl_fasta_file, "nucl", shards)
+		print("Done")
 
-					# update blastx_hit_dict after validation
-					# if 0 seqs were valid, make dict empty
-					if len(tblastn_rev_list) == 0:
-						blastx_hit_dict = {}
-					# if len of valid seqs != len of dict, then dict must be updated
-					elif len(tblastn_rev_list) != len(blastx_hit_dict):
-						update_blast_dict(blastx_hit_dict, tblastn_rev_list)
-
-					# write updated blast results to txt file
-					write_dict("tblastn", blastx_hit_dict, str(i))
-
-					# write summary tsv file
-					write_summary("blastx", blastx_hit_dict, prot_specs, all_specs, str(i))
-
-					# check if there is a nucleotide fasta file
-					if nucl_fasta_file is not None:
-						# remove blastx hit species from nucleotide fasta file, update nucl_fasta_file
-						print("\n\nRemoving species from target nucl dataset...")
-						nucl_fasta_file = rm_seqs_fasta(blastx_hit_dict, nucl_fasta_file)
-						print("Done")
-
-			# check if there is a nucleotide fasta file
-			if nucl_fasta_file is not None:
-
-				# get nucleotide blast database
-				print("\n\nCompiling target nucl dataset into BLAST database...")
-				nucl_db = get_dbs(nucl_fasta_file, "nucl")
-				print("Done")
+	evalues = {"blastp": blastp_evalue, "tblastn": tblastn_evalue, "blastx": blastx_evalue, "tblastx": tblastx_evalue}
 
-				# perfrom tblasx of query sequence against nucleotide database, get dict of seq id and its info
-				print("\n\nPerforming tblastx...")
-				tblastx_hit_dict, tblastx_rslt_file = blast_nucl_ds(seq_query, q_type, nucl_db, tblastx_evalue)
-				print("Done")
+	# queries of the current round, (query seq file, query dataset file, query type, query species)
+	queries = [(seq_query, ds_query, q_type, q_spec_name)]
+	# number of queries searched in all rounds
+	q_num = 0
 
-				# write blast results to txt file
-				write_dict("tblastx1", tblastx_hit_dict, str(i))
+	# continue with the round after the last finished one
+	if run_state.done("round") or run_state.done("blast"):
+		i, q_num, q_type, queries, q_specs_list, prot_dict, nucl_dict, hit_index = restore_round(run_state, rng)
 
-				# perform blastx on each tblastn result, keep valid results
-				if len(tblastx_hit_dict) > 0:
-					print("\n\nPerforming reciprocal tblastx...")
-					tblastx_rev_list = recip_blast("tblastx", tblastx_hit_dict, subj_db, qseq_id, nucl_db)
-					print("Done")
+	# results of queries that were not finished before the run was resumed
+	results_db.discard_queries(run_id, q_num)
 
-					# update tblastn_hit_dict after validation
-					# if 0 seqs were valid, make dict empty
-					if len(tblastx_rev_list) == 0:
-						tblastn_hit_dict = {}
-					# if len of valid seqs != len of dict, then dict must be updated
-					elif len(tblastx_rev_list) != len(tblastx_hit_dict):
-						update_blast_dict(tblastx_hit_dict, tblastx_rev_list)
-
-					# write blast results to txt file
-					write_dict("tblastx2", tblastx_hit_dict, str(i))
-
-					# write summary tsv file
-					write_summary("tblastx", tblastx_hit_dict, blastx_hit_dict.values(), all_specs, str(i))
-					
-			# see if there are any new results
-			prot_ids = []
-			for spec in prot_dict.keys():
-				for seq_id in prot_dict[spec].keys():
-					if seq_id not in prot_ids:
-						prot_ids.append(seq_id)
-					
-			nucl_seqs = {}
-			for spec in nucl_dict.keys():
-				for scaff in nucl_dict[spec].keys():
-					if scaff not in nucl_seqs.keys():
-						nucl_seqs[scaff] = []
-					for value in nucl_dict[spec][scaff]:
-						nucl_seqs[scaff].append(value)
-					
-			curr_prot_rslts = set(blastx_hit_dict.keys())
-			all_prot_rslts = set(prot_ids)
-			
-			no_new_nucl = False
-			for seq in tblastx_hit_dict.keys():
-				if seq in nucl_seqs.keys():
-					for hit in tblastx_hit_dict[seq]:
-						for hit2 in nucl_seqs[seq]:
-							start = None
-							end = None
-							if hit2[1] < hit2[2]:
-								start = hit2[1]
-								end = hit2[2]
-							else:
-								start = hit2[2]
-								end = hit2[1]
-							if start <= hit[1] <= end or start <= hit[2] <= end:
-								no_new_nucl = True
-			
-			# add results from this query round to result dicts
-			prot_dict[q_spec_name] = blastx_hit_dict
-			nucl_dict[q_spec_name] = tblastx_hit_dict
-			
-			# end blast if no new results found
-			if curr_prot_rslts.issubset(all_prot_rslts) and no_new_nucl:
-				print("\n\nNo new results were found with this run, moving onto annotation.")
-				break
+	# the number of times to run queries, skipped if all rounds were finished before the run was resumed
+	while not run_state.done("blast"):
+		
+		print("\n\nRunning blast... Round: " + str(i) + ". Query species: " + ', '.join(query[3] for query in queries))
+
+		# queries of a round are searched at the same time, each with its share of the threads
+		workers, per_query = split_threads(threads, len(queries))
+		for k, query in enumerate(queries):
+			results_db.add_query(run_id, q_num + k + 1, i, query)
+		query_args = [(query, q_num + k + 1, prot_db, nucl_fasta_file, nucl_db, prot_shards, nucl_shards, evalues, per_query, incremental, hit_index, result_cache, prot_specs, all_specs, results_db, run_id) for k, query in enumerate(queries)]
+		results = run_concurrent(run_query, query_args, workers)
+		q_num += len(queries)
+
+		# see if there are any new results, compared with the hits of all previous rounds
+		converged = all(is_converged(hit_index, prot_hits, nucl_hits) for prot_hits, nucl_hits, prot_known, nucl_known in results)
+
+		# add results from this query round to result dicts, hits confirmed in previous rounds are already in there
+		for query, (prot_hits, nucl_hits, prot_known, nucl_known) in zip(queries, results):
+			prot_dict[query[3]] = new_hits(prot_hits, prot_known)
+			nucl_dict[query[3]] = new_hits(nucl_hits, nucl_known)
+			hit_index.add(prot_hits, nucl_hits)
+
+		# end blast if no new results found
+		if converged:
+			print("\n\nNo new results were found in this round, moving onto annotation.")
+			break
 		
 		# select next species w/ protein dataset to automate query
 		# make sure there are species to select
@@ -374,132 +436,52 @@ def main(argv):
 			print("\n\nNo species in protein results to select from, moving onto annotation.")
 			break
 
-		processor = CladesProcessor(prot_dict, prot_db, q_specs_list)
+		processor = CladesProcessor(prot_dict, prot_db, q_specs_list, rng)
 
-		# select a random species in a different family
-		next_spec_name = processor.get_rand_spec()
+		# select a random species in a different family, or one species in each of up to fanout different families
+		if fanout == 1:
+			next_spec_name = processor.get_rand_spec()
+			next_spec_names = [] if next_spec_name is None else [next_spec_name]
+		else:
+			next_spec_names = processor.get_rand_specs(fanout)
 
 		# make sure there is a next species
-		if next_spec_name is None:
+		if len(next_spec_names) == 0:
 			print("\n\nNo species in other family ranks to select from, moving onto annotation.")
 			break
-			
-		# add next query species to list of query spcies
-		q_specs_list.append(next_spec_name)
+		
+		queries = []
+		for next_spec_name in next_spec_names:
+			# add next query species to list of query spcies
+			q_specs_list.append(next_spec_name)
 
-		# get next species prot id
-		next_id = processor.get_id(next_spec_name)
+			# get next species prot id
+			next_id = processor.get_id(next_spec_name)
 
-		# get fasta file of the next query protein
-		next_id_fasta = processor.get_id_fasta(next_id)
+			# get fasta file of the next query protein
+			next_id_fasta = processor.get_id_fasta(next_id)
 
-		# update current query files
-		seq_query = next_id_fasta
-		ds_query = prot_file_paths[next_spec_name]
+			# next queries are always prot
+			queries.append((next_id_fasta, prot_file_paths[next_spec_name], "prot", next_spec_name))
 		
 		# update query type if neccessary, (since next query will always be prot)
 		if q_type == "nucl":
 			q_type = "prot"
-
-		# update current species name
-		q_spec_name = next_spec_name
-
-		# reassign nucl_db
-		nucl_fasta_file = "nucl.fna"
 		
 		# increase # of run
 		i += 1
-	
-	# write summary report of all blast results into one file
-	final_report = {}
-	blast1 = ''
-	blast2 = ''
-	if q_type == "prot":
-		blast1 = "blastp_"
-		blast2 = "tblastn_"
-	elif q_type == "nucl":
-		blast1 = "blastx_"
-		blast2 = "tblastx_"
-		
-	for run in range(i):
-		fname1 = blast1 + str(run+1) + "_summary_report.tsv"
-		fname2 = blast2 + str(run+1) + "_summary_report.tsv"
-
-		if os.path.exists(fname1):
-			with open(fname1, 'r') as file1:
-				reader = csv.reader(file1, delimiter="\t")
-				for line_num, line in enumerate(reader):
-					if line_num == 0:
-						continue
-                        
-					species = line[0]
-					
-					prot_hit_ids = line[2]
-					if prot_hit_ids == 'N/A':
-						prot_hit_ids = []
-					else:
-						prot_hit_ids = prot_hit_ids.split(', ')
-					prot_hit_ids = [prot_id.split()[0] for prot_id in prot_hit_ids]
 
-					if species not in final_report.keys():
-						final_report[species] = [prot_hit_ids, []]
-					else:
-						for prot_id in prot_hit_ids:
-							if prot_id not in final_report[species][0]:
-								final_report[species][0].append(prot_id)
-
-		if os.path.exists(fname2):
-			with open(fname2, 'r') as file2:
-				reader = csv.reader(file2, delimiter="\t")
-				for line_num, line in enumerate(reader):
-					if line_num == 0:
-						continue
-                        
-					species = line[0]
-					  
-					nucl_hit_ids = line[2]
-					if nucl_hit_ids == 'N/A':
-						nucl_hit_ids = []
-					else:
-						nucl_hit_ids = nucl_hit_ids.split(', ')
-					nucl_hit_ids = [nucl_id.split()[0] for nucl_id in nucl_hit_ids]
+		# save results of all rounds so far and the queries of the next round
+		run_state.save("round", round_state(i, q_num, q_type, queries, q_specs_list, prot_dict, nucl_dict, hit_index, rng))
+	
+	run_state.save("blast", round_state(i, q_num, q_type, queries, q_specs_list, prot_dict, nucl_dict, hit_index, rng))
+	
 
-					if species not in final_report.keys():
-						final_report[species] = [[], nucl_hit_ids]
-					else:
-						for nucl_id in nucl_hit_ids:
-							if nucl_id not in final_report[species][1]:
-								final_report[species][1].append(nucl_id)
-                                
-	# rows to write to tsv file
-	blast_sum_rows = []
+	# write summary report of all blast results into one file
+	# rows to write to tsv file, valid hits of all rounds from the results database
+	blast_sum_rows = results_db.report("blast_summary", run_id, blast_summary_columns, "first_hit IS NULL, first_hit, position")
 	# headers for tsv file
-	blast_sum_headers = ["Species", "Num Hit(s)", "Protein Hit ID(s)", "Nucleotide Hit ID(s)"]
-
-	for key, value in final_report.items():
-		species = key
-		count = 0
-		prot_hits = value[0]
-		nucl_hits = value[1]
-
-		if len(prot_hits) == 0:
-			prot_hits = 'N/A'
-		else:
-			count += len(prot_hits)
-			prot_hits = ', '.join(prot_hits)	
-
-		if len(nucl_hits) == 0:
-			nucl_hits = 'N/A'
-		else:
-			count += len(nucl_hits)
-			nucl_hits = ', '.join(nucl_hits)
-
-		row = {"Species": species, 
-			   "Num Hit(s)": count, 
-			   "Protein Hit ID(s)": prot_hits, 
-			   "Nucleotide Hit ID(s)": nucl_hits}
-
-		blast_sum_rows.append(row)
+	blast_sum_headers = [header for header, column in blast_summary_columns]
         
 	# write to tsv file  
 	with open("complete_blast_summary_report.tsv", 'w') as blast_sum_file:
@@ -510,110 +492,89 @@ def main(argv):
 
 	
 	# ANNOTATION
-	print("\n\nPerforming annotation on nucleotide sequences...")
+	# annotation of a resumed run is read from the run state
+	if run_state.done("annotation"):
+		anno_dict_list = run_state.get("anno_dict_list")
+	else:
+		print("\n\nPerforming annotation on nucleotide sequences...")
 	
-	man_anno_files = []
-	anno_dict_list = {}
+		man_anno_files = []
+		anno_dict_list = {}
+		# scaffolds are read once for all hits and query species on them
+		scaffold_cache = ScaffoldCache(scaffold_cache_size)
 	
-	for q_spec_name in nucl_dict:
-		# make an annotation object
-		annotation = BlastAnnot(nucl_dict[q_spec_name], q_spec_name)
-		# get the inital list of seqs with gap (>= 10 aa or multiple alignments), and no gap (anything else)
-		no_gap_dict, gap_dict = annotation.process_seqs()
-
-		# find 5' and 5' stop codons, find start codon starting from 5' direction
-		annotated_dict, no_start_seqs = annotation.annotate_no_gaps(no_gap_dict, nucl_db)
-		anno_dict_list[q_spec_name] = annotated_dict
+		for q_spec_name in nucl_dict:
+			# make an annotation object
+			annotation = BlastAnnot(nucl_dict[q_spec_name], q_spec_name, scaffold_cache)
+			# get the inital list of seqs with gap (>= 10 aa or multiple alignments), and no gap (anything else)
+			no_gap_dict, gap_dict = annotation.process_seqs()
+
+			# find 5' and 5' stop codons, find start codon starting from 5' direction
+			annotated_dict, no_start_seqs = annotation.annotate_no_gaps(no_gap_dict, nucl_db)
+			anno_dict_list[q_spec_name] = annotated_dict
 		
-		name = q_spec_name.replace(" ", "_")
-		write_dict("annotated", annotated_dict, name)
+			name = q_spec_name.replace(" ", "_")
+			write_dict("annotated", annotated_dict, name)
 
-		# update no_gap_dict and gap_dict if any sequence in no_gap_dict does not have a start codon
-		annotation.update_gap_dicts(no_start_seqs, no_gap_dict, gap_dict)
+			# update no_gap_dict and gap_dict if any sequence in no_gap_dict does not have a start codon
+			annotation.update_gap_dicts(no_start_seqs, no_gap_dict, gap_dict)
 
-		# output file of nucleotide seqs that need manual annotation
-		man_anno_file = annotation.get_man_annot(gap_dict)
-		man_anno_files.append(man_anno_file)
+			# output file of nucleotide seqs that need manual annotation
+			man_anno_file = annotation.get_man_annot(gap_dict)
+			man_anno_files.append(man_anno_file)
 		
-	outfile = "all_man_anno.txt" 
-	lines = []
-	
-	for manu_file in man_anno_files:
-		with open(manu_file, "r") as file:
-			ls = file.readlines()[1:]
-			lines.append(ls)
-
-	with open(outfile, "w") as outfile:
-		outfile.write("Query_Species\tSubject_ID\tSubject_Species\tE-Value\tSubject_Start\tSubject_End\tQuery_Start\tQuery_End\tQuery_Alignment\tSubject_Alignment\tReading_Frame\n")
-		for line in lines:
-			outfile.writelines(line)
-	
-	# write summary report for all manual annotation seqs
-	filename = 'all_man_anno.txt' 
-	man_sum = "complete_manual_anno_summary.tsv"
-
-	manual_report = {}
-
-	with open(filename, 'r') as file:
-		for line_num, line in enumerate(file):
-			if line_num == 0:
-				continue
-			line = line.strip()  
-			columns = line.split('\t') 
-			query_species = columns[0]
-			subject_id = columns[1]
-			subject_species = columns[2]
-			subject_start = columns[4].split(', ') if columns[4] else []  
-			subject_end = columns[5].split(', ') if columns[5] else []  
-			posits = subject_start + subject_end
-			posits = [int(posit) for posit in posits]
-			min_posit = min(posits)
-			max_posit = max(posits)
-
-			if subject_species not in manual_report.keys():
-				manual_report[subject_species] = [[subject_id], [min_posit], [max_posit], [query_species]]
-			else:
-				if subject_id not in manual_report[subject_species][0]:
-					manual_report[subject_species][0].append(subject_id)
-					manual_report[subject_species][1].append(min_posit)
-					manual_report[subject_species][2].append(max_posit)
-				else:
-					index =  manual_report[subject_species][0].index(subject_id)
-					new_min = min([manual_report[subject_species][1][index], min_posit])
-					new_max = max([manual_report[subject_species][2][index], max_posit])
-					manual_report[subject_species][1][index] = new_min
-					manual_report[subject_species][2][index] = new_max
-					
-				if query_species not in  manual_report[subject_species][3]:
-					manual_report[subject_species][3].append(query_species)
+		outfile = "all_man_anno.txt" 
+		lines = []
 	
-	# rows to write to tsv file
-	man_sum_rows = []
-	# headers for tsv file
-	man_sum_headers = ["Species", "Scaffold ID", "Min Posit", "Max Posit", "Query Species"]
-
-	for key, value in manual_report.items():
-		species = key
-		scaffold_id = ', '.join(value[0])
-		min_posit = ', '.join([str(p) for p in value[1]])
-		max_posit = ', '.join([str(p) for p in value[2]])
-		q_spec = ', '.join(value[3])
-		
-		row = {"Species": species, 
-			   "Scaffold ID": scaffold_id, 
-			   "Min Posit": min_posit, 
-			   "Max Posit": max_posit, 
-			   "Query Species": q_spec}
-		
-		man_sum_rows.append(row)
+		for manu_file in man_anno_files:
+			with open(manu_file, "r") as file:
+				ls = file.readlines()[1:]
+				lines.append(ls)
+
+		with open(outfile, "w") as outfile:
+			outfile.write("Query_Species\tSubject_ID\tSubject_Species\tE-Value\tSubject_Start\tSubject_End\tQuery_Start\tQuery_End\tQuery_Alignment\tSubject_Alignment\tReading_Frame\n")
+			for line in lines:
+				outfile.writelines(line)
 	
-	# write to tsv file
-	with open(man_sum, 'w') as man_sum_file:
-		writer = csv.DictWriter(man_sum_file, delimiter='\t', fieldnames=man_sum_headers)
-		writer.writeheader()
-		writer.writerows(man_sum_rows)
+		# write summary report for all manual annotation seqs
+		filename = 'all_man_anno.txt' 
+		man_sum = "complete_manual_anno_summary.tsv"
+
+		# rows of the results database, (query species, scaffold id, species, lowest position, highest position)
+		man_anno_rows = []
+
+		with open(filename, 'r') as file:
+			for line_num, line in enumerate(file):
+				if line_num == 0:
+					continue
+				line = line.strip()  
+				columns = line.split('\t') 
+				query_species = columns[0]
+				subject_id = columns[1]
+				subject_species = columns[2]
+				subject_start = columns[4].split(', ') if columns[4] else []  
+				subject_end = columns[5].split(', ') if columns[5] else []  
+				posits = subject_start + subject_end
+				posits = [int(posit) for posit in posits]
+
+				man_anno_rows.append((query_species, subject_id, subject_species, min(posits), max(posits)))
+
+		results_db.add_manual_annotations(run_id, man_anno_rows)
+
+		# rows to write to tsv file, one per species with the positions of each of its scaffolds
+		man_sum_rows = results_db.report("manual_anno_summary", run_id, manual_anno_columns, "first")
+		# headers for tsv file
+		man_sum_headers = [header for header, column in manual_anno_columns]
+	
+		# write to tsv file
+		with open(man_sum, 'w') as man_sum_file:
+			writer = csv.DictWriter(man_sum_file, delimiter='\t', fieldnames=man_sum_headers)
+			writer.writeheader()
+			writer.writerows(man_sum_rows)
+
+		print("Done")
 
-	print("Done")
+		run_state.save("annotation", {"anno_dict_list": anno_dict_list})
 	
 	
 	# CLUSTAL
@@ -623,7 +584,6 @@ def main(argv):
 	final_prot_dict = {}
 	final_annotated_dict = {}
 	nucl_to_add = {}
-	nucl_seq_q_spec = {}
 	
 	for query_spec in prot_dict.keys():
 		for seq_id in prot_dict[query_spec].keys():
@@ -655,12 +615,6 @@ def main(argv):
 						else:
 							if anno_dict_list[query_spec][seq_id] not in nucl_to_add[seq_id]:
 								nucl_to_add[seq_id].append(anno_dict_list[query_spec][seq_id])
-								
-			if seq_id not in nucl_seq_q_spec.keys():
-				nucl_seq_q_spec[seq_id] = [query_spec]
-			else:
-				if query_spec not in nucl_seq_q_spec[seq_id]:
-					nucl_seq_q_spec[seq_id].append(query_spec)
 
 								
 	for seq_id in nucl_to_add.keys():
@@ -669,44 +623,15 @@ def main(argv):
 			
 	# write summary report for annotated nucl seqs
 	auto_sum = "complete_auto_anno_summary.tsv"
-	auto_report = {}
-
-	for key, value in final_annotated_dict.items():
-		scaffold_id = key
-		for hit in value:
-			species = hit[0]
-			start = hit[1]
-			end = hit[2]
-			
-			if species not in auto_report.keys():
-				auto_report[species] = [[scaffold_id], [start], [end], nucl_seq_q_spec[scaffold_id]]
-			else:
-				auto_report[species][0].append(scaffold_id)
-				auto_report[species][1].append(start)
-				auto_report[species][2].append(end)
-				for spec in nucl_seq_q_spec[scaffold_id]:
-					if spec not in auto_report[species][3]:
-						auto_report[species][3].append(spec)   
+
+	# annotations of every query species and the ones left for clustal go into the results database
+	results_db.add_annotations(run_id, anno_dict_list)
+	results_db.add_auto_annotations(run_id, final_annotated_dict)
 	
 	# rows to write to tsv file
-	auto_sum_rows = []
+	auto_sum_rows = results_db.report("auto_anno_summary", run_id, auto_anno_columns, "first")
 	# headers for tsv file
-	auto_sum_headers = ["Species", "Scaffold ID", "Start Posit", "End Posit", "Query Species"]
-	
-	for key, value in auto_report.items():
-		species = key
-		scaffold_id = ', '.join(value[0])
-		min_posit = ', '.join([str(p) for p in value[1]])
-		max_posit = ', '.join([str(p) for p in value[2]])
-		q_spec = ', '.join(value[3])
-		
-		row = {"Species": species, 
-			   "Scaffold ID": scaffold_id, 
-			   "Start Posit": min_posit, 
-			   "End Posit": max_posit, 
-			   "Query Species": q_spec}
-		
-		auto_sum_rows.append(row)
+	auto_sum_headers = [header for header, column in auto_anno_columns]
 	
 	# write to tsv file
 	with open(auto_sum, 'w') as auto_sum_file:
@@ -715,19 +640,30 @@ def main(argv):
 		writer.writerows(auto_sum_rows)
 		
 	
-	# make a clustal object
-	clustal = Clustal(final_annotated_dict, final_prot_dict, prot_db)
+	# clustal of a resumed run is not run again
+	if not run_state.done("clustal"):
+		# make a clustal object
+		clustal = Clustal(final_annotated_dict, final_prot_dict, prot_db)
+	
+		# get fasta file for all seqs fron aumotated annotation
+		clustal.get_seqs_fasta()
+	
+		# run clustal with the result fasta file => output result file in clustal and fasta format
+		clustal.run_clustal()
+		print("Done")
+
+		run_state.save("clustal", {})
+	
 	
-	# get fasta file for all seqs fron aumotated annotation
-	clustal.get_seqs_fasta()
+	results_db.close()
 	
-	# run clustal with the result fasta file => output result file in clustal and fasta format
-	clustal.run_clustal()
-	print("Done")
+	# save result cache and report how many searches were re-used
+	if result_cache is not None:
+		print("\n" + result_cache.close())
 	
 	
 	# ORGANIZE FILES INTO FOLDERS
-	organizer = Organizer(i, taxIDS, ds_query_copy, seq_query_copy)
+	organizer = Organizer(q_num, taxIDS, ds_query_copy, seq_query_copy)
 	organizer.organize_files()
 	
 
@@ -2,9 +2,11 @@ import subprocess
 import sys
 import os
 from blast import *
+from user_input import InputProcessor
+from scheduler import split_threads, run_parallel
+from seq_fetch import fetch_seq, fetch_seqs, set_source
 from Bio import SeqIO
 from Bio.Seq import Seq
-from Bio.SeqRecord import SeqRecord
 
 # convert all_man_anno.txt into dictionary of dictionaries, outer key = query sepcies, inner key = scaffld id, inner value = species name, s_starts, s_stops, reading frame, sequence
 man_anno_file = "all_man_anno.txt"
@@ -33,18 +35,26 @@ with open(man_anno_file, 'r') as file:
 			man_anno_dict[q_spec][s_id] = [s_spec, s_starts, s_stops, frames,  q_starts, q_stops]
 
 # get dict of species and thei prot dataset files
-prot_file_paths = txt_to_dict("prot_files_all_dict.txt")
+prot_file_paths = read_dict("prot_files", "all")
 
 # q_spec and their query prot id
 q_prot_ids = {"Saccharomyces cerevisiae" : "NP_010615.3", "Candida verbasci" : "CAI5756721.1"}
+
+# thread budget for reciprocal blasts, e.g. 'python manual_anno.py -threads 16'
+input_processor = InputProcessor(sys.argv)
+threads = input_processor.get_threads(8)
+
+# where sequences are read from, e.g. 'python manual_anno.py -seqsource faidx'
+set_source(input_processor.get_seq_source())
 			
 class MultiAlignAnno():
 	
-	def __init__(self, all_man_anno_dict, nucl_db, prot_file_paths, q_prot_ids):
+	def __init__(self, all_man_anno_dict, nucl_db, prot_file_paths, q_prot_ids, threads):
 		self.man_anno_dict = all_man_anno_dict
 		self.nucl_db = nucl_db
 		self.prot_file_paths = prot_file_paths
 		self.q_prot_ids = q_prot_ids
+		self.threads = threads
 		self.to_remove = {}
 		self.to_further_anno = {}
 		self.to_keep = {}
@@ -72,8 +82,14 @@ class MultiAlignAnno():
 			
 			
 	def get_nucl_seq(self, seq_id, mode, start, stop):
-		db_info = subprocess.run("blastdbcmd -db {0} -entry {1} -strand {2} -range {3}-{4}".format(self.nucl_db, seq_id, mode, start, stop).split(), capture_output=True, text=True).stdout.split("\n")
-		return ''.join(db_info[1:-1])
+		return fetch_seq(self.nucl_db, seq_id, mode, start, stop)[1]
+		
+		
+	# get several ranges of a scaffold with one blastdbcmd call, ranges => [(mode, start, stop)]
+	def get_nucl_seqs(self, seq_id, ranges):
+		requests = [(seq_id, mode, start, stop) for mode, start, stop in ranges]
+		records = fetch_seqs(self.nucl_db, requests)
+		return [records[request][1] for request in requests]
 
 	
 	def alignments_overlap(self, starts, stops):
@@ -83,17 +99,20 @@ class MultiAlignAnno():
 			return False
 	
 	
-	def write_query_fasta(self, q_spec, s_id, start, stop):
-		seq = ''
-		
+	# range of a query seq, minus strand if start > stop
+	def query_range(self, start, stop):
 		if start < stop:
-			seq = self.get_nucl_seq(s_id, "plus", start, stop)
+			return ("plus", start, stop)
 		else:
-			seq = self.get_nucl_seq(s_id, "minus", stop, start)
+			return ("minus", stop, start)
+	
+	
+	def write_query_fasta(self, q_spec, s_id, start, stop, file_name="man_recip_q.fasta", seq=None):
+		if seq is None:
+			seq = self.get_nucl_seq(s_id, *self.query_range(start, stop))
 			
 		blast_seq = SeqIO.SeqRecord(Seq(seq), id=s_id, description=self.man_anno_dict[q_spec][s_id][0])
 
-		file_name = "man_recip_q.fasta"
 		with open(file_name, "w") as fasta_file:
 			SeqIO.write(blast_seq, fasta_file, "fasta")
 
@@ -102,9 +121,13 @@ class MultiAlignAnno():
 		
 	def blastx(self, s_id, q_spec, q_prot_db):
 		align_info = self.man_anno_dict[q_spec][s_id]
-		blast_file_name = "man_recip_blastx.blasted"
 		valid_hits = []
 		
+		# one blastx per alignment, run at the same time within the thread budget
+		workers, per_worker = split_threads(self.threads, len(align_info[1]))
+		commands = []
+		
+		query_ranges = []
 		for i in range(len(align_info[1])):	
 			start = None
 			stop = None
@@ -114,8 +137,20 @@ class MultiAlignAnno():
 			elif align_info[3][i] < 0:
 				start = align_info[2][i]
 				stop = align_info[1][i]
-			query = self.write_query_fasta(q_spec, s_id, start, stop)
-			subprocess.run("blastx -query {0} -db {1} -out {2} -outfmt {3} -num_threads 8".format(query, q_prot_db, blast_file_name, "6").split())
+			query_ranges.append((start, stop))
+		
+		# fetch all query seqs with one blastdbcmd call
+		query_seqs = self.get_nucl_seqs(s_id, [self.query_range(start, stop) for start, stop in query_ranges])
+		
+		for i, (start, stop) in enumerate(query_ranges):
+			query = self.write_query_fasta(q_spec, s_id, start, stop, "man_recip_q_" + str(i) + ".fasta", query_seqs[i])
+			blast_file_name = "man_recip_blastx_" + str(i) + ".blasted"
+			commands.append("blastx -query {0} -db {1} -out {2} -outfmt {3} -num_threads {4}".format(query, q_prot_db, blast_file_name, "6", per_worker).split())
+			
+		run_parallel(commands, workers)
+		
+		for i in range(len(align_info[1])):
+			blast_file_name = "man_recip_blastx_" + str(i) + ".blasted"
 			
 			if os.stat(blast_file_name).st_size != 0:
 				with open(blast_file_name, "r") as blastx_rslt:
@@ -125,6 +160,9 @@ class MultiAlignAnno():
 
 					if sseq_id == self.q_prot_ids[q_spec]:
 						valid_hits.append(i)
+			
+			os.remove(blast_file_name)
+			os.remove("man_recip_q_" + str(i) + ".fasta")
 		return valid_hits
 	
 	
@@ -140,7 +178,7 @@ class MultiAlignAnno():
 		with open(query, "w") as fasta_file:
 			SeqIO.write(blast_seq, fasta_file, "fasta")
 
-		subprocess.run("blastp -query {0} -db {1} -out {2} -outfmt {3} -num_threads 8".format(query, q_prot_db, blast_file_name, "6").split())
+		subprocess.run("blastp -query {0} -db {1} -out {2} -outfmt {3} -num_threads {4}".format(query, q_prot_db, blast_file_name, "6", self.threads).split())
 		
 		if os.stat(blast_file_name).st_size != 0:
 			with open(blast_file_name, "r") as blastp_rslt:
@@ -219,8 +257,7 @@ class MultiAlignAnno():
 				seq1_start, seq2_start = starts[1], starts[0]
 				seq1_end, seq2_end = stops[1], stops[0]
 				
-			seq1 = self.get_nucl_seq(s_id, "plus", seq1_start, seq1_end)
-			seq2 = self.get_nucl_seq(s_id, "plus", seq2_start, seq2_end)
+			seq1, seq2 = self.get_nucl_seqs(s_id, [("plus", seq1_start, seq1_end), ("plus", seq2_start, seq2_end)])
 		
 		elif all(num < 0 for num in frames):
 			if starts[0] > starts[1]:
@@ -230,8 +267,7 @@ class MultiAlignAnno():
 				seq1_start, seq2_start = starts[1], starts[0]
 				seq1_end, seq2_end = stops[1], stops[0]			
 				
-			seq1 = self.get_nucl_seq(s_id, "minus", seq1_end, seq1_start)
-			seq2 = self.get_nucl_seq(s_id, "minus", seq2_end, seq2_start)
+			seq1, seq2 = self.get_nucl_seqs(s_id, [("minus", seq1_end, seq1_start), ("minus", seq2_end, seq2_start)])
 		
 		start_substr = "GT"
 		stop_substr = "AG"
@@ -319,7 +355,7 @@ class MultiAlignAnno():
 	
 		
 
-annotator = MultiAlignAnno(man_anno_dict, "nucl", prot_file_paths, q_prot_ids)
+annotator = MultiAlignAnno(man_anno_dict, "nucl", prot_file_paths, q_prot_ids, threads)
 
 for q_spec, hit_dict in annotator.man_anno_dict.items():
 	
@@ -49,7 +49,7 @@ class Organizer():
 		
         # add required search set files into one folder (for future runs)
 		search_set_fol = self.mkdir('SearchSetFiles')
-		search_set_files = ['nucl.fna', 'prot.faa', 'all_specs.txt', 'prot_data_specs.txt', 'prot_files_all_dict.txt', ' '.join(self.taxIDs)]
+		search_set_files = ['nucl.fna', 'nucl.fna.specs', 'prot.faa', 'all_specs.txt', 'prot_data_specs.txt', 'prot_files_all_dict.jsonl', 'prot_files_all_dict.txt', ' '.join(self.taxIDs)]
 		search_set_files2 = []
 		for file in search_set_files:
 			if os.path.exists(file):
@@ -58,8 +58,8 @@ class Organizer():
         
 		
         # remove very miscellaneous files
-		dataset_files = ['.pjs', '.ptf', '.pto', '.pot', '.pdb', '.pos', '.pog', '.psq', '.phr', '.pin']
-		dataset_files2 = ['.njs', '.ntf', '.nto', '.not', '.ndb', '.nos', '.nog', '.nsq', '.nhr', '.nin', '.fna']
+		dataset_files = ['.pjs', '.ptf', '.pto', '.pot', '.pdb', '.pos', '.pog', '.psq', '.phr', '.pin', '.faa.fai', '.fingerprint']
+		dataset_files2 = ['.njs', '.ntf', '.nto', '.not', '.ndb', '.nos', '.nog', '.nsq', '.nhr', '.nin', '.fna', '.fna.fai', '.fingerprint']
 		mis_files= []
 		ds_name = self.ds_query.split('.')[0]
         
@@ -73,10 +73,6 @@ class Organizer():
 				mis_files.append(file_name2)
 		
 		for i in range(len(dataset_files2)):
-			file_name3 = 'nucl_2' + dataset_files2[i]
-			if os.path.exists(file_name3):
-				mis_files.append(file_name3)
-				
 			file_name4 = 'nucl' + dataset_files2[i]
 			if os.path.exists(file_name4):
 				mis_files.append(file_name4)
@@ -88,7 +84,19 @@ class Organizer():
 		self.rm(mis_files)
 		
 		if os.path.exists('recip_seq.txt'):
-			self.rm(['recip_seq.txt'])	
+			self.rm(['recip_seq.txt'])
+		# run is finished, nothing is left to resume
+		if os.path.exists('run_state.json'):
+			self.rm(['run_state.json'])
+		exclude_files = [file for file in self.file_list if file.startswith('nucl_exclude') and file.endswith('.txt')]
+		if len(exclude_files) > 0:
+			self.rm(exclude_files)
+		shard_files = [file for file in self.file_list if file.startswith(('prot_shard_', 'nucl_shard_')) or file in ['prot.shards', 'nucl.shards']]
+		if len(shard_files) > 0:
+			self.rm(shard_files)
+		recip_files = [file for file in self.file_list if file.startswith('recip_seqs') and file.endswith('.txt')]
+		if len(recip_files) > 0:
+			self.rm(recip_files)
 		
 		contains_blasted = any('.blasted' in file for file in self.file_list)
 		if contains_blasted:
@@ -102,9 +110,10 @@ class Organizer():
 		
 		for i in range(len(blast_dicts)):
 			for j in range(self.q_num):
-				dict_file = blast_dicts[i] + '_' + str(j+1) + '_dict.txt'
-				if os.path.exists(dict_file):
-					dict_files.append(dict_file)
+				for ext in ['.jsonl', '.txt']:
+					dict_file = blast_dicts[i] + '_' + str(j+1) + '_dict' + ext
+					if os.path.exists(dict_file):
+						dict_files.append(dict_file)
 					
 		self.mv(dict_files, dict_fol)
 		
@@ -125,7 +134,7 @@ class Organizer():
 		
 		# move main files into one folder
 		main_fol = self.mkdir('MainFiles')
-		main_files = ['complete_blast_summary_report.tsv', 'complete_manual_anno_summary.tsv', 'complete_auto_anno_summary.tsv', 'auto_algn.fasta', 'auto_algn.clustal']
+		main_files = ['complete_blast_summary_report.tsv', 'complete_manual_anno_summary.tsv', 'complete_auto_anno_summary.tsv', 'auto_algn.fasta', 'auto_algn.clustal', 'results.db']
 		main_files2 = []
 		
 		for file in main_files:
@@ -137,6 +146,9 @@ class Organizer():
 		# move annotation files into one folder
 		anno_fol = self.mkdir('AnnotationFiles')
 		subprocess.run("mv {0} {1}/".format('*.txt', anno_fol), shell=True)
+		anno_dict_files = [file for file in os.listdir('.') if file.startswith('annotated_') and file.endswith('_dict.jsonl')]
+		if len(anno_dict_files) > 0:
+			self.mv(anno_dict_files, anno_fol)
 		if os.path.exists('auto_anno_seqs.fasta'):
 			self.mv(['auto_anno_seqs.fasta'], anno_fol)
 		
@@ -1,13 +1,13 @@
 import random
-import subprocess
 from Bio import SeqIO
 from Bio.Seq import Seq
-from Bio.SeqRecord import SeqRecord
-from ete3 import NCBITaxa
+from taxonomy import get_taxonomy
+from seq_fetch import fetch_seq
 
 class CladesProcessor():
 	
-	def __init__(self, results_dict, db, prev_q_specs):	
+	# rng is the random number generator species are picked with, e.g. random.Random(seed) to get the same picks every run
+	def __init__(self, results_dict, db, prev_q_specs, rng=random):	
 		self.specs = []
 		for q_spec in results_dict.keys():
 			for seq_id in results_dict[q_spec]:
@@ -18,46 +18,32 @@ class CladesProcessor():
 		self.results_dict = results_dict
 		self.db = db
 		self.prev_q_specs = prev_q_specs
+		self.rng = rng
 
 
-	# get tax id for each species	
+	# get family tax id of a species	
 	def get_taxid(self, spec_name):
-		ncbi = NCBITaxa()
-		
-		taxids = ncbi.get_name_translator([spec_name])
-		if spec_name in taxids:
-			taxid = taxids[spec_name][0]
-		else:
-			return None
-		
-		lineage = ncbi.get_lineage(taxid)
-		
-		family_taxid = None
-		
-		for tax in lineage:
-			rank = ncbi.get_rank([tax])
-			if rank[tax] == "family":
-				family_taxid = tax
-				break
-
-		return family_taxid
+		return get_taxonomy().get_family(spec_name)
+	
+	
+	# get family tax ids of all species with one lookup, species => family tax id
+	def get_taxids(self, spec_names):
+		return get_taxonomy().get_families(spec_names)
 	
 	
 	def get_query_spec_taxids(self):
-		prev_q_taxids = []
-		for spec in self.prev_q_specs:
-			spec_taxid = self.get_taxid(spec)
-			prev_q_taxids.append(spec_taxid)
-		return prev_q_taxids
+		taxids = self.get_taxids(self.prev_q_specs)
+		return [taxids[spec] for spec in self.prev_q_specs]
 	
 	# sort species into clades
 	def process_all_specs(self):
 		query_taxids = self.get_query_spec_taxids()
+		taxids = self.get_taxids(self.specs)
 		query_clades = []
 		other_clades = []
 		
 		for spec in self.specs:
-			taxid = self.get_taxid(spec)
+			taxid = taxids[spec]
 			if taxid in query_taxids:
 				query_clades.append(spec)
 			else:
@@ -72,9 +58,24 @@ class CladesProcessor():
 		if len(other_clades) == 0:
 			return None
 		else:
-			choice = random.choice(other_clades)
+			choice = self.rng.choice(other_clades)
 			return choice
 	
+	# pick up to k random species, each in a different family, none in the family of a previous query species
+	def get_rand_specs(self, k):
+		query_taxids = self.get_query_spec_taxids()
+		taxids = self.get_taxids(self.specs)
+		
+		# family tax id => species
+		families = {}
+		for spec in self.specs:
+			taxid = taxids[spec]
+			if taxid not in query_taxids:
+				families.setdefault(taxid, []).append(spec)
+		
+		picked = self.rng.sample(list(families.keys()), min(k, len(families)))
+		return [self.rng.choice(families[taxid]) for taxid in picked]
+	
 	# get seq id using species name
 	def get_id(self, spec_name):
 		for q_spec in self.results_dict.keys():
@@ -85,9 +86,9 @@ class CladesProcessor():
 	
 	# get fasta file of a given seq id
 	def get_id_fasta(self, seq_id):
-		db_info = subprocess.run("blastdbcmd -db {0} -entry {1}".format(self.db, seq_id).split(), capture_output=True, text=True).stdout.split("\n")
-		des = db_info[0][1:]
-		seq = Seq(''.join(db_info[1:-1]))
+		defline, seq = fetch_seq(self.db, seq_id)
+		des = defline[1:]
+		seq = Seq(seq)
 		
 		fasta_seq = SeqIO.SeqRecord(seq, id=seq_id, description=des)
 		
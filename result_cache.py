@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+
+# on-disk cache of blast results shared across rounds and runs
+# results are stored under objects/ named by the hash of everything the search depends on (program, query, database fingerprint, parameters)
+class ResultCache():
+
+	def __init__(self, cache_dir, max_bytes):
+		self.cache_dir = cache_dir
+		self.objects_dir = os.path.join(cache_dir, "objects")
+		self.index_file = os.path.join(cache_dir, "index.json")
+		self.max_bytes = max_bytes
+		self.lock = threading.Lock()
+
+		# hits and misses of this run
+		self.hits = 0
+		self.misses = 0
+
+		os.makedirs(self.objects_dir, exist_ok=True)
+
+		# key => {"size": size, "last_used": time}, stats => hits and misses of all runs
+		self.index = {}
+		self.stats = {"hits": 0, "misses": 0}
+		if os.path.exists(self.index_file):
+			with open(self.index_file, "r") as file:
+				try:
+					saved = json.load(file)
+					self.index = saved["entries"]
+					self.stats = saved["stats"]
+				except (ValueError, KeyError):
+					print("Result cache index is corrupted, starting with an empty cache.")
+
+
+	# key of a search, parts are strings and files are hashed by their content
+	def key(self, parts, files=[]):
+		sha = hashlib.sha256()
+		for part in parts:
+			sha.update(str(part).encode())
+			sha.update(b"\0")
+		for file_name in files:
+			with open(file_name, "rb") as file:
+				for chunk in iter(lambda: file.read(1 << 20), b""):
+					sha.update(chunk)
+			sha.update(b"\0")
+		return sha.hexdigest()
+
+
+	# path of a stored result
+	def object_path(self, key):
+		return os.path.join(self.objects_dir, key[:2], key)
+
+
+	# write index to disk, replace old index in one step so it never gets truncated
+	def save_index(self):
+		tmp_file = self.index_file + ".tmp"
+		with open(tmp_file, "w") as file:
+			json.dump({"entries": self.index, "stats": self.stats}, file)
+		os.replace(tmp_file, self.index_file)
+
+
+	# count a hit or a miss
+	def count(self, hit):
+		name = "hits" if hit else "misses"
+		if hit:
+			self.hits += 1
+		else:
+			self.misses += 1
+		self.stats[name] += 1
+
+
+	# get stored result, None if it is not in the cache
+	def get(self, key):
+		path = self.object_path(key)
+		with self.lock:
+			if key not in self.index or not os.path.exists(path):
+				self.count(False)
+				return None
+
+			with open(path, "rb") as file:
+				data = file.read()
+
+			self.index[key]["last_used"] = time.time()
+			self.count(True)
+
+		return data
+
+
+	# store a result
+	def put(self, key, data):
+		self.put_many([(key, data)])
+
+
+	# store several results, index is saved once
+	def put_many(self, items):
+		with self.lock:
+			for key, data in items:
+				path = self.object_path(key)
+				os.makedirs(os.path.dirname(path), exist_ok=True)
+
+				tmp_file = path + ".tmp"
+				with open(tmp_file, "wb") as file:
+					file.write(data)
+				os.replace(tmp_file, path)
+
+				self.index[key] = {"size": len(data), "last_used": time.time()}
+
+			self.evict()
+			self.save_index()
+
+
+	# copy stored result into a file, return False if it is not in the cache
+	def get_file(self, key, file_name):
+		data = self.get(key)
+		if data is None:
+			return False
+
+		with open(file_name, "wb") as file:
+			file.write(data)
+		return True
+
+
+	# store a result file
+	def put_file(self, key, file_name):
+		with open(file_name, "rb") as file:
+			self.put(key, file.read())
+
+
+	# remove least recently used results until the cache fits in max_bytes
+	def evict(self):
+		total = sum(entry["size"] for entry in self.index.values())
+		lru_keys = sorted(self.index.keys(), key=lambda key: self.index[key]["last_used"])
+
+		for key in lru_keys:
+			if total <= self.max_bytes:
+				break
+
+			entry = self.index.pop(key)
+			path = self.object_path(key)
+			if os.path.exists(path):
+				os.remove(path)
+			total -= entry["size"]
+
+
+	# save index and statistics, return summary of this run
+	def close(self):
+		with self.lock:
+			self.save_index()
+		return "Result cache: {0} hits, {1} misses ({2} hits, {3} misses across all runs).".format(self.hits, self.misses, self.stats["hits"], self.stats["misses"])
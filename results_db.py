@@ -0,0 +1,271 @@
+import time
+import sqlite3
+import threading
+from blast_hits import NuclHit
+
+
+# kind of hits of each search, hits against the aa dataset are 'prot', hits against the nucl dataset are 'nucl'
+hit_kinds = {"blastp": "prot", "blastx": "prot", "tblastn": "nucl", "tblastx": "nucl"}
+
+schema = """
+CREATE TABLE IF NOT EXISTS runs (
+	run_id INTEGER PRIMARY KEY,
+	started REAL,
+	seq_query TEXT,
+	ds_query TEXT,
+	q_spec TEXT,
+	q_type TEXT
+);
+
+-- species of the search set, in the order of all_specs
+CREATE TABLE IF NOT EXISTS species (
+	run_id INTEGER,
+	position INTEGER,
+	spec TEXT
+);
+
+-- one row per query, q_num is the number of the query in the run, round is the round it was searched in
+CREATE TABLE IF NOT EXISTS queries (
+	run_id INTEGER,
+	q_num INTEGER,
+	round INTEGER,
+	q_spec TEXT,
+	q_type TEXT,
+	seq_query TEXT,
+	ds_query TEXT
+);
+
+-- subjects found by the forward search of a query
+CREATE TABLE IF NOT EXISTS hits (
+	hit_id INTEGER PRIMARY KEY,
+	run_id INTEGER,
+	q_num INTEGER,
+	blast_type TEXT,
+	kind TEXT,
+	seq_id TEXT,
+	spec TEXT,
+	best_evalue REAL
+);
+
+-- hsps of the subjects in hits
+CREATE TABLE IF NOT EXISTS hsps (
+	hit_id INTEGER,
+	sstart INTEGER,
+	send INTEGER,
+	evalue REAL,
+	qstart INTEGER,
+	qend INTEGER,
+	sframe INTEGER
+);
+
+-- reciprocal search of a subject: 'valid', 'invalid' or 'known' (confirmed in an earlier round, incremental mode)
+CREATE TABLE IF NOT EXISTS recip (
+	run_id INTEGER,
+	q_num INTEGER,
+	blast_type TEXT,
+	seq_id TEXT,
+	status TEXT
+);
+
+-- automatically annotated sequences of each query species
+CREATE TABLE IF NOT EXISTS annotations (
+	run_id INTEGER,
+	q_spec TEXT,
+	seq_id TEXT,
+	spec TEXT,
+	start INTEGER,
+	end INTEGER,
+	frame INTEGER,
+	seq TEXT
+);
+
+-- annotated sequences left after removing overlapping sequences of different query species
+CREATE TABLE IF NOT EXISTS auto_annotations (
+	run_id INTEGER,
+	seq_id TEXT,
+	spec TEXT,
+	start INTEGER,
+	end INTEGER,
+	frame INTEGER,
+	seq TEXT
+);
+
+-- sequences that need manual annotation, start and end are the lowest and highest position of their hits
+CREATE TABLE IF NOT EXISTS manual_annotations (
+	run_id INTEGER,
+	q_spec TEXT,
+	seq_id TEXT,
+	spec TEXT,
+	start INTEGER,
+	end INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS species_run ON species (run_id, spec);
+CREATE INDEX IF NOT EXISTS queries_run ON queries (run_id, q_num);
+CREATE INDEX IF NOT EXISTS hits_query ON hits (run_id, q_num, blast_type, seq_id);
+CREATE INDEX IF NOT EXISTS hits_spec ON hits (run_id, spec);
+CREATE INDEX IF NOT EXISTS hsps_hit ON hsps (hit_id);
+CREATE INDEX IF NOT EXISTS recip_query ON recip (run_id, q_num, blast_type, seq_id);
+CREATE INDEX IF NOT EXISTS annotations_seq ON annotations (run_id, seq_id);
+CREATE INDEX IF NOT EXISTS auto_annotations_spec ON auto_annotations (run_id, spec);
+CREATE INDEX IF NOT EXISTS manual_annotations_spec ON manual_annotations (run_id, spec, seq_id);
+
+-- hits that passed the reciprocal search and were not found in an earlier round
+CREATE VIEW IF NOT EXISTS valid_hits AS
+SELECT hits.* FROM hits
+JOIN recip ON recip.run_id = hits.run_id AND recip.q_num = hits.q_num AND recip.blast_type = hits.blast_type AND recip.seq_id = hits.seq_id
+WHERE recip.status = 'valid';
+
+-- complete_blast_summary_report.tsv, species with hits in the order they were found, then the other species of the search set
+CREATE VIEW IF NOT EXISTS blast_summary AS
+SELECT run_id,
+	spec AS species,
+	(SELECT COUNT(*) FROM (SELECT DISTINCT kind, seq_id FROM valid_hits v WHERE v.run_id = s.run_id AND v.spec = s.spec)) AS num_hits,
+	IFNULL((SELECT GROUP_CONCAT(seq_id, ', ') FROM (SELECT seq_id FROM valid_hits v WHERE v.run_id = s.run_id AND v.spec = s.spec AND v.kind = 'prot' GROUP BY seq_id ORDER BY MIN(hit_id))), 'N/A') AS prot_hit_ids,
+	IFNULL((SELECT GROUP_CONCAT(seq_id, ', ') FROM (SELECT seq_id FROM valid_hits v WHERE v.run_id = s.run_id AND v.spec = s.spec AND v.kind = 'nucl' GROUP BY seq_id ORDER BY MIN(hit_id))), 'N/A') AS nucl_hit_ids,
+	(SELECT MIN(hit_id) FROM valid_hits v WHERE v.run_id = s.run_id AND v.spec = s.spec) AS first_hit,
+	MIN(position) AS position
+FROM (SELECT run_id, spec, position FROM species UNION ALL SELECT run_id, spec, NULL FROM valid_hits) s
+GROUP BY run_id, spec;
+
+-- complete_manual_anno_summary.tsv, one row per species, positions are listed in the order of the scaffold ids
+CREATE VIEW IF NOT EXISTS manual_anno_summary AS
+SELECT run_id,
+	spec AS species,
+	GROUP_CONCAT(seq_id, ', ') AS scaffold_ids,
+	GROUP_CONCAT(min_posit, ', ') AS min_posits,
+	GROUP_CONCAT(max_posit, ', ') AS max_posits,
+	(SELECT GROUP_CONCAT(q_spec, ', ') FROM (SELECT q_spec FROM manual_annotations m WHERE m.run_id = s.run_id AND m.spec = s.spec GROUP BY q_spec ORDER BY MIN(rowid))) AS query_specs,
+	MIN(first) AS first
+FROM (SELECT run_id, spec, seq_id, MIN(start) AS min_posit, MAX(end) AS max_posit, MIN(rowid) AS first FROM manual_annotations GROUP BY run_id, spec, seq_id ORDER BY first) s
+GROUP BY run_id, spec;
+
+-- complete_auto_anno_summary.tsv, query species of a species are all query species that annotated any of its scaffolds
+CREATE VIEW IF NOT EXISTS auto_anno_summary AS
+SELECT run_id,
+	spec AS species,
+	GROUP_CONCAT(seq_id, ', ') AS scaffold_ids,
+	GROUP_CONCAT(start, ', ') AS starts,
+	GROUP_CONCAT(end, ', ') AS ends,
+	(SELECT GROUP_CONCAT(q_spec, ', ') FROM (SELECT q_spec FROM annotations a WHERE a.run_id = f.run_id AND a.seq_id IN (SELECT seq_id FROM auto_annotations f2 WHERE f2.run_id = f.run_id AND f2.spec = f.spec) GROUP BY q_spec ORDER BY MIN(rowid))) AS query_specs,
+	MIN(first) AS first
+FROM (SELECT run_id, seq_id, spec, start, end, rowid AS first FROM auto_annotations ORDER BY rowid) f
+GROUP BY run_id, spec;
+"""
+
+
+# columns of the reports written from the views, header => column
+blast_summary_columns = [("Species", "species"), ("Num Hit(s)", "num_hits"), ("Protein Hit ID(s)", "prot_hit_ids"), ("Nucleotide Hit ID(s)", "nucl_hit_ids")]
+manual_anno_columns = [("Species", "species"), ("Scaffold ID", "scaffold_ids"), ("Min Posit", "min_posits"), ("Max Posit", "max_posits"), ("Query Species", "query_specs")]
+auto_anno_columns = [("Species", "species"), ("Scaffold ID", "scaffold_ids"), ("Start Posit", "starts"), ("End Posit", "ends"), ("Query Species", "query_specs")]
+
+
+# sqlite database of the hits, reciprocal searches and annotations of all runs that used it
+# queries of a round write from several threads, so one connection is shared behind a lock
+class ResultsDB():
+
+	def __init__(self, db_file):
+		self.db_file = db_file
+		self.lock = threading.Lock()
+		self.conn = sqlite3.connect(db_file, check_same_thread=False)
+		self.conn.executescript(schema)
+		self.conn.commit()
+
+
+	# add a run, return its id
+	def add_run(self, seq_query, ds_query, q_spec, q_type):
+		with self.lock, self.conn:
+			cursor = self.conn.execute("INSERT INTO runs (started, seq_query, ds_query, q_spec, q_type) VALUES (?, ?, ?, ?, ?)", (time.time(), seq_query, ds_query, q_spec, q_type))
+			return cursor.lastrowid
+
+
+	# species of the search set of a run, replaces species added before (e.g. by an interrupted run that is resumed)
+	def add_species(self, run_id, all_specs):
+		with self.lock, self.conn:
+			self.conn.execute("DELETE FROM species WHERE run_id = ?", (run_id,))
+			self.conn.executemany("INSERT INTO species VALUES (?, ?, ?)", [(run_id, position, spec) for position, spec in enumerate(all_specs)])
+
+
+	# remove queries after q_num and their results, they were not finished when a resumed run was interrupted
+	def discard_queries(self, run_id, q_num):
+		with self.lock, self.conn:
+			self.conn.execute("DELETE FROM hsps WHERE hit_id IN (SELECT hit_id FROM hits WHERE run_id = ? AND q_num > ?)", (run_id, q_num))
+			for table in ["queries", "hits", "recip"]:
+				self.conn.execute("DELETE FROM " + table + " WHERE run_id = ? AND q_num > ?", (run_id, q_num))
+
+
+	def add_query(self, run_id, q_num, i, query):
+		seq_query, ds_query, q_type, q_spec = query
+		with self.lock, self.conn:
+			self.conn.execute("INSERT INTO queries VALUES (?, ?, ?, ?, ?, ?, ?)", (run_id, q_num, i, q_spec, q_type, seq_query, ds_query))
+
+
+	# subjects and hsps of the forward search of a query
+	def add_hits(self, run_id, q_num, blast_type, blast_dict):
+		with self.lock, self.conn:
+			for seq_id, hits in blast_dict.items():
+				cursor = self.conn.execute("INSERT INTO hits (run_id, q_num, blast_type, kind, seq_id, spec, best_evalue) VALUES (?, ?, ?, ?, ?, ?, ?)",
+										   (run_id, q_num, blast_type, hit_kinds[blast_type], seq_id, hits[0].spec, min(hit.evalue for hit in hits)))
+				hit_id = cursor.lastrowid
+
+				if isinstance(hits[0], NuclHit):
+					rows = [(hit_id, hit.sstart, hit.send, hit.evalue, hit.qstart, hit.qend, hit.sframe) for hit in hits]
+				else:
+					rows = [(hit_id, hit.sstart, hit.send, hit.evalue, None, None, None) for hit in hits]
+				self.conn.executemany("INSERT INTO hsps VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+	# outcome of the reciprocal search of every subject of a forward search
+	# valid_ids are the subjects that passed, known are the subjects that were accepted without searching
+	def add_recip(self, run_id, q_num, blast_type, seq_ids, valid_ids, known=()):
+		valid_ids = set(valid_ids)
+
+		rows = []
+		for seq_id in seq_ids:
+			if seq_id in known:
+				status = "known"
+			elif seq_id in valid_ids:
+				status = "valid"
+			else:
+				status = "invalid"
+			rows.append((run_id, q_num, blast_type, seq_id, status))
+
+		with self.lock, self.conn:
+			self.conn.executemany("INSERT INTO recip VALUES (?, ?, ?, ?, ?)", rows)
+
+
+	# annotated sequences of every query species, anno_dict_list is query species => seq id => [species, start, end, frame, seq]
+	def add_annotations(self, run_id, anno_dict_list):
+		rows = [(run_id, q_spec, seq_id) + tuple(anno) for q_spec, anno_dict in anno_dict_list.items() for seq_id, anno in anno_dict.items()]
+
+		with self.lock, self.conn:
+			self.conn.execute("DELETE FROM annotations WHERE run_id = ?", (run_id,))
+			self.conn.executemany("INSERT INTO annotations VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+	# annotated sequences left after removing overlaps, final_annotated_dict is seq id => list of [species, start, end, frame, seq]
+	def add_auto_annotations(self, run_id, final_annotated_dict):
+		rows = [(run_id, seq_id) + tuple(anno) for seq_id, annos in final_annotated_dict.items() for anno in annos]
+
+		with self.lock, self.conn:
+			self.conn.execute("DELETE FROM auto_annotations WHERE run_id = ?", (run_id,))
+			self.conn.executemany("INSERT INTO auto_annotations VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+	# sequences that need manual annotation, rows are (query species, seq id, species, start, end)
+	def add_manual_annotations(self, run_id, rows):
+		with self.lock, self.conn:
+			self.conn.execute("DELETE FROM manual_annotations WHERE run_id = ?", (run_id,))
+			self.conn.executemany("INSERT INTO manual_annotations VALUES (?, ?, ?, ?, ?, ?)", [(run_id,) + tuple(row) for row in rows])
+
+
+	# rows of a report view of a run as dicts of header => value
+	def report(self, view, run_id, columns, order_by):
+		with self.lock:
+			cursor = self.conn.execute("SELECT " + ", ".join(column for header, column in columns) + " FROM " + view + " WHERE run_id = ? ORDER BY " + order_by, (run_id,))
+			return [{header: value for (header, column), value in zip(columns, row)} for row in cursor]
+
+
+	def close(self):
+		with self.lock:
+			self.conn.close()
@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+from blast_hits import dict_to_lists, dict_from_lists
+from intervals import HitIndex, IntervalSet
+
+
+# state of a run saved after each stage and each round, so an interrupted run can be resumed with -resume
+# stages are saved in the order they finish, values of later stages are added to the values of earlier ones
+class RunState():
+
+	def __init__(self, state_file="run_state.json"):
+		self.state_file = state_file
+		self.stages = []
+		self.values = {}
+
+
+	# read saved state, return False if there is none
+	def load(self):
+		if not os.path.exists(self.state_file):
+			return False
+
+		with open(self.state_file, "r") as file:
+			try:
+				saved = json.load(file)
+				self.stages = saved["stages"]
+				self.values = saved["values"]
+			except (ValueError, KeyError):
+				print("\nERROR: Run state file " + self.state_file + " is corrupted, run without '-resume' to start over.\n")
+				sys.exit()
+
+		return True
+
+
+	# check if a stage was finished
+	def done(self, stage):
+		return stage in self.stages
+
+
+	# last finished stage, None if nothing was saved
+	def last_stage(self):
+		return self.stages[-1] if len(self.stages) > 0 else None
+
+
+	# value saved by a stage
+	def get(self, name):
+		return self.values[name]
+
+
+	# mark a stage as finished and save its values, replace old state in one step so it never gets truncated
+	def save(self, stage, values):
+		if stage not in self.stages:
+			self.stages.append(stage)
+		self.values.update(values)
+
+		tmp_file = self.state_file + ".tmp"
+		with open(tmp_file, "w") as file:
+			json.dump({"stages": self.stages, "values": self.values}, file)
+		os.replace(tmp_file, self.state_file)
+
+
+# hit index as plain values, prot ids and the merged intervals of every scaffold
+def index_to_dict(hit_index):
+	return {"prot_ids": sorted(hit_index.prot_ids), "scaffolds": {scaff: [intervals.starts, intervals.ends] for scaff, intervals in hit_index.scaffolds.items()}}
+
+
+# hit index from plain values
+def index_from_dict(values):
+	hit_index = HitIndex()
+	hit_index.prot_ids = set(values["prot_ids"])
+
+	for scaff, (starts, ends) in values["scaffolds"].items():
+		intervals = IntervalSet()
+		intervals.starts = starts
+		intervals.ends = ends
+		hit_index.scaffolds[scaff] = intervals
+
+	return hit_index
+
+
+# values of the blast rounds needed to continue with the next round
+def round_state(i, q_num, q_type, queries, q_specs_list, prot_dict, nucl_dict, hit_index, rng):
+	version, internal, gauss = rng.getstate()
+
+	return {"round": i,
+			"q_num": q_num,
+			"q_type": q_type,
+			"queries": queries,
+			"q_specs_list": q_specs_list,
+			"prot_dict": {q_spec: dict_to_lists(hits) for q_spec, hits in prot_dict.items()},
+			"nucl_dict": {q_spec: dict_to_lists(hits) for q_spec, hits in nucl_dict.items()},
+			"hit_index": index_to_dict(hit_index),
+			"rng": [version, internal, gauss]}
+
+
+# values of round_state back in the types main uses
+# return (i, q_num, q_type, queries, q_specs_list, prot_dict, nucl_dict, hit_index), the state of rng is restored in place
+def restore_round(run_state, rng):
+	version, internal, gauss = run_state.get("rng")
+	rng.setstate((version, tuple(internal), gauss))
+
+	return (run_state.get("round"),
+			run_state.get("q_num"),
+			run_state.get("q_type"),
+			[tuple(query) for query in run_state.get("queries")],
+			run_state.get("q_specs_list"),
+			{q_spec: dict_from_lists(hits) for q_spec, hits in run_state.get("prot_dict").items()},
+			{q_spec: dict_from_lists(hits) for q_spec, hits in run_state.get("nucl_dict").items()},
+			index_from_dict(run_state.get("hit_index")))
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from seq_fetch import fetch_seq
+from codons import CodonIndex
+
+
+# complement of nucleotides, including ambiguity codes
+complement = str.maketrans("ACGTUMRWSYKVHDBNacgtumrwsykvhdbn", "TGCAAKYWSRMBDHVNtgcaakywsrmbdhvn")
+
+# default size of a cache, 1 GB
+default_max_bytes = 1 << 30
+
+
+# whole scaffolds read during annotation, so hits on the same scaffold read it once
+# strands are 'plus' (as in the database) and 'complement' (complement of the plus strand, not reversed, so positions are the same as on the plus strand)
+# codon indexes of scaffolds are kept the same way, made from the plus strand
+# least recently used strands and indexes are removed once the cache holds more than max_bytes
+class ScaffoldCache():
+
+	def __init__(self, max_bytes=default_max_bytes):
+		self.max_bytes = max_bytes
+		self.size = 0
+		# (db, seq id, strand) => seq or CodonIndex, in the order they were last used
+		self.entries = OrderedDict()
+		# (db, seq id, strand) => size in bytes
+		self.sizes = {}
+
+
+	# whole strand of a scaffold, the complement is made from the plus strand the first time it is needed
+	def get(self, db, seq_id, strand):
+		key = (db, seq_id, strand)
+		if key in self.entries:
+			self.entries.move_to_end(key)
+			return self.entries[key]
+
+		if strand == "complement":
+			seq = self.get(db, seq_id, "plus").translate(complement)
+		else:
+			seq = fetch_seq(db, seq_id, "plus")[1]
+
+		self.add(key, seq, len(seq))
+		return seq
+
+
+	# codon index of a scaffold
+	def get_codons(self, db, seq_id):
+		key = (db, seq_id, "codons")
+		if key in self.entries:
+			self.entries.move_to_end(key)
+			return self.entries[key]
+
+		codon_index = CodonIndex(self.get(db, seq_id, "plus"))
+		self.add(key, codon_index, codon_index.size)
+		return codon_index
+
+
+	def add(self, key, value, size):
+		self.entries[key] = value
+		self.sizes[key] = size
+		self.size += size
+		self.evict(key)
+
+
+	# part of a scaffold like fetch_seq, start and end are 1-based and inclusive, minus strand is reverse complemented
+	def get_range(self, db, seq_id, strand, start, end):
+		start = max(start - 1, 0)
+		if strand == "minus":
+			return self.get(db, seq_id, "complement")[start:end][::-1]
+		return self.get(db, seq_id, "plus")[start:end]
+
+
+	# remove least recently used entries until the cache fits in max_bytes, the entry that was just added is kept
+	def evict(self, keep):
+		for key in list(self.entries.keys()):
+			if self.size <= self.max_bytes:
+				break
+			if key == keep:
+				continue
+			del self.entries[key]
+			self.size -= self.sizes.pop(key)
@@ -0,0 +1,50 @@
+import sys
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+
+# split a thread budget between concurrent BLAST processes and the -num_threads of each process
+# BLAST scales better with more processes than with more threads per process, so use as many processes as there are jobs
+def split_threads(threads, n_jobs):
+	workers = max(1, min(threads, n_jobs))
+	per_worker = max(1, threads // workers)
+	return workers, per_worker
+
+
+# split a list into n contiguous chunks of almost equal size
+def split_list(l, n):
+	size, extra = divmod(len(l), n)
+	chunks = []
+	start = 0
+	for i in range(n):
+		end = start + size + (1 if i < extra else 0)
+		chunks.append(l[start:end])
+		start = end
+	return chunks
+
+
+# run commands at the same time, each command is its own process so a pool of threads is enough to wait on them
+# a failed command would look like one without results, so the run stops
+def run_parallel(commands, workers):
+	if workers <= 1 or len(commands) <= 1:
+		processes = [subprocess.run(command) for command in commands]
+	else:
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			processes = list(executor.map(subprocess.run, commands))
+
+	for process in processes:
+		if process.returncode != 0:
+			print("\nERROR: Command failed with exit code " + str(process.returncode) + ": " + ' '.join(process.args) + "\n")
+			sys.exit()
+
+	return processes
+
+
+# call function with each tuple of arguments at the same time, return the results in the order of the arguments
+def run_concurrent(function, args_list, workers):
+	if workers <= 1 or len(args_list) <= 1:
+		return [function(*args) for args in args_list]
+
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		futures = [executor.submit(function, *args) for args in args_list]
+		return [future.result() for future in futures]
@@ -0,0 +1,163 @@
+import os
+import subprocess
+import threading
+from fasta_index import FastaIndex
+
+
+# a request is (seq id, strand, start, end), strand is None for the default strand, start/end are None for the whole sequence
+# a record is (defline, seq), defline and seq are '' if the id is not in the database
+
+
+# line of a blastdbcmd -entry_batch file
+def batch_line(request):
+	seq_id, strand, start, end = request
+	line = seq_id
+	if start is not None:
+		line += " {0}-{1}".format(start, end)
+	if strand is not None:
+		line += " " + strand
+	return line
+
+
+# read fasta text into a list of records
+def parse_fasta(text):
+	records = []
+	defline = None
+	seq = []
+
+	for line in text.split("\n"):
+		if line.startswith(">"):
+			if defline is not None:
+				records.append((defline, ''.join(seq)))
+			defline = line
+			seq = []
+		elif defline is not None and line:
+			seq.append(line)
+
+	if defline is not None:
+		records.append((defline, ''.join(seq)))
+
+	return records
+
+
+# id of a record as requested, e.g. '>ref|NC_1.1|:1-100 desc' => 'NC_1.1'
+def record_id(defline):
+	seq_id = defline[1:].split(" ", 1)[0]
+	if ":" in seq_id:
+		seq_id = seq_id.rsplit(":", 1)[0]
+	return plain_id(seq_id)
+
+
+# strip database prefix from an id, e.g. 'ref|NC_1.1|' => 'NC_1.1'
+def plain_id(seq_id):
+	if "|" in seq_id:
+		parts = [part for part in seq_id.split("|") if part]
+		return parts[1] if len(parts) > 1 else parts[0]
+	return seq_id
+
+
+# sequences are read from the blast database with blastdbcmd
+class BlastDbSource():
+
+	# fetch many sequences with a single blastdbcmd call, return dict request => record
+	def fetch_seqs(self, db, requests):
+		fetched = {}
+		if len(requests) == 0:
+			return fetched
+
+		# queries of a round can fetch at the same time from different threads
+		batch_file = "entry_batch_{0}_{1}.txt".format(os.getpid(), threading.get_ident())
+		with open(batch_file, "w") as file:
+			for request in requests:
+				file.write(batch_line(request) + "\n")
+
+		result = subprocess.run("blastdbcmd -db {0} -entry_batch {1}".format(db, batch_file).split(), capture_output=True, text=True)
+		os.remove(batch_file)
+
+		records = parse_fasta(result.stdout)
+
+		# records come back in the order of the requests, ids that are not found are skipped
+		next_record = 0
+		for index, request in enumerate(requests):
+			remaining_records = len(records) - next_record
+			remaining_requests = len(requests) - index
+
+			if remaining_records > 0 and (record_id(records[next_record][0]) == plain_id(request[0]) or remaining_records == remaining_requests):
+				fetched[request] = records[next_record]
+				next_record += 1
+			else:
+				fetched[request] = ('', '')
+
+		return fetched
+
+
+# sequences are read in-process from the fasta file the blast database was made from, through a faidx-style index
+class FaidxSource():
+
+	def __init__(self):
+		# db => FastaIndex
+		self.indexes = {}
+		self.fallback = BlastDbSource()
+		self.lock = threading.Lock()
+
+
+	# fasta file of a database, databases are named after their fasta file without extension (see get_dbs)
+	def fasta_file(self, db):
+		for ext in fasta_exts:
+			if os.path.exists(db + ext):
+				return db + ext
+		return None
+
+
+	# open index of a database, reopen it if the fasta file was rewritten
+	def get_index(self, db):
+		with self.lock:
+			index = self.indexes.get(db)
+			if index is not None and not index.is_stale():
+				return index
+
+			if index is not None:
+				index.close()
+				del self.indexes[db]
+
+			fasta_file = self.fasta_file(db)
+			if fasta_file is None:
+				return None
+
+			self.indexes[db] = FastaIndex(fasta_file)
+			return self.indexes[db]
+
+
+	def fetch_seqs(self, db, requests):
+		index = self.get_index(db)
+
+		# database without its fasta file next to it
+		if index is None:
+			return self.fallback.fetch_seqs(db, requests)
+
+		return {request: index.fetch(*request) for request in requests}
+
+
+# extensions of the fasta files databases are made from
+fasta_exts = [".fna", ".faa", ".fasta", ".fa"]
+
+# name => source, selected with -seqsource
+sources = {"blastdb": BlastDbSource, "faidx": FaidxSource}
+source = BlastDbSource()
+
+
+# select where sequences are read from
+def set_source(name):
+	global source
+	source = sources[name]()
+
+
+# fetch many sequences, return dict request => record
+def fetch_seqs(db, requests):
+	return source.fetch_seqs(db, list(requests))
+
+
+# fetch one sequence, return record
+def fetch_seq(db, seq_id, strand=None, start=None, end=None):
+	request = (seq_id, strand, start, end)
+	return fetch_seqs(db, [request])[request]
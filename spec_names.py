@@ -0,0 +1,71 @@
+import re
+from functools import lru_cache
+
+
+# words after the genus that mean the species is unnamed, keep the strain after them
+special_case1 = frozenset(["sp.", "aff."])
+# strain collections and isolate, keep the word after them as well
+special_case2 = frozenset(name.lower() for name in ["NRRL", "CBS", "JCM", "NYNU", "CRUB", "Ashbya", "UWO(PS)", "MTCC", "UWOPS", "isolate"])
+# metagenome-assembled genomes, species name comes after the 'MAG:' prefix
+special_case3 = frozenset(["mag"])
+
+# species name of a protein defline, e.g. '>XP_1.1 protein [Genus species strain]' or '[[Genus] species strain]'
+nested_brackets = re.compile(r'\[\[(.+?)\]\s(.+?)\]')
+brackets = re.compile(r'\[(.*?)\]')
+
+# characters removed from names
+strip_chars = str.maketrans("", "", "[]'")
+
+# number of distinct deflines remembered
+memo_size = 1 << 16
+
+
+# get species name from a list of words, name starts at index 'offset'
+def normalize(words, offset):
+	lower_words = [word.lower() for word in words]
+
+	if special_case3.intersection(lower_words):
+		return ' '.join(words[offset+2:offset+6])
+
+	if len(words) > offset+1 and lower_words[offset+1] in special_case1:
+		if len(words) > offset+2 and lower_words[offset+2] in special_case2:
+			return ' '.join(words[offset:offset+4])
+		return ' '.join(words[offset:offset+3])
+
+	return ' '.join(words[offset:offset+2])
+
+
+# get species name from the organism name of an assembly
+@lru_cache(maxsize=memo_size)
+def spec_from_organism(organism_name):
+	return normalize(organism_name.translate(strip_chars).split(), 0)
+
+
+# get species name from the defline of a protein sequence, name is in brackets at the end
+@lru_cache(maxsize=memo_size)
+def spec_from_prot_defline(defline):
+	match = nested_brackets.search(defline) if '[[' in defline else None
+
+	if match is not None:
+		words = (match.group(1) + " " + match.group(2)).split()
+	else:
+		words = brackets.search(defline).group(1).split()
+
+	return normalize(words, 0).replace("'", "")
+
+
+# get species name from the defline of a nucleotide sequence, name comes right after the sequence id
+@lru_cache(maxsize=memo_size)
+def spec_from_nucl_defline(defline):
+	return normalize(defline.lstrip(">").translate(strip_chars).split(), 1)
+
+
+# get species name from the subject title (stitle) of a nucleotide hit, the title may or may not start with the sequence id
+def spec_from_nucl_title(seq_id, title):
+	acc = seq_id.split("|")[1] if "|" in seq_id else seq_id
+	words = title.split(None, 1)
+
+	if len(words) > 0 and (words[0] == seq_id or words[0] == acc):
+		return spec_from_nucl_defline(title)
+
+	return spec_from_nucl_defline(acc + " " + title)
@@ -0,0 +1,87 @@
+import os
+import json
+import threading
+from ete3 import NCBITaxa
+
+
+# species name => family tax id lookups against the ete3 NCBI taxonomy database
+# the database is opened once per run, all names of a lookup are translated with one query per step (names, lineages, ranks)
+# families are remembered in a file next to the taxonomy database, and forgotten when the database is updated
+class Taxonomy():
+
+	def __init__(self):
+		self.ncbi = NCBITaxa()
+		self.memo_file = self.ncbi.dbfile + ".families.json"
+		self.db_mtime = os.stat(self.ncbi.dbfile).st_mtime_ns
+		self.lock = threading.Lock()
+
+		# species name => family tax id, None if the species or its family is not in the database
+		self.families = {}
+		if os.path.exists(self.memo_file):
+			with open(self.memo_file, "r") as file:
+				try:
+					saved = json.load(file)
+					if saved["db_mtime"] == self.db_mtime:
+						self.families = saved["families"]
+				except (ValueError, KeyError):
+					pass
+
+
+	# write memo to disk, replace old memo in one step so it never gets truncated
+	# the taxonomy database can be shared or read-only, then families are only remembered for this run
+	def save(self):
+		if self.memo_file is None:
+			return
+
+		tmp_file = self.memo_file + ".tmp"
+		try:
+			with open(tmp_file, "w") as file:
+				json.dump({"db_mtime": self.db_mtime, "families": self.families}, file)
+			os.replace(tmp_file, self.memo_file)
+		except OSError:
+			print("Cannot write taxonomy memo " + self.memo_file + ", species families are not remembered for later runs.")
+			self.memo_file = None
+
+
+	# look up families of species that are not in the memo yet
+	def lookup(self, spec_names):
+		taxids = self.ncbi.get_name_translator(spec_names)
+		spec_taxids = {spec_name: taxids[spec_name][0] for spec_name in spec_names if spec_name in taxids}
+
+		lineages = self.ncbi.get_lineage_translator(list(set(spec_taxids.values())))
+		ranks = self.ncbi.get_rank(list(set(tax for lineage in lineages.values() for tax in lineage)))
+
+		for spec_name in spec_names:
+			family_taxid = None
+			for tax in lineages.get(spec_taxids.get(spec_name), []):
+				if ranks.get(tax) == "family":
+					family_taxid = tax
+					break
+			self.families[spec_name] = family_taxid
+
+
+	# family tax id of each species, species name => family tax id (None if not found)
+	def get_families(self, spec_names):
+		with self.lock:
+			missing = list(set(spec_name for spec_name in spec_names if spec_name not in self.families))
+			if len(missing) > 0:
+				self.lookup(missing)
+				self.save()
+
+			return {spec_name: self.families[spec_name] for spec_name in spec_names}
+
+
+	# family tax id of one species
+	def get_family(self, spec_name):
+		return self.get_families([spec_name])[spec_name]
+
+
+taxonomy = None
+
+
+# taxonomy shared by the whole run, the database is opened the first time it is needed
+def get_taxonomy():
+	global taxonomy
+	if taxonomy is None:
+		taxonomy = Taxonomy()
+	return taxonomy
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# modules of the tool are in the directory above, run e.g. 'pytest tests' from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
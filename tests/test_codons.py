@@ -0,0 +1,203 @@
+import random
+import pytest
+from blast_hits import NuclHit
+from annotation import BlastAnnot
+from scaffold_cache import ScaffoldCache, complement
+from codons import CodonIndex, frame_start, frame_end
+
+
+# find_codons before the codon index, reading the scaffold codon by codon (whole_strand of the minus strand is the complement of the plus strand)
+def baseline_find_codons(plus, frame, start_posit, end_posit):
+	start_codon = "ATG"
+	stop_codons = ["TAG", "TAA", "TGA"]
+	curr_fiv_posit = start_posit
+	curr_thr_posit = end_posit
+	stop_five = None
+	stop_three = None
+	start = None
+
+	if frame > 0:
+		whole_strand = plus
+		length = len(whole_strand)
+
+		while True:
+			if curr_thr_posit + 3 > length:
+				stop_three = curr_thr_posit + 1
+				break
+			codon = whole_strand[curr_thr_posit:curr_thr_posit+3]
+			if codon.upper() in stop_codons:
+				stop_three = curr_thr_posit + 1
+				break
+			curr_thr_posit += 3
+
+		while True:
+			if curr_fiv_posit - 4 < 0:
+				stop_five = curr_fiv_posit
+				break
+			curr_fiv_posit -= 1
+			codon = whole_strand[curr_fiv_posit-3:curr_fiv_posit]
+			curr_fiv_posit += 1
+			curr_fiv_posit -= 3
+			if codon.upper() in stop_codons:
+				stop_five = curr_fiv_posit
+				break
+
+		if stop_five is not None:
+			curr_start_posit = stop_five - 1
+			while True:
+				if curr_start_posit >= stop_three:
+					break
+				codon = whole_strand[curr_start_posit:curr_start_posit+3]
+				if codon.upper() == start_codon:
+					start = curr_start_posit + 1
+					break
+				curr_start_posit += 3
+
+	else:
+		whole_strand = plus.translate(complement)
+		length = len(whole_strand)
+
+		while True:
+			if curr_thr_posit - 4 < 0:
+				stop_three = curr_thr_posit - 3
+				break
+			curr_thr_posit -= 1
+			codon = whole_strand[curr_thr_posit - 3:curr_thr_posit][::-1]
+			curr_thr_posit += 1
+			if codon.upper() in stop_codons:
+				stop_three = curr_thr_posit - 3
+				break
+			curr_thr_posit -= 3
+
+		while True:
+			if curr_fiv_posit + 3 > length:
+				stop_five = curr_fiv_posit - 2
+				break
+			codon = whole_strand[curr_fiv_posit:curr_fiv_posit + 3][::-1]
+			if codon.upper() in stop_codons:
+				stop_five = curr_fiv_posit + 1
+				break
+			curr_fiv_posit += 3
+
+		if stop_five is not None:
+			curr_start_posit = stop_five - 1
+			while True:
+				if curr_start_posit <= stop_three:
+					break
+				codon = whole_strand[curr_start_posit-3:curr_start_posit][::-1]
+				if codon.upper() == start_codon:
+					start = curr_start_posit - 2
+					break
+				curr_start_posit -= 3
+
+	return stop_five, start, stop_three
+
+
+# codons of one hit on a scaffold held in the scaffold cache, no database needed
+def find_codons(plus, frame, start_posit, end_posit):
+	cache = ScaffoldCache()
+	cache.add(("db", "scaffold", "plus"), plus, len(plus))
+	hit = NuclHit("Genus species", start_posit, end_posit, 1e-10, 1, 2, 3, "", "", frame)
+	return BlastAnnot({"scaffold": [hit]}, "Query species", cache).find_codons("scaffold", "db")
+
+
+# compare with the baseline, the baseline read codons before the start of the scaffold through negative indexes on the minus strand
+# (a start codon at -3, wrapped around from the end of the scaffold), no start codon is found there now
+def check_hit(plus, frame, start_posit, end_posit):
+	expected = baseline_find_codons(plus, frame, start_posit, end_posit)
+	found = find_codons(plus, frame, start_posit, end_posit)
+
+	if expected[1] is not None and expected[1] < 1:
+		assert frame < 0 and expected[1] == -3
+		assert found == (expected[0], None, expected[2])
+	else:
+		assert found == expected
+
+
+def random_scaffold(rng, length, alphabet="ACGT"):
+	return "".join(rng.choice(alphabet) for i in range(length))
+
+
+@pytest.mark.parametrize("frame", [1, 2, 3, -1, -2, -3])
+def test_short_scaffolds_all_positions(frame):
+	rng = random.Random(frame)
+	for length in range(1, 25):
+		for alphabet in ["ACGT", "ACGTacgtN", "TAGC", "CATT"]:
+			plus = random_scaffold(rng, length, alphabet)
+			for start_posit in range(1, length + 1):
+				for end_posit in range(1, length + 1):
+					if (frame > 0) == (start_posit <= end_posit):
+						check_hit(plus, frame, start_posit, end_posit)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_scaffolds_both_strands(seed):
+	rng = random.Random(seed)
+	for i in range(200):
+		plus = random_scaffold(rng, rng.randint(25, 2000), rng.choice(["ACGT", "ACGTacgtNRY"]))
+		first, last = sorted([rng.randint(1, len(plus)), rng.randint(1, len(plus))])
+		check_hit(plus, rng.choice([1, 2, 3]), first, last)
+		check_hit(plus, rng.choice([-1, -2, -3]), last, first)
+
+
+def test_long_open_frames():
+	rng = random.Random(0)
+	orf = "".join(rng.choice(["GCC", "CTT", "GGA", "ATG", "CAT"]) for i in range(5000))
+	plus = random_scaffold(rng, 301) + orf + "TAA" + random_scaffold(rng, 301)
+	for i in range(50):
+		first, last = sorted([rng.randint(1, len(plus)), rng.randint(1, len(plus))])
+		check_hit(plus, 1, first, last)
+		check_hit(plus, -1, last, first)
+
+
+# hits near the ends of a scaffold, where no stop codon is found before the scaffold ends
+# the 3' end is then the first position of the frame where a codon no longer fits, the 5' end the first position of the frame
+def test_plus_strand_without_stop_codons():
+	plus = "CCATGCCCCCCCC"
+	assert find_codons(plus, 1, 3, 8) == (3, 3, 12)
+	assert find_codons(plus, 1, 7, 10) == (1, None, 14)
+
+
+# on the minus strand the ends are reached at position 1 (3' end) and at the end of the scaffold (5' end), the 3' end can be 0 or less
+def test_minus_strand_without_stop_codons():
+	plus = "GGGGGGGGCATGG"
+	assert find_codons(plus, -1, 11, 6) == (9, None, 0)
+	assert find_codons(plus, -1, 13, 1) == (11, None, -2)
+
+
+# the baseline read plus[-4:-1] as the codon before position 1 through a negative index, and found the 'CAT' at the end of the scaffold
+# (ATG on the minus strand) as a start codon at -3, this happened on scaffolds of any length, codons before the scaffold are not read anymore
+def test_minus_strand_start_codon_is_not_read_before_scaffold_start():
+	plus = "GGGGGGGGGCATG"
+	assert baseline_find_codons(plus, -1, 11, 1) == (9, -3, -2)
+	assert find_codons(plus, -1, 11, 1) == (9, None, -2)
+	assert find_codons(plus, -1, 11, 4) == (9, None, -2)
+
+
+def test_stop_codons_on_both_strands():
+	# TAG upstream and TAA downstream in frame on the plus strand, ATG right after the upstream stop
+	plus = "CCTAGATGCCCGGGTAACC"
+	assert find_codons(plus, 1, 9, 14) == (3, 6, 15)
+	# same scaffold reverse complemented, codons of the minus strand are at their lowest plus strand position
+	minus = plus.translate(complement)[::-1]
+	assert find_codons(minus, -1, 11, 6) == (15, 12, 3)
+
+
+def test_codon_index_frames():
+	# stop codons at 3 (frame 0), 7 and 10 (frame 1), the 'x' is never part of a codon
+	codon_index = CodonIndex("ATGTAAxTAGtga")
+	assert codon_index.next("stop", 0) == 3
+	assert codon_index.next("stop", 4) == 7
+	assert codon_index.next("stop", 8) is None
+	assert codon_index.prev("stop", 13) == 10
+	assert codon_index.prev("stop", 9) == 3
+	assert codon_index.prev("stop", 2) is None
+	assert codon_index.prev("start", 3) == 0
+	assert codon_index.next("start", 1) is None
+
+
+def test_frame_ends():
+	assert frame_end(4, 10) == 10
+	assert frame_end(8, 10) == 8
+	assert frame_start(5) == -1
+	assert frame_start(-2) == -2
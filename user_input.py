@@ -1,11 +1,12 @@
 import sys
+import os
 
 class InputProcessor():
 	
 	def __init__(self, argv):
 		self.argv = argv
 		self.req_args = ["-qseq", "-qdb", "-qtype", "-qname", "-sset", "-download"]
-		self.opt_args = ["-evalue"]
+		self.opt_args = ["-evalue", "-workers", "-zipdir", "-cache_dir", "-cache_size", "-result_cache_size", "-scaffold_cache_size", "-threads", "-seqsource", "-shards", "-incremental", "-fanout", "-seed", "-resume"]
 		
 	def valid_index(self, arg, index):
 		if index == len(self.argv) - 1:
@@ -147,6 +148,225 @@ class InputProcessor():
 			
 		return evalue
 	
+	
+	def get_workers(self):
+		workers = "4"
+		
+		for index, arg in enumerate(self.argv):
+			if arg == "-workers":
+				self.valid_index(arg, index)
+				workers = self.argv[index+1]
+				self.valid_arg(arg, workers)
+				break
+		
+		try:
+			workers = int(workers)
+		except ValueError:
+			print("\nERROR: Invalid input for number of download workers. See README.md for usage.\n")
+			sys.exit()
+		
+		if workers < 1:
+			print("\nERROR: Number of download workers must be at least 1. See README.md for usage.\n")
+			sys.exit()
+			
+		return workers
+	
+	
+	def get_zipdir(self):
+		zipdir = None
+		
+		for index, arg in enumerate(self.argv):
+			if arg == "-zipdir":
+				self.valid_index(arg, index)
+				zipdir = self.argv[index+1]
+				self.valid_arg(arg, zipdir)
+				break
+		
+		if zipdir is not None and not os.path.isdir(zipdir):
+			print("\nERROR: Directory of pre-fetched zip files not found: " + zipdir + "\n")
+			sys.exit()
+			
+		return zipdir
+	
+	
+	def get_cache_dir(self):
+		cache_dir = None
+		
+		for index, arg in enumerate(self.argv):
+			if arg == "-cache_dir":
+				self.valid_index(arg, index)
+				cache_dir = self.argv[index+1]
+				self.valid_arg(arg, cache_dir)
+				break
+			
+		return cache_dir
+	
+	
+	def get_cache_size(self, flag="-cache_size", default="50"):
+		cache_size = default
+		
+		for index, arg in enumerate(self.argv):
+			if arg == flag:
+				self.valid_index(arg, index)
+				cache_size = self.argv[index+1]
+				self.valid_arg(arg, cache_size)
+				break
+		
+		try:
+			cache_size = float(cache_size)
+		except ValueError:
+			print("\nERROR: Invalid input for cache size. See README.md for usage.\n")
+			sys.exit()
+		
+		if cache_size <= 0:
+			print("\nERROR: Cache size must be greater than 0. See README.md for usage.\n")
+			sys.exit()
+		
+		# GB to bytes
+		return int(cache_size * 1024 ** 3)
+	
+	
+	def get_threads(self, default=1):
+		threads = str(default)
+		
+		for index, arg in enumerate(self.argv):
+			if arg == "-threads":
+				self.valid_index(arg, index)
+				threads = self.argv[index+1]
+				self.valid_arg(arg, threads)
+				break
+		
+		try:
+			threads = int(threads)
+		except ValueError:
+			print("\nERROR: Invalid input for number of threads. See README.md for usage.\n")
+			sys.exit()
+		
+		if threads < 1:
+			print("\nERROR: Number of threads must be at least 1. See README.md for usage.\n")
+			sys.exit()
+			
+		return threads
+	
+	
+	def get_seq_source(self):
+		seq_source = "blastdb"
+		
+		for index, arg in enumerate(self.argv):
+			if arg == "-seqsource":
+				self.valid_index(arg, index)
+				seq_source = self.argv[index+1]
+				self.valid_arg(arg, seq_source)
+				break
+		
+		seq_source = seq_source.lower()
+		if seq_source == "blastdb" or seq_source == "faidx":
+			return seq_source
+		else:
+			print("\nERROR: Invalid input for seqsource parameter. Use 'blastdb' or 'faidx'. See README.md for usage.\n")
+			sys.exit()
+	
+	def get_shards(self):
+		shards = "1"
+		
+		for index, arg in enumerate(self.argv):
+			if arg == "-shards":
+				self.valid_index(arg, index)
+				shards = self.argv[index+1]
+				self.valid_arg(arg, shards)
+				break
+		
+		try:
+			shards = int(shards)
+		except ValueError:
+			print("\nERROR: Invalid input for number of database shards. See README.md for usage.\n")
+			sys.exit()
+		
+		if shards < 1:
+			print("\nERROR: Number of database shards must be at least 1. See README.md for usage.\n")
+			sys.exit()
+			
+		return shards
+	
+	
+	def get_incremental(self):
+		incremental = "no"
+		
+		for index, arg in enumerate(self.argv):
+			if arg == "-incremental":
+				self.valid_index(arg, index)
+				incremental = self.argv[index+1]
+				self.valid_arg(arg, incremental)
+				break
+		
+		incremental = incremental.lower()
+		if incremental == "yes" or incremental == "no":
+			return incremental
+		else:
+			print("\nERROR: Invalid input for incremental parameter. Use 'yes' or 'no'. See README.md for usage.\n")
+			sys.exit()
+	
+	
+	def get_resume(self):
+		resume = "no"
+		
+		for index, arg in enumerate(self.argv):
+			if arg == "-resume":
+				self.valid_index(arg, index)
+				resume = self.argv[index+1]
+				self.valid_arg(arg, resume)
+				break
+		
+		resume = resume.lower()
+		if resume == "yes" or resume == "no":
+			return resume
+		else:
+			print("\nERROR: Invalid input for resume parameter. Use 'yes' or 'no'. See README.md for usage.\n")
+			sys.exit()
+	
+	
+	def get_fanout(self):
+		fanout = "1"
+		
+		for index, arg in enumerate(self.argv):
+			if arg == "-fanout":
+				self.valid_index(arg, index)
+				fanout = self.argv[index+1]
+				self.valid_arg(arg, fanout)
+				break
+		
+		try:
+			fanout = int(fanout)
+		except ValueError:
+			print("\nERROR: Invalid input for number of query species per round. See README.md for usage.\n")
+			sys.exit()
+		
+		if fanout < 1:
+			print("\nERROR: Number of query species per round must be at least 1. See README.md for usage.\n")
+			sys.exit()
+			
+		return fanout
+	
+	
+	def get_seed(self):
+		seed = None
+		
+		for index, arg in enumerate(self.argv):
+			if arg == "-seed":
+				self.valid_index(arg, index)
+				seed = self.argv[index+1]
+				self.valid_arg(arg, seed)
+				break
+		
+		if seed is None:
+			return None
+		
+		try:
+			return int(seed)
+		except ValueError:
+			print("\nERROR: Invalid input for random seed. Use a whole number. See README.md for usage.\n")
+			sys.exit()
+	
 	def check_invalid_flag(self):
 		for arg in self.argv:
 			if "-" in arg: